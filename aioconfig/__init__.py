@@ -24,12 +24,15 @@
 ########################################################################
 
 from .storage import StorageAdaptor, create_storage_adaptor, register_storage_adaptor
-from .core import List, Object, Property
+from .core import List, Object, Property, Value
 from .manager import Manager
+from .diff import Change
+from .retention import RetentionPolicy
 from .errors import *
 from .access import AccessAdaptor, create_access_adaptor, register_access_adaptor
 
 import aioconfig.sqlite_storage
+import aioconfig.file_storage
 import aioconfig.rest_access
 
 
@@ -23,15 +23,79 @@
 #
 ########################################################################
 
-from typing import List as List_t, Union
+import hashlib
+import json
+import sys
+
+from typing import List as List_t, Optional, Tuple, Union
 
 
 NodeType = Union['List', 'Object', 'Property']
 ParentType = Union['List', 'Object']
+PathType = Tuple[str, ...]
+
+# Size, in bytes, of subtree digests.
+DIGEST_SIZE = 16
+
+# Children of empty containers.  These are shared by all empty
+# containers, and copied when a child is first added.
+_NO_CHILDREN_LIST = []
+_NO_CHILDREN_DICT = {}
+
+
+class TreeListener:
+    """Base class for receivers of tree change notifications.
+
+    A listener attached to a container is told about changes anywhere
+    in the subtree below that container.  Paths passed to the listener
+    are relative to the container it is attached to."""
+
+    def node_added(self, path: PathType, node: NodeType):
+        """Called after a node has been added to the tree.
+
+        :param path: Path of the new node.
+        :param node: Reference to the new node."""
+        pass
+
+    def node_removed(self, path: PathType, node: NodeType):
+        """Called after a node has been removed from the tree.
+
+        :param path: Path of the node prior to its removal.
+        :param node: Reference to the removed node."""
+        pass
+
+    def children_moved(self, path: PathType, node: NodeType):
+        """Called after the children of a List have been renumbered.
+
+        :param path: Path of the List.
+        :param node: Reference to the List."""
+        pass
+
+    def value_changed(self, path: PathType, node: NodeType):
+        """Called after the value of a Property has been changed.
+
+        :param path: Path of the Property.
+        :param node: Reference to the Property."""
+        pass
+
+    def node_unloaded(self, path: PathType, node: NodeType):
+        """Called after a subtree kept in storage is dropped from memory.
+
+        The subtree is still part of the tree, and is loaded again
+        when it is next looked up.
+
+        :param path: Path of the subtree.
+        :param node: Reference to the dropped copy."""
+        pass
 
 
 class Node:
-    """Base class for tree nodes."""
+    """Base class for tree nodes.
+
+    Node classes use __slots__, to keep large trees compact.  Subclasses
+    may define attributes freely, at the cost of a per-instance dict."""
+
+    __slots__ = ()
 
     @staticmethod
     def is_leaf() -> bool:
@@ -46,18 +110,235 @@ class Node:
         """Get the container for this node."""
         pass
 
+    def get_path(self) -> PathType:
+        """Return the path to this node from the root of its tree."""
+
+        names = []
+        node = self
+        parent = node.get_parent()
+        while parent is not None:
+            names.append(parent.key_of(node))
+            node = parent
+            parent = node.get_parent()
+
+        names.reverse()
+        return tuple(names)
+
+    def digest(self) -> bytes:
+        """Return a hash of the contents of this subtree.
+
+        Subtrees with equal contents have equal digests, regardless of
+        the name of their root node."""
+        pass
+
+    def export(self):
+        """Return the contents of this subtree as plain data.
+
+        Objects are exported as dicts, Lists as lists, and properties
+        as their values, suitable for JSON encoding."""
+        pass
+
+    def snapshot(self, name: str = None, pending: list = None) -> NodeType:
+        """Return a detached, plain copy of this subtree.
+
+        :param name: Name for the copy, defaulting to this node's name.
+        :param pending: If given, live properties are not read: their
+          copies are left empty, and (property, copy) pairs are appended
+          to this list for the caller to fill in.
+
+        Subtrees without live properties are shared with the copy, and
+        copied only when either side is later modified."""
+        pass
+
+    def _prepare(self):
+        """(Internal) Unshare this node's path before it is modified.
+
+        Any ancestor whose children are shared with a snapshot takes
+        a private copy of its children, leaving equivalent snapshots of
+        them in the shared collection.  Only the path from the root to
+        this node is copied."""
+
+        chain = []
+        node = self
+        while node is not None:
+            chain.append(node)
+            node = node.get_parent()
+
+        for node in reversed(chain):
+            if not node.is_leaf() and node._shared:
+                node._unshare()
+        return
+
+
+def value_digest(value) -> bytes:
+    """Return the digest of a property value.
+
+    :param value: JSON-encodable property value."""
+
+    buf = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(b'v' + buf, digest_size=DIGEST_SIZE).digest()
+
+
+def _live_count(node: NodeType) -> int:
+    """(Internal) Return the number of live properties in a subtree."""
+
+    if node.is_leaf():
+        return 1 if node.is_live() else 0
+    return node._live
+
+
+class Container(Node):
+    """Base class for nodes having children.
+
+    A Container's children can be shared with snapshots of it.  In that
+    case, the snapshot does not own its children: they are replaced by
+    private copies as they are accessed, and the shared collection of
+    children is copied before either side changes it.
+
+    The digest of a subtree without live properties is cached until the
+    subtree is changed."""
+
+    __slots__ = ('_name', '_parent', '_listeners', '_children', '_shared',
+                 '_adopted', '_live', '_digest')
+
+    def key_of(self, node: NodeType) -> str:
+        """Return the path element naming a child of this node.
+
+        :param node: Child node."""
+        pass
+
+    def get_child(self, name: str) -> Optional[NodeType]:
+        """Return named child, or None.
+
+        :param name: Path element naming the child."""
+        pass
+
+    def is_live(self) -> bool:
+        """Return True if this subtree contains live properties."""
+        return self._live > 0
+
+    def peek_items(self):
+        """Return (path element, child) pairs, for reading only.
+
+        Unlike items() and values(), this does not take private copies
+        of children shared with another tree, so the returned children
+        must not be modified."""
+        pass
+
+    def create_child(self, key: str, source: NodeType) -> NodeType:
+        """Create a child of this node from a node in another tree.
+
+        :param key: Path element naming the new child.
+        :param source: Node whose configuration the child should have.
+        :returns: Reference to the new child.
+
+        This is used when deploying a configuration.  By default, the
+        child is a snapshot of the source, but subclasses can override
+        this to create the service objects that implement the child."""
+        pass
+
+    def add_listener(self, listener: TreeListener):
+        """Register a listener for changes to this subtree.
+
+        :param listener: TreeListener instance."""
+
+        if self._listeners is None:
+            self._listeners = []
+        self._listeners.append(listener)
+        return
+
+    def remove_listener(self, listener: TreeListener):
+        """Unregister a listener for changes to this subtree.
+
+        :param listener: Previously registered TreeListener instance."""
+
+        self._listeners.remove(listener)
+        if not self._listeners:
+            self._listeners = None
+        return
+
+    def _notify(self, event: str, names: List_t[str], node: NodeType,
+                live: int = 0):
+        """(Internal) Report a change to listeners on this subtree.
+
+        :param event: Name of the TreeListener method to call.
+        :param names: Path elements below this node, innermost first.
+        :param node: Subject node for the event.
+        :param live: Change in the number of live properties."""
+
+        container = self
+        while container is not None:
+            container._live += live
+            container._digest = None
+            if container._listeners:
+                path = tuple(reversed(names))
+                for listener in container._listeners:
+                    getattr(listener, event)(path, node)
+
+            parent = container.get_parent()
+            if parent is not None:
+                names.append(parent.key_of(container))
+            container = parent
+        return
+
+    def _adopt(self, key):
+        """(Internal) Return a child owned by this node.
+
+        :param key: Dictionary key or list index of the child.
+
+        A child not owned by this node is shared with another tree: it
+        is replaced by a private copy."""
+
+        child = self._children[key]
+        if child.get_parent() is not self:
+            if self._shared:
+                self._unshare()
+            child = child.snapshot()
+            child.set_parent(self)
+            self._children[key] = child
+        return child
+
+    def _unshare(self):
+        """(Internal) Take a private copy of this node's children.
+
+        Children owned by this node are replaced in the shared
+        collection by equivalent snapshots, so that other holders of
+        the collection do not see later changes to them."""
+
+        shared = self._children
+        self._children = shared.copy()
+        self._shared = False
+
+        keys = range(len(shared)) if isinstance(shared, list) else shared
+        for key in keys:
+            if shared[key].get_parent() is self:
+                shared[key] = shared[key].snapshot()
+        return
+
+
+class List(Container):
+    """Base class for a list of nodes.
 
-class List(Node):
-    """Base class for a list of nodes."""
+    The index of each child is cached, so that finding a child's path
+    element (when reporting a change below it) does not search the
+    list.  The cache is rebuilt when a lookup finds it stale."""
+
+    __slots__ = ('_positions',)
 
     def __init__(self, name: str, parent: ParentType):
         """Constructor.
 
         :param name: Name of tree node.
         :param parent: Parent of this node."""
-        self._name = name
+        self._name = sys.intern(name)
         self._parent = parent
-        self._children = []
+        self._listeners = None
+        self._children = _NO_CHILDREN_LIST
+        self._shared = True
+        self._adopted = True
+        self._live = 0
+        self._digest = None
+        self._positions = None
         return
 
     @staticmethod
@@ -80,42 +361,178 @@ class List(Node):
         """Get the container for this node."""
         return self._parent
 
+    def key_of(self, node: NodeType) -> str:
+        """Return the path element naming a child of this node.
+
+        :param node: Child node.
+        :returns: Index of the child, as a string."""
+
+        children = self._children
+        if self._positions is not None:
+            index = self._positions.get(id(node))
+            if index is not None and index < len(children) and \
+                    children[index] is node:
+                return str(index)
+
+        self._positions = {id(child): index
+                           for index, child in enumerate(children)}
+        index = self._positions.get(id(node))
+        if index is None or children[index] is not node:
+            raise KeyError("Not a child: %s" % node.get_name())
+        return str(index)
+
+    def get_child(self, name: str) -> Optional[NodeType]:
+        """Return indexed child, or None.
+
+        :param name: Index of the child, as a string."""
+
+        try:
+            index = int(name)
+        except ValueError:
+            return None
+
+        if index < 0 or index >= len(self._children):
+            return None
+        if self._adopted:
+            return self._children[index]
+        return self._adopt(index)
+
     def append_child(self, node: NodeType) -> NodeType:
         """Append a child to this node.
 
         :param node: New child for this node."""
+        self._prepare()
         self._children.append(node)
+        node.set_parent(self)
+        if self._positions is not None:
+            self._positions[id(node)] = len(self._children) - 1
+        self._notify('node_added', [str(len(self._children) - 1)], node,
+                     _live_count(node))
         return node
 
     def insert_child(self, index: int, node: NodeType):
+        """Insert a child into this node.
+
+        :param index: Integer index at which to insert the child.
+        :param node: New child for this node."""
+        count = len(self._children)
+        index = min(max(index + count if index < 0 else index, 0), count)
+
+        self._prepare()
         self._children.insert(index, node)
+        node.set_parent(self)
+        if index < count:
+            self._notify('children_moved', [], self)
+        self._notify('node_added', [str(index)], node, _live_count(node))
         return
 
+    def create_child(self, key: str, source: NodeType) -> NodeType:
+        """Create a child of this node from a node in another tree.
+
+        :param key: Index of the new child, as a string.
+        :param source: Node whose configuration the child should have.
+        :returns: Reference to the new child."""
+        node = source.snapshot()
+        self.insert_child(int(key), node)
+        return node
+
     def remove_child(self, index: int):
         """Remove a child from this node.
 
         :param index: Integer index of child to be removed."""
-        del self._children[index]
+        if index < 0:
+            index += len(self._children)
+
+        self._prepare()
+        node = self._children.pop(index)
+        if node.get_parent() is self:
+            node.set_parent(None)
+        self._notify('node_removed', [str(index)], node, -_live_count(node))
+        if index < len(self._children):
+            self._notify('children_moved', [], self)
         return
 
+    def _adopt(self, index: int):
+        """(Internal) Return a child owned by this node.
+
+        :param index: List index of the child."""
+
+        child = super()._adopt(index)
+        if self._positions is not None:
+            self._positions[id(child)] = index
+        return child
+
+    def peek_items(self):
+        """Return (index string, child) pairs, for reading only."""
+        return [(str(index), child)
+                for index, child in enumerate(self._children)]
+
     def values(self) -> List_t[NodeType]:
+        if not self._adopted:
+            for index in range(len(self._children)):
+                self._adopt(index)
+            self._adopted = True
         return self._children.copy()
 
+    def snapshot(self, name: str = None, pending: list = None) -> 'List':
+        """Return a detached, plain copy of this subtree.
+
+        :param name: Name for the copy, defaulting to this node's name."""
+
+        copy = List(self._name if name is None else name, None)
+        if self._live:
+            copy._children = []
+            copy._shared = False
+            for child in self._children:
+                node = child.snapshot(None, pending)
+                node.set_parent(copy)
+                copy._children.append(node)
+        else:
+            copy._children = self._children
+            copy._shared = self._shared = True
+            copy._adopted = False
+            copy._digest = self._digest
+        return copy
+
+    def digest(self) -> bytes:
+        """Return a hash of the contents of this subtree."""
+
+        digest = self._digest
+        if digest is None:
+            h = hashlib.blake2b(b'l', digest_size=DIGEST_SIZE)
+            for child in self._children:
+                h.update(child.digest())
+            digest = h.digest()
+            if not self._live:
+                self._digest = digest
+        return digest
+
+    def export(self) -> list:
+        """Return the contents of this subtree as a list."""
+        return [child.export() for child in self._children]
+
     def delete(self):
         pass
 
 
-class Object(Node):
+class Object(Container):
     """Base class for configuration object nodes."""
 
+    __slots__ = ()
+
     def __init__(self, name: str, parent: ParentType = None):
         """Constructor.
 
         :param name: Name of tree node.
         :param parent: Parent of this node."""
-        self._name = name
+        self._name = sys.intern(name)
         self._parent = parent
-        self._children = {}
+        self._listeners = None
+        self._children = _NO_CHILDREN_DICT
+        self._shared = True
+        self._adopted = True
+        self._live = 0
+        self._digest = None
         return
 
     @staticmethod
@@ -147,19 +564,34 @@ class Object(Node):
         if name in self._children:
             raise KeyError("Child name already exists: %s" % name)
 
+        self._prepare()
         self._children[name] = node
+        node.set_parent(self)
+        self._notify('node_added', [name], node, _live_count(node))
         return node
 
+    def create_child(self, key: str, source: NodeType) -> NodeType:
+        """Create a child of this node from a node in another tree.
+
+        :param key: Name of the new child.
+        :param source: Node whose configuration the child should have.
+        :returns: Reference to the new child."""
+        return self.add_child(source.snapshot(key))
+
     def remove_child(self, name: str) -> NodeType:
         """Remove a child from this node.
 
         :param name: Name of child node.
         :returns: Reference to removed child node."""
         node = self._children.get(name)
-        if not node:
+        if node is None:
             raise KeyError("No such child: %s" % name)
 
+        self._prepare()
         del self._children[name]
+        if node.get_parent() is self:
+            node.set_parent(None)
+        self._notify('node_removed', [name], node, -_live_count(node))
         return node
 
     def has_child(self, name: str) -> bool:
@@ -170,36 +602,101 @@ class Object(Node):
 
         return name in self._children
 
+    def key_of(self, node: NodeType) -> str:
+        """Return the path element naming a child of this node.
+
+        :param node: Child node.
+        :returns: Name of the child."""
+        return node.get_name()
+
     def get_child(self, name: str) -> NodeType:
         """Return named child.
 
         :param name: Name of child node.
         :returns: Child node."""
 
-        return self._children.get(name)
+        if self._adopted or name not in self._children:
+            return self._children.get(name)
+        return self._adopt(name)
 
     def items(self):
+        self._adopt_all()
         return self._children.items()
 
     def keys(self):
         return self._children.keys()
 
+    def peek_items(self):
+        """Return (name, child) pairs, for reading only."""
+        return self._children.items()
+
     def values(self):
+        self._adopt_all()
         return self._children.values()
 
+    def snapshot(self, name: str = None, pending: list = None) -> 'Object':
+        """Return a detached, plain copy of this subtree.
+
+        :param name: Name for the copy, defaulting to this node's name."""
+
+        copy = Object(self._name if name is None else name)
+        if self._live:
+            copy._children = {}
+            copy._shared = False
+            for key, child in self._children.items():
+                node = child.snapshot(None, pending)
+                node.set_parent(copy)
+                copy._children[key] = node
+        else:
+            copy._children = self._children
+            copy._shared = self._shared = True
+            copy._adopted = False
+            copy._digest = self._digest
+        return copy
+
+    def digest(self) -> bytes:
+        """Return a hash of the contents of this subtree."""
+
+        digest = self._digest
+        if digest is None:
+            h = hashlib.blake2b(b'o', digest_size=DIGEST_SIZE)
+            for name in sorted(self._children):
+                h.update(name.encode())
+                h.update(b'\0')
+                h.update(self._children[name].digest())
+            digest = h.digest()
+            if not self._live:
+                self._digest = digest
+        return digest
+
+    def export(self) -> dict:
+        """Return the contents of this subtree as a dict."""
+        return {name: child.export() for name, child in self._children.items()}
+
     def delete(self):
         pass
 
+    def _adopt_all(self):
+        """(Internal) Ensure all children are owned by this node."""
+
+        if not self._adopted:
+            for name in list(self._children):
+                self._adopt(name)
+            self._adopted = True
+        return
+
 
 class Property(Node):
     """Base class for leaf nodes."""
 
+    __slots__ = ('_name', '_parent')
+
     def __init__(self, name: str, parent: Object = None):
         """Constructor.
 
         :param name: Name for tree node.
         :param parent: Reference to parent container."""
-        self._name = name
+        self._name = sys.intern(name)
         self._parent = parent
         return
 
@@ -223,6 +720,47 @@ class Property(Node):
         """Get the container for this node."""
         return self._parent
 
+    def is_live(self) -> bool:
+        """Return True if this property's value is provided by the service.
+
+        Live properties are read when the tree is copied; other
+        properties can be shared between copies."""
+        return True
+
+    def digest(self) -> bytes:
+        """Return a hash of this property's current value."""
+        return value_digest(self.get())
+
+    def export(self):
+        """Return this property's current value."""
+        return self.get()
+
+    def snapshot(self, name: str = None, pending: list = None) -> 'Value':
+        """Return a detached Value holding this property's current value.
+
+        :param name: Name for the copy, defaulting to this node's name.
+        :param pending: If given, the value is not read: the copy is
+          left empty, and (self, copy) is appended to this list."""
+
+        name = self._name if name is None else name
+        if pending is None:
+            return Value(name, None, self.get())
+
+        copy = Value(name)
+        pending.append((self, copy))
+        return copy
+
+    def changed(self):
+        """Notify listeners that the value of this property has changed.
+
+        Live properties whose value is changed by the service, rather
+        than by a call to set(), should call this."""
+
+        parent = self._parent
+        if parent is not None:
+            parent._notify('value_changed', [parent.key_of(self)], self)
+        return
+
     def set(self, value) -> object:
         """Set the value of this node.
 
@@ -242,6 +780,25 @@ class Property(Node):
         not be read."""
         pass
 
+    async def aset(self, value) -> object:
+        """Set the value of this node, asynchronously.
+
+        :param value: Value to be assigned to this node.
+        :returns: 'value' if successful, otherwise None.
+
+        Live properties whose setter performs I/O should override this.
+        By default, it calls set()."""
+        return self.set(value)
+
+    async def aget(self) -> object:
+        """Get the value of this node, asynchronously.
+
+        :returns: Node's value if successful, otherwise None.
+
+        Live properties whose getter performs I/O should override this.
+        By default, it calls get()."""
+        return self.get()
+
     def delete(self):
         """Destroy this node.
 
@@ -250,3 +807,95 @@ class Property(Node):
         this has more effect at the Object level, rather than for its
         properties, but it depends on the actual semantics."""
         pass
+
+
+class Value(Property):
+    """Leaf node holding its own value.
+
+    Values are used for trees that are not connected to the service,
+    such as saved and staged configurations."""
+
+    __slots__ = ('_value', '_digest')
+
+    def __init__(self, name: str, parent: Object = None, value=None):
+        """Constructor.
+
+        :param name: Name for tree node.
+        :param parent: Reference to parent container.
+        :param value: Initial value."""
+        super().__init__(name, parent)
+        self._value = value
+        self._digest = None
+        return
+
+    def is_live(self) -> bool:
+        """Returns False for Value instances."""
+        return False
+
+    def digest(self) -> bytes:
+        """Return a hash of this node's value."""
+
+        if self._digest is None:
+            self._digest = value_digest(self._value)
+        return self._digest
+
+    def snapshot(self, name: str = None, pending: list = None) -> 'Value':
+        """Return a detached copy of this node.
+
+        :param name: Name for the copy, defaulting to this node's name.
+        :param pending: Unused: a Value is always copied directly."""
+        copy = Value(self._name if name is None else name, None, self._value)
+        copy._digest = self._digest
+        return copy
+
+    def set(self, value) -> object:
+        """Set the value of this node.
+
+        :param value: Value to be assigned to this node.
+        :returns: 'value'."""
+        self._prepare()
+        self._value = value
+        self._digest = None
+        self.changed()
+        return value
+
+    def get(self) -> object:
+        """Get the value of this node.
+
+        :returns: Node's value."""
+        return self._value
+
+
+def build(name: str, data) -> NodeType:
+    """Build a plain tree from exported data.
+
+    :param name: Name for the root node.
+    :param data: Data, as returned by export().
+    :returns: Root node of the new tree.
+
+    Dicts become Objects, lists become Lists, and anything else becomes
+    a Value."""
+
+    if isinstance(data, dict):
+        node = Object(name)
+        if data:
+            node._children = {}
+            node._shared = False
+            for key, value in data.items():
+                child = build(key, value)
+                child._parent = node
+                node._children[child.get_name()] = child
+        return node
+
+    if isinstance(data, list):
+        node = List(name, None)
+        if data:
+            node._children = []
+            node._shared = False
+            for index, value in enumerate(data):
+                child = build(str(index), value)
+                child._parent = node
+                node._children.append(child)
+        return node
+
+    return Value(name, None, data)
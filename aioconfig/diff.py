@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+from typing import Iterator, NamedTuple, Optional
+
+from .core import List, NodeType, PathType
+
+
+# Change actions.
+ADD = 'add'
+REMOVE = 'remove'
+MODIFY = 'modify'
+
+
+class Change(NamedTuple):
+    """Difference between two trees at a single path.
+
+    For ADD, 'old' is None and 'new' is the added subtree.  For REMOVE,
+    'old' is the removed subtree and 'new' is None.  For MODIFY, both
+    are properties, and their values differ."""
+
+    action: str
+    path: PathType
+    old: Optional[NodeType]
+    new: Optional[NodeType]
+
+
+def diff(old: NodeType, new: NodeType, path: PathType = ()) -> Iterator[Change]:
+    """Generate the changes needed to turn one tree into another.
+
+    :param old: Root of the original tree.
+    :param new: Root of the changed tree.
+    :param path: Path prefix for the reported changes.
+
+    Changes are generated as the trees are walked, so a large set of
+    differences is never held in memory.  Subtrees whose digests match
+    are not walked.  An added or removed subtree is reported once, at
+    its root.  The trees must not be modified while they are compared."""
+
+    if old.is_leaf() or new.is_leaf():
+        if not old.is_leaf() or not new.is_leaf():
+            yield Change(REMOVE, path, old, None)
+            yield Change(ADD, path, None, new)
+        elif old.digest() != new.digest():
+            yield Change(MODIFY, path, old, new)
+        return
+
+    if isinstance(old, List) != isinstance(new, List):
+        yield Change(REMOVE, path, old, None)
+        yield Change(ADD, path, None, new)
+        return
+
+    if not old.is_live() and not new.is_live() and \
+            old.digest() == new.digest():
+        return
+
+    new_children = dict(new.peek_items())
+    for key, old_child in old.peek_items():
+        new_child = new_children.pop(key, None)
+        if new_child is None:
+            yield Change(REMOVE, path + (key,), old_child, None)
+        else:
+            yield from diff(old_child, new_child, path + (key,))
+
+    for key, new_child in new_children.items():
+        yield Change(ADD, path + (key,), None, new_child)
+    return
@@ -37,3 +37,8 @@ class BadStorageURLFormat(AsynchronousConfigException):
 class BadStorageURLScheme(AsynchronousConfigException):
     """Storage URL scheme doesn't match expected value."""
     pass
+
+
+class StorageCorrupted(AsynchronousConfigException):
+    """Stored configuration is missing or inconsistent."""
+    pass
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+from .core import Container, NodeType, PathType, TreeListener
+from .index import split_path
+from .journal import ADD, REMOVE, SET
+
+
+# Default interval over which changes are coalesced, in seconds.
+FEED_INTERVAL = 0.1
+
+# Default number of undelivered batches held for each subscriber.
+QUEUE_SIZE = 64
+
+# Event telling a subscriber that changes were dropped.
+RESYNC = 'resync'
+
+
+class Subscriber:
+    """Receiver of batches of changes below a set of paths.
+
+    Each batch is a list of events, as dicts with 'event' (SET, ADD or
+    REMOVE), 'path', and (except for REMOVE) the node's 'value'.  An
+    ADD event means the subtree at 'path' now has 'value', replacing
+    anything there before.
+
+    Batches are queued until taken.  If the queue is full, the queued
+    batches are dropped and replaced by a single RESYNC event: the
+    subscriber should then re-read the paths it is interested in."""
+
+    def __init__(self, feed: 'ChangeFeed', prefixes: List[PathType],
+                 size: int):
+        """Constructor.
+
+        :param feed: Feed delivering to this subscriber.
+        :param prefixes: Paths below which changes are delivered.
+        :param size: Maximum number of queued batches."""
+
+        self._feed = feed
+        self._prefixes = prefixes
+        self._queue = asyncio.Queue(size)
+        self._resyncs = 0
+        return
+
+    def get_prefixes(self) -> List[PathType]:
+        """Return the paths below which changes are delivered."""
+        return list(self._prefixes)
+
+    def get_resyncs(self) -> int:
+        """Return the number of times queued changes were dropped."""
+        return self._resyncs
+
+    async def get(self) -> Optional[List[dict]]:
+        """Return the next batch of events, or None once closed."""
+        return await self._queue.get()
+
+    def close(self):
+        """Stop delivering changes to this subscriber."""
+
+        self._feed.unsubscribe(self)
+        return
+
+    def _put(self, batch: Optional[List[dict]]):
+        """(Internal) Queue a batch, or None to mark the end."""
+
+        if self._queue.full():
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._resyncs += 1
+            self._queue.put_nowait([{'event': RESYNC}])
+        self._queue.put_nowait(batch)
+        return
+
+
+class ChangeFeed(TreeListener):
+    """Listener delivering coalesced changes to subscribers.
+
+    Changes are collected for an interval, keeping only the latest
+    change to each path, and then delivered in one batch to each
+    subscriber with a path prefix at or above them.  Values are read
+    when the batch is made.  The feed listens to the tree only while
+    it has subscribers."""
+
+    def __init__(self, root: Container, interval: float = FEED_INTERVAL,
+                 size: int = QUEUE_SIZE):
+        """Constructor.
+
+        :param root: Root of the tree; paths are relative to this.
+        :param interval: Interval over which changes are coalesced.
+        :param size: Number of undelivered batches held per subscriber."""
+
+        self._root = root
+        self._interval = interval
+        self._size = size
+        self._subscribers: Dict[PathType, Set[Subscriber]] = {}
+        self._count = 0
+        self._changes: Dict[PathType, tuple] = {}
+        self._timer = None
+        return
+
+    def subscribe(self, paths: Iterable[str]) -> Subscriber:
+        """Return a new subscriber to changes below some paths.
+
+        :param paths: Path strings, separated by '/' or '.'.  The empty
+          path subscribes to every change."""
+
+        prefixes = list(dict.fromkeys(split_path(path) for path in paths))
+        subscriber = Subscriber(self, prefixes, self._size)
+        if not self._count:
+            self._root.add_listener(self)
+        self._count += 1
+        for prefix in prefixes:
+            self._subscribers.setdefault(prefix, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Stop delivering changes to a subscriber.
+
+        :param subscriber: Subscriber returned by subscribe()."""
+
+        removed = False
+        for prefix in subscriber.get_prefixes():
+            subscribers = self._subscribers.get(prefix)
+            if subscribers is not None and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                removed = True
+                if not subscribers:
+                    del self._subscribers[prefix]
+
+        if removed:
+            self._count -= 1
+            if not self._count:
+                self._root.remove_listener(self)
+                self._changes.clear()
+        return
+
+    def close(self):
+        """Deliver pending changes, then end every subscription."""
+
+        self.flush()
+        subscribers = set()
+        for prefix_subscribers in self._subscribers.values():
+            subscribers.update(prefix_subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+            subscriber._put(None)
+        return
+
+    def node_added(self, path: PathType, node: NodeType):
+        self._change(path, ADD, node)
+        return
+
+    def node_removed(self, path: PathType, node: NodeType):
+        self._change(path, REMOVE, node)
+        return
+
+    def children_moved(self, path: PathType, node: NodeType):
+        self._change(path, ADD, node)
+        return
+
+    def value_changed(self, path: PathType, node: NodeType):
+        self._change(path, SET, node)
+        return
+
+    def flush(self):
+        """Deliver the changes collected so far."""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        changes, self._changes = self._changes, {}
+        batches: Dict[Subscriber, List[dict]] = {}
+        for path, (event, node) in changes.items():
+            subscribers = self._match(path, event != SET)
+            if not subscribers:
+                continue
+
+            record = {'event': event, 'path': '/'.join(path)}
+            if event != REMOVE:
+                record['value'] = node.export()
+            for subscriber in subscribers:
+                batches.setdefault(subscriber, []).append(record)
+
+        for subscriber, batch in batches.items():
+            subscriber._put(batch)
+        return
+
+    def _change(self, path: PathType, event: str, node: NodeType):
+        """(Internal) Record a change, and arrange for it to be delivered."""
+
+        self._changes.pop(path, None)
+        self._changes[path] = (event, node)
+        if self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                self._timer = loop.call_later(self._interval, self.flush)
+        return
+
+    def _match(self, path: PathType, below: bool) -> Set[Subscriber]:
+        """(Internal) Return the subscribers to a change.
+
+        :param path: Path of the changed node.
+        :param below: If True, also match subscribers to paths below
+          it (since the change replaces their subtrees)."""
+
+        result = set()
+        for end in range(len(path) + 1):
+            subscribers = self._subscribers.get(path[:end])
+            if subscribers:
+                result.update(subscribers)
+
+        if below:
+            for prefix, subscribers in self._subscribers.items():
+                if len(prefix) > len(path) and prefix[:len(path)] == path:
+                    result.update(subscribers)
+        return result
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import bisect
+import datetime
+import json
+import mmap
+import os
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, quote
+
+from .errors import BadStorageURLFormat, BadStorageURLScheme
+from .storage import StorageAdaptor, get_codec, select_subtree
+from .storage import register_storage_adaptor
+
+
+# Configurations are stored in a directory per server, below the
+# directory named by the URL (eg. 'file:///var/lib/service'), using
+# the codec named by an optional 'codec' query parameter.
+#
+# Each saved configuration is a file named by its timestamp, and the
+# staged configuration is the file 'staged'.  Files are written to a
+# temporary name, synced, and renamed into place, so a file is either
+# complete or absent.  They are read through a memory map.
+#
+# The 'index' file lists saved configurations, so that listing them
+# doesn't scan the directory.  It is append-only, one line per change:
+#
+#   s <timestamp> <codec> <seq>   Saved configuration, including the
+#                                 journal up to <seq> (or '-').
+#   t <codec>                     Staged configuration.
+#   a <timestamp>                 Configurations before <timestamp> are
+#                                 archived.
+#   d <timestamp>                 Configuration deleted.
+#   j <seq>                       Journal up to <seq> discarded.
+#
+# Lines are only valid once terminated, so a line partly written when
+# the process stopped is ignored (and the index is rewritten).  The
+# index is rewritten, again atomically, when most of its lines are
+# obsolete.
+#
+# The 'journal' file holds change journal records, a JSON-encoded
+# [seq, record] per line, appended and synced a batch at a time.
+
+INDEX = 'index'
+JOURNAL = 'journal'
+STAGED = 'staged'
+TEMP_SUFFIX = '.tmp'
+
+# File name format for saved configurations.
+FILE_FORMAT = '%Y%m%dT%H%M%S.%f'
+
+# Minimum number of obsolete index lines before the index is rewritten.
+INDEX_SLACK = 1000
+
+
+class FileStorageAdaptor(StorageAdaptor):
+    """Storage adaptor keeping each configuration in its own file.
+
+    Writes are atomic, and synced to disk before returning.  Property
+    history is not recorded."""
+
+    def __init__(self, server_id: str, url: str):
+        super().__init__(server_id, url)
+
+        options = dict(parse_qsl(url.partition('?')[2]))
+        self._encoding = options.get('codec', 'json')
+        self._codec = get_codec(self._encoding)
+
+        self._dir = os.path.join(self._get_path_from_url(url),
+                                 quote(server_id, safe=''))
+        os.makedirs(self._dir, exist_ok=True)
+
+        # Saved configurations, as timestamp: (codec, archived), with a
+        # sorted list of the un-archived timestamps.
+        self._saved = {}
+        self._names = []
+        self._staged = None
+        self._compacted = 0
+        self._last = None
+        self._lines = 0
+        self._index = None
+        self._read_index()
+        return
+
+    def close(self):
+        """Close the index file."""
+
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        return
+
+    def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
+
+        if not self._names:
+            return
+        return self.load_saved(self._names[-1], path)
+
+    def load_staged(self) -> Optional[dict]:
+        """Load staged configuration."""
+
+        if self._staged is None:
+            return
+        return self._read(STAGED, self._staged)
+
+    def load_saved(self, name: datetime.datetime,
+                   path: str = None) -> Optional[dict]:
+        """Load specified saved configuration.
+
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
+
+        entry = self._saved.get(name)
+        if entry is None or entry[1]:
+            return
+        return select_subtree(self._read(self._file_name(name), entry[0]),
+                              path)
+
+    def save_current(self, config: dict) -> datetime.datetime:
+        """Save config as running.
+
+        :returns: Timestamp of the saved configuration."""
+        return self._save_current(config, None)
+
+    def save_staged(self, config: dict):
+        """Save config as staged."""
+
+        self._write(STAGED, self._codec.encode(config))
+        self._staged = self._encoding
+        self._append_index('t %s' % self._encoding)
+        return
+
+    def list_saved(self, since: datetime.datetime = None,
+                   until: datetime.datetime = None, limit: int = None,
+                   before: datetime.datetime = None
+                   ) -> List[datetime.datetime]:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
+
+        start = 0 if since is None else bisect.bisect_left(self._names, since)
+        end = len(self._names)
+        if until is not None:
+            end = bisect.bisect_right(self._names, until)
+        if before is not None:
+            end = min(end, bisect.bisect_left(self._names, before))
+        if limit is not None:
+            start = max(start, end - limit)
+        return self._names[start:end][::-1]
+
+    def archive(self, cutoff: datetime.datetime):
+        """Flag as archived all configurations older than timestamp.
+
+        :param cutoff: Cut-off timestamp."""
+
+        self._append_index('a %s' % self._to_timestamp(cutoff))
+        self._archive(cutoff)
+        return
+
+    def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+
+        names = [name for name in names if name in self._saved]
+        if names:
+            self._append_index(*('d %s' % self._to_timestamp(name)
+                                 for name in names))
+        for name in names:
+            self._delete(name)
+        return
+
+    def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+
+        archived = sorted(name for name, (_, flag) in self._saved.items()
+                          if flag)
+        self.delete_saved(archived[:limit])
+        return min(len(archived), limit)
+
+    def reclaim(self):
+        """Rewrite the index, if most of its lines are obsolete."""
+
+        if self._lines > 2 * (len(self._saved) + 2) + INDEX_SLACK:
+            self._rewrite_index()
+        return
+
+    def history(self, path: str, since: datetime.datetime = None,
+                until: datetime.datetime = None) -> list:
+        """Return the changes to a property's saved value.
+
+        History is not recorded by this adaptor, so this is empty."""
+        return []
+
+    def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal, and sync it.
+
+        :param records: List of (sequence number, record) pairs."""
+
+        lines = ''.join(json.dumps([seq, record]) + '\n'
+                        for seq, record in records)
+        with open(os.path.join(self._dir, JOURNAL), 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        return
+
+    def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs.
+
+        Records already included in a saved configuration are skipped."""
+
+        records = []
+        for seq, record in self._read_journal():
+            if seq > self._compacted:
+                records.append((seq, record))
+        return records
+
+    def compact_journal(self, config: Optional[dict],
+                        seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
+
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration.
+
+        The index records the sequence number with the configuration,
+        so records are skipped even if the journal is not yet rewritten
+        when the process stops."""
+
+        timestamp = None
+        if config is None:
+            self._append_index('j %u' % seq)
+        else:
+            timestamp = self._save_current(config, seq)
+        self._compacted = max(self._compacted, seq)
+
+        lines = ''.join(json.dumps([number, record]) + '\n'
+                        for number, record in self._read_journal()
+                        if number > seq)
+        self._write(JOURNAL, lines.encode())
+        return timestamp
+
+    def _save_current(self, config: dict,
+                      seq: Optional[int]) -> datetime.datetime:
+        """(Internal) Write a saved configuration, and add it to the index."""
+
+        name = self._next_saved()
+        self._write(self._file_name(name), self._codec.encode(config))
+        self._append_index('s %s %s %s' % (
+            self._to_timestamp(name), self._encoding,
+            '-' if seq is None else seq))
+        self._saved[name] = (self._encoding, False)
+        self._names.append(name)
+        if seq is not None:
+            self._compacted = max(self._compacted, seq)
+        return name
+
+    def _next_saved(self) -> datetime.datetime:
+        """(Internal) Return a timestamp for a new saved configuration.
+
+        Timestamps have millisecond resolution, so saves made within one
+        millisecond are given successive timestamps."""
+
+        moment = datetime.datetime.utcnow()
+        moment = moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+        latest = max(self._saved, default=self._last)
+        if self._last is not None and (latest is None or self._last > latest):
+            latest = self._last
+        if latest is not None and moment <= latest:
+            moment = latest + datetime.timedelta(milliseconds=1)
+        self._last = moment
+        return moment
+
+    def _archive(self, cutoff: datetime.datetime):
+        """(Internal) Flag configurations older than cutoff as archived."""
+
+        end = bisect.bisect_left(self._names, cutoff)
+        for name in self._names[:end]:
+            self._saved[name] = (self._saved[name][0], True)
+        del self._names[:end]
+        return
+
+    def _delete(self, name: datetime.datetime):
+        """(Internal) Forget a saved configuration, and remove its file."""
+
+        if not self._saved.pop(name)[1]:
+            self._names.remove(name)
+        try:
+            os.unlink(os.path.join(self._dir, self._file_name(name)))
+        except FileNotFoundError:
+            pass
+        return
+
+    def _read(self, file_name: str, encoding: str) -> dict:
+        """(Internal) Decode a stored configuration, through a memory map."""
+
+        with open(os.path.join(self._dir, file_name), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                with memoryview(m) as view:
+                    return get_codec(encoding).decode(view)
+
+    def _write(self, file_name: str, data):
+        """(Internal) Replace a file atomically, and sync it to disk."""
+
+        if isinstance(data, str):
+            data = data.encode()
+
+        path = os.path.join(self._dir, file_name)
+        with open(path + TEMP_SUFFIX, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + TEMP_SUFFIX, path)
+        self._sync_dir()
+        return
+
+    def _sync_dir(self):
+        """(Internal) Sync the directory, so that renames are durable."""
+
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self._dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return
+
+    def _read_journal(self) -> List[Tuple[int, list]]:
+        """(Internal) Return all complete records in the journal file."""
+
+        try:
+            with open(os.path.join(self._dir, JOURNAL)) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return []
+
+        records = []
+        for line in text.splitlines(keepends=True):
+            if line.endswith('\n'):
+                seq, record = json.loads(line)
+                records.append((seq, record))
+        return records
+
+    def _read_index(self):
+        """(Internal) Load the index, and open it for appending."""
+
+        path = os.path.join(self._dir, INDEX)
+        try:
+            with open(path) as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ''
+
+        lines = text.splitlines(keepends=True)
+        for line in lines:
+            if line.endswith('\n'):
+                self._apply(line.split())
+        self._names = sorted(name for name, (_, archived)
+                             in self._saved.items() if not archived)
+        self._lines = len(lines)
+
+        if text and not text.endswith('\n'):
+            self._rewrite_index()
+        else:
+            self._index = open(path, 'a')
+        return
+
+    def _apply(self, words: List[str]):
+        """(Internal) Apply an index line to the in-memory index."""
+
+        if words[0] == 's':
+            name = self._from_timestamp(words[1])
+            self._saved[name] = (words[2], False)
+            if words[3] != '-':
+                self._compacted = max(self._compacted, int(words[3]))
+        elif words[0] == 't':
+            self._staged = words[1]
+        elif words[0] == 'a':
+            cutoff = self._from_timestamp(words[1])
+            for name, (encoding, _) in list(self._saved.items()):
+                if name < cutoff:
+                    self._saved[name] = (encoding, True)
+        elif words[0] == 'd':
+            self._saved.pop(self._from_timestamp(words[1]), None)
+        elif words[0] == 'j':
+            self._compacted = max(self._compacted, int(words[1]))
+        return
+
+    def _append_index(self, *lines: str):
+        """(Internal) Append lines to the index, and sync it."""
+
+        self._index.write(''.join(line + '\n' for line in lines))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._lines += len(lines)
+        return
+
+    def _rewrite_index(self):
+        """(Internal) Replace the index with one line per live entry."""
+
+        lines = ['j %u' % self._compacted]
+        if self._staged is not None:
+            lines.append('t %s' % self._staged)
+        for name in sorted(self._saved):
+            lines.append('s %s %s -' % (self._to_timestamp(name),
+                                        self._saved[name][0]))
+        archived = [name for name, (_, flag) in self._saved.items() if flag]
+        if archived:
+            cutoff = max(archived) + datetime.timedelta(milliseconds=1)
+            lines.append('a %s' % self._to_timestamp(cutoff))
+
+        if self._index is not None:
+            self._index.close()
+        self._write(INDEX, ''.join(line + '\n' for line in lines))
+        self._index = open(os.path.join(self._dir, INDEX), 'a')
+        self._lines = len(lines)
+        return
+
+    @staticmethod
+    def _file_name(name: datetime.datetime) -> str:
+        """(Internal) Return the file name for a saved configuration."""
+        return name.strftime(FILE_FORMAT)
+
+    @staticmethod
+    def _to_timestamp(moment: datetime.datetime) -> str:
+        return moment.isoformat(timespec='milliseconds')
+
+    @staticmethod
+    def _from_timestamp(value: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+
+    @staticmethod
+    def _get_path_from_url(url: str) -> str:
+        point = url.find('://')
+        if point == -1:
+            raise BadStorageURLFormat("Bad URL format: expecting "
+                                      "'file://directory', but got %s" % url)
+
+        scheme = url[:point]
+        if scheme != 'file':
+            raise BadStorageURLScheme("Bad URL scheme: expecting "
+                                      "'file', but got %s" % scheme)
+
+        return url[point + 3:].partition('?')[0]
+
+
+register_storage_adaptor("file", FileStorageAdaptor)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import sys
+from typing import Dict, Set
+
+from .core import Container, NodeType, PathType, TreeListener
+
+
+def split_path(path: str) -> PathType:
+    """Split a path string into a tuple of interned path elements.
+
+    :param path: Path string, separated by either '/' or '.'.
+
+    If the path contains a '/', that is taken as the separator (so
+    that saved tree names, which contain a '.', can be used).
+    Otherwise elements are separated by '.', as used by the
+    decorators."""
+
+    separator = '/' if '/' in path else '.'
+    return tuple(sys.intern(name) for name in path.split(separator) if name)
+
+
+class PathIndex(TreeListener):
+    """Index of tree nodes by path.
+
+    The index is populated as paths are resolved, and kept up to date
+    by listening for changes to the tree, so repeated lookups of the
+    same path do not walk the tree.  Nodes that are never looked up
+    are not indexed, so the index does not add to the cost of large
+    trees."""
+
+    # Limit on cached path string parses.
+    MAX_PARSED = 65536
+
+    def __init__(self, root: Container):
+        """Constructor.
+
+        :param root: Root node of the indexed tree."""
+
+        self._root = root
+        self._nodes: Dict[PathType, NodeType] = {(): root}
+        self._children: Dict[PathType, Set[str]] = {}
+        self._parsed: Dict[str, PathType] = {}
+        return
+
+    def lookup(self, path: str) -> NodeType:
+        """Return a node reference by path.
+
+        :param path: Path string, separated by either '/' or '.'.
+        :returns: Reference to node."""
+
+        names = self._parsed.get(path)
+        if names is None:
+            names = split_path(path)
+            if len(self._parsed) >= self.MAX_PARSED:
+                self._parsed.clear()
+            self._parsed[path] = names
+
+        node = self._nodes.get(names)
+        if node is None:
+            node = self._resolve(names)
+        return node
+
+    def resolve(self, names: PathType) -> NodeType:
+        """Return a node reference by path tuple.
+
+        :param names: Tuple of path elements.
+        :returns: Reference to node."""
+
+        node = self._nodes.get(names)
+        if node is None:
+            node = self._resolve(names)
+        return node
+
+    def node_removed(self, path: PathType, node: NodeType):
+        """Discard the index entries for a removed subtree."""
+
+        keys = self._children.get(path[:-1])
+        if keys is not None:
+            keys.discard(path[-1])
+        self._discard(path)
+        return
+
+    def node_unloaded(self, path: PathType, node: NodeType):
+        """Discard the index entries for a subtree dropped from memory."""
+
+        self.node_removed(path, node)
+        return
+
+    def children_moved(self, path: PathType, node: NodeType):
+        """Discard the index entries below a renumbered List."""
+
+        for key in self._children.pop(path, ()):
+            self._discard(path + (key,))
+        return
+
+    def _resolve(self, names: PathType) -> NodeType:
+        """(Internal) Walk the tree from the longest indexed prefix."""
+
+        start = len(names) - 1
+        while names[:start] not in self._nodes:
+            start -= 1
+
+        node = self._nodes[names[:start]]
+        for end in range(start + 1, len(names) + 1):
+            name = names[end - 1]
+            node = None if node.is_leaf() else node.get_child(name)
+            if node is None:
+                raise NameError("Lookup failed: %s" % name)
+            self._insert(names[:end], node)
+
+        return node
+
+    def _insert(self, path: PathType, node: NodeType):
+        """(Internal) Add an index entry."""
+
+        self._nodes[path] = node
+        keys = self._children.get(path[:-1])
+        if keys is None:
+            keys = self._children[path[:-1]] = set()
+        keys.add(path[-1])
+        return
+
+    def _discard(self, path: PathType):
+        """(Internal) Remove index entries for a path and its descendants."""
+
+        self._nodes.pop(path, None)
+        for key in self._children.pop(path, ()):
+            self._discard(path + (key,))
+        return
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+from .core import Container, List as ListNode, NodeType, PathType
+from .core import TreeListener, build
+
+
+# Journal record operations.
+SET = 'set'
+ADD = 'add'
+REMOVE = 'remove'
+
+# Default delay before buffered records are written, in seconds.
+FLUSH_INTERVAL = 0.05
+
+# Default number of buffered records which are written immediately.
+FLUSH_BATCH = 1000
+
+RecordType = Tuple[int, list]
+
+
+class ChangeJournal(TreeListener):
+    """Listener recording changes to a tree, for storage in a journal.
+
+    Each change becomes a small record: [SET, path, value] for a
+    changed property, [ADD, path, subtree] for an added node, or
+    [REMOVE, path] for a removed node, with paths relative to the
+    tree's root.  Records are numbered, and buffered until either the
+    flush interval has passed or the batch is full, so that they are
+    written (and synced to disk) a batch at a time."""
+
+    def __init__(self, write: Callable[[List[RecordType]], None],
+                 interval: float = FLUSH_INTERVAL,
+                 batch: int = FLUSH_BATCH):
+        """Constructor.
+
+        :param write: Function passed each batch of (sequence number,
+          record) pairs, in order.
+        :param interval: Delay before buffered records are written.
+        :param batch: Number of buffered records written immediately."""
+
+        self._write = write
+        self._interval = interval
+        self._batch = batch
+        self._records = []
+        self._seq = 0
+        self._timer = None
+        return
+
+    def get_seq(self) -> int:
+        """Return the sequence number of the latest record."""
+        return self._seq
+
+    def set_seq(self, seq: int):
+        """Continue numbering records after an existing journal.
+
+        :param seq: Sequence number of the last stored record."""
+
+        self._seq = max(self._seq, seq)
+        return
+
+    def node_added(self, path: PathType, node: NodeType):
+        self._append([ADD, list(path), node.export()])
+        return
+
+    def node_removed(self, path: PathType, node: NodeType):
+        self._append([REMOVE, list(path)])
+        return
+
+    def value_changed(self, path: PathType, node: NodeType):
+        self._append([SET, list(path), node.export()])
+        return
+
+    def flush(self) -> int:
+        """Write buffered records now.
+
+        :returns: Sequence number of the latest record written."""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._records:
+            records, self._records = self._records, []
+            self._write(records)
+        return self._seq
+
+    def _append(self, record: list):
+        """(Internal) Buffer a record, and arrange for it to be written."""
+
+        self._seq += 1
+        self._records.append((self._seq, record))
+        if len(self._records) >= self._batch:
+            self.flush()
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                self._timer = loop.call_later(self._interval, self.flush)
+        return
+
+
+def replay(root: Container, records: List[RecordType]) -> int:
+    """Apply journal records to a tree.
+
+    :param root: Root of the tree the records were made from.
+    :param records: List of (sequence number, record) pairs, in order.
+    :returns: Sequence number of the last record, or zero.
+
+    Nodes are created using their parent's create_child(), and removed
+    nodes are deleted, as when deploying a configuration.  Records are
+    applied leniently: a record may already be reflected in the tree,
+    if it was made while the tree was being saved."""
+
+    seq = 0
+    for seq, record in records:
+        op, path = record[0], record[1]
+        parent = _resolve(root, path[:-1])
+        if parent is None or parent.is_leaf():
+            continue
+
+        key = path[-1]
+        node = parent.get_child(key)
+        if op == SET:
+            if node is not None and node.is_leaf():
+                node.set(record[2])
+
+        elif op == ADD:
+            if node is not None and not isinstance(parent, ListNode):
+                parent.remove_child(key)
+                node.delete()
+            parent.create_child(key, build(key, record[2]))
+
+        elif op == REMOVE and node is not None:
+            parent.remove_child(int(key) if isinstance(parent, ListNode)
+                                else key)
+            node.delete()
+    return seq
+
+
+def _resolve(root: Container, path: List[str]) -> Optional[NodeType]:
+    """(Internal) Return the node at a path below root, or None."""
+
+    node = root
+    for name in path:
+        if node.is_leaf():
+            return None
+        node = node.get_child(name)
+        if node is None:
+            return None
+    return node
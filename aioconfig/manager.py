@@ -36,12 +36,38 @@
 # This is a bit ugly.  Perhaps a solution with a decorator would be
 # nicer?
 
+import asyncio
+import contextlib
 import datetime
-from .core import Object, Property, Node
-from .storage import create_storage_adaptor
+from typing import Iterator, List as List_t, Union
+
+from .core import Container, List, Object, Node, build, value_digest
+from .diff import Change, diff
+from .index import PathIndex, split_path
+from .journal import FLUSH_INTERVAL, ChangeJournal, replay
+from .retention import RetentionPolicy
+from .saved import SavedTrees, weigh
+from .storage import create_async_storage_adaptor
+from .versions import SubtreeVersions
 from .access import create_access_adaptor
 
 
+# Default limit on concurrent asynchronous property accesses.
+DEFAULT_CONCURRENCY = 64
+
+# Saved configurations deleted from storage per transaction, when pruning.
+PRUNE_BATCH = 100
+
+# Default interval between background retention runs, in seconds.
+RETENTION_INTERVAL = 3600
+
+# Default interval between journal compactions, in seconds.
+COMPACT_INTERVAL = 300
+
+# Operations accepted by Manager.batch().
+BATCH_OPERATIONS = ('get', 'set', 'create', 'delete')
+
+
 class Manager:
     """Service management element, including config, status and control."""
 
@@ -51,7 +77,14 @@ class Manager:
         self._server_id = None
         self._config_url = None
         self._store = None
+        self._pending = set()
         self._accessors = {}
+        self._retention = None
+        self._retainer = None
+        self._journal = None
+        self._compaction = None
+        self._compactor = None
+        self._compacted = 0
 
         self._root = Object('')
 
@@ -59,92 +92,451 @@ class Manager:
         self._root.add_child(config)
 
         config.add_child(Object('running'))
-        config.add_child(Object('saved'))
+        config.add_child(SavedTrees('saved', self._load_saved))
         config.add_child(Object('staged'))
 
         self._root.add_child(Object('status'))
+
+        self._index = PathIndex(self._root)
+        self._root.add_listener(self._index)
+        self._versions = SubtreeVersions()
+        self._root.add_listener(self._versions)
         return
 
     def get_node(self, name: str):
         """Return a node reference by name.
 
-        :param name: Full path to node."""
+        :param name: Full path to node, separated by '/' or '.'."""
 
-        names = name.split('/')
+        return self._index.lookup(name)
 
-        current = self._root
-        while names:
-            current = current.get_child(names[0])
-            if not current:
-                raise NameError("Lookup failed: %s" % names[0])
-            names.pop(0)
+    def get_version(self, name: str) -> str:
+        """Return a tag which changes whenever a subtree changes.
 
-        return current
+        :param name: Full path to the subtree's root node, separated by
+          '/' or '.'.
+
+        This does not look up the node, and a removed node's tag is
+        meaningless, so check that the node exists.  Live properties
+        must call changed() for their changes to be seen."""
+
+        return self._versions.get_tag(split_path(name))
 
     def load(self, url: str):
         """Load values of nodes from specified storage.
 
-        :param url: Configuration storage URL."""
+        :param url: Configuration storage URL.
+
+        Any changes journalled since the latest save are then replayed
+        onto running."""
 
         self.restore_staged()
-        self.restore_running()
+        with self._unjournalled():
+            self.restore_running()
+            if self._store:
+                self._replay(self._store.load_journal_now())
+        return
+
+    async def aload(self):
+        """Load the latest saved and the staged configurations from storage.
+
+        The latest saved configuration is then restored to running.
+        Other saved configurations are listed in 'config/saved', and
+        loaded when they are looked up."""
+
+        staged = await self._store.load_staged()
+        if staged is not None:
+            self._replace('config/saved', build('staged', staged))
+            self.restore_staged()
+
+        names = [name async for name in self._store.iter_saved()]
+        saved = self.get_node('config/saved')
+        for timestamp in reversed(names):
+            saved.add_stored(self._saved_name(timestamp), timestamp)
+
+        if names:
+            name = self._saved_name(names[0])
+            if not saved.is_loaded(name):
+                saved.insert_loaded(name,
+                                    await self._store.load_saved(names[0]))
+
+        journal = await self._store.load_journal()
+        with self._unjournalled():
+            if names:
+                self.restore_running(name)
+            self._replay(journal)
         return
 
-    def prune_saved(self, cutoff: datetime.datetime):
-        """Delete saved trees older than 'cutoff'.
+    def enable_journal(self, interval: float = FLUSH_INTERVAL,
+                       compact_interval: float = COMPACT_INTERVAL):
+        """Record each change to running in the storage journal.
+
+        :param interval: Delay before recorded changes are written, in
+          seconds, so that they are written (and synced) in batches.
+        :param compact_interval: Seconds between background saves of
+          running, each of which discards the journal it includes, while
+          the manager is started.  If None, only explicit saves do this.
 
-        :param cutoff: Discard saved trees older than this."""
-        pass
+        This should be called before loading, so that the journal
+        continues the stored one.  Changes since the latest save are
+        replayed when loading, whether or not the journal is enabled."""
 
-    def save_running(self):
-        """Persist running configuration."""
+        if not self._store:
+            raise ValueError("No configuration storage")
+
+        def write(records):
+            self._persist(self._store.append_journal(records))
+
+        self._journal = ChangeJournal(write, interval)
+        self._compaction = compact_interval
+        self.get_node('config/running').add_listener(self._journal)
+        return
+
+    async def aget_saved(self, name: str) -> Node:
+        """Return a saved tree, loading it from storage without blocking.
+
+        :param name: Name of the saved tree, within 'config/saved'."""
+
+        saved = self.get_node('config/saved')
+        timestamp = saved.get_timestamp(name)
+        if saved.is_loaded(name) or timestamp is None or not self._store:
+            node = saved.get_child(name)
+        else:
+            config = await self._store.load_saved(timestamp)
+            node = None if config is None \
+                else saved.insert_loaded(name, config)
+
+        if node is None:
+            raise NameError("No saved configuration: %s" % name)
+        return node
+
+    async def flush(self):
+        """Wait for background persistence to complete.
+
+        If a background call failed, its exception is raised (once).
+        Journal records not yet written are written first."""
+
+        if self._journal:
+            self._journal.flush()
+
+        while self._pending:
+            tasks = list(self._pending)
+            await asyncio.wait(tasks)
+
+            failed = None
+            for task in tasks:
+                if task.cancelled() or task.exception() is None:
+                    self._pending.discard(task)
+                elif failed is None:
+                    failed = task
+            if failed is not None:
+                self._pending.discard(failed)
+                raise failed.exception()
+        return
+
+    async def history(self, path: str, since: datetime.datetime = None,
+                      until: datetime.datetime = None) -> list:
+        """Return the changes to a property across saved configurations.
+
+        :param path: Path of the property, relative to the running
+          configuration (eg. 'sessions/foo/port').
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return.
+        :returns: List of storage.HistoryEntry, oldest first."""
+
+        if not self._store:
+            return []
+        return await self._store.history(path, since, until)
+
+    async def prune_saved(self, cutoff: datetime.datetime = None,
+                          policy: RetentionPolicy = None,
+                          batch_size: int = PRUNE_BATCH) -> int:
+        """Delete saved trees older than 'cutoff', or not kept by 'policy'.
+
+        :param cutoff: Discard saved trees older than this.
+        :param policy: Alternatively, discard saved trees not kept by
+          this retention policy.
+        :param batch_size: Number of saved configurations deleted from
+          storage in each transaction.
+        :returns: Number of saved trees deleted.
+
+        Expired trees are removed from 'config/saved' immediately.
+        Stored configurations are then deleted in batches, each of
+        which is followed by archived configurations and the release
+        of some free space, so other writes are never held up for long.
+        The staged configuration is never deleted."""
+
+        if (cutoff is None) == (policy is None):
+            raise ValueError("Specify one of cutoff or policy")
 
         now = datetime.datetime.utcnow()
-        name = now.strftime('%Y-%m-%dT%H:%M:%S.') + "%06u" % now.microsecond
+
+        def expired(names):
+            if policy is not None:
+                return policy.expired(names, now)
+            return [name for name in names if name < cutoff]
 
         saved = self.get_node('config/saved')
-        saved.add_child(Object(name))
+        trees = {datetime.datetime.fromisoformat(name): name
+                 for name in saved.keys() if name != 'staged'}
+        pruned = expired(trees)
+        for name in pruned:
+            saved.remove_child(trees[name])
+
+        if not self._store:
+            return len(pruned)
+
+        names = [name async for name in self._store.iter_saved()]
+        pruned = expired(names)
+        for start in range(0, len(pruned), batch_size):
+            await self._store.delete_saved(pruned[start:start + batch_size])
+            await self._store.reclaim()
+
+        while await self._store.purge_archived(batch_size):
+            await self._store.reclaim()
+        return len(pruned)
+
+    def set_retention(self, policy: Union[str, RetentionPolicy],
+                      interval: float = RETENTION_INTERVAL):
+        """Prune saved trees periodically, while the manager is running.
+
+        :param policy: Retention policy, or its description (see
+          RetentionPolicy.parse()).
+        :param interval: Seconds between runs of prune_saved()."""
+
+        if isinstance(policy, str):
+            policy = RetentionPolicy.parse(policy)
+        self._retention = (policy, interval)
+        return
+
+    def save_running(self, only_if_changed: bool = False):
+        """Persist running configuration.
+
+        :param only_if_changed: If True, and running is identical to
+          the most recent saved configuration, don't save it again.
+        :returns: Path of the saved configuration.
+
+        If the journal is enabled, the saved configuration replaces the
+        journal recorded so far."""
+
+        seq = self._journal.flush() if self._journal else None
+        if only_if_changed:
+            try:
+                latest = 'config/saved/' + self._latest_saved()
+            except NameError:
+                pass
+            else:
+                if self.identical('config/running', latest):
+                    if seq is not None and seq > self._compacted:
+                        self._compacted = seq
+                        self._persist(self._store.compact_journal(None, seq))
+                    return latest
+
+        name = self._saved_name()
+        saved = self.get_node('config/saved')
+        copy = saved.add_child(self.get_node('config/running').snapshot(name))
+
+        if self._store:
+            self._persist(self._save_saved(copy, seq))
+        return 'config/saved/' + name
+
+    async def asave_running(self,
+                            concurrency: int = DEFAULT_CONCURRENCY) -> str:
+        """Persist running configuration, reading properties concurrently.
+
+        :param concurrency: Maximum number of concurrent property reads.
+        :returns: Path of the saved configuration."""
+
+        seq = self._journal.flush() if self._journal else None
+        name = self._saved_name()
+        copy = await self.asnapshot('config/running', name, concurrency)
+        self.get_node('config/saved').add_child(copy)
+
+        if self._store:
+            await self._save_saved(copy, seq)
+        return 'config/saved/' + name
+
+    async def asnapshot(self, source: str, name: str = None,
+                        concurrency: int = DEFAULT_CONCURRENCY) -> Node:
+        """Return a detached copy of a tree, reading properties concurrently.
+
+        :param source: Root node name of tree to copy.
+        :param name: Name for the copy, defaulting to the source's name.
+        :param concurrency: Maximum number of concurrent property reads.
+
+        The structure of the tree is copied immediately; live property
+        values are then read using aget(), so their latency overlaps."""
 
-        return self.copy('config/running', 'config/saved/' + name)
+        pending = []
+        copy = self.get_node(source).snapshot(name, pending)
+
+        async def read(item):
+            prop, value = item
+            value.set(await prop.aget())
+
+        await self._gather(pending, read, concurrency)
+        return copy
 
     def restore_running(self, savepoint: str = None):
         """Load a previously-saved configuration to running.
 
         :param savepoint: Timestamp name of configuration to restore."""
         if not savepoint:
-            savepoint = 'current'
-        return self.copy(savepoint, 'running')
+            savepoint = self._latest_saved()
+        return self.copy('config/saved/' + savepoint, 'config/running')
 
     def save_staged(self):
         """Persist staged configuration."""
-        return self.copy('staged', 'saved/staged')
+
+        if self._store:
+            staged = self.get_node('config/staged').snapshot()
+            self._persist(self._save_tree(self._store.save_staged, staged))
+        return self.copy('config/staged', 'config/saved/staged')
 
     def restore_staged(self):
         """Load the persisted staged configuration."""
-        return self.copy('saved/staged', 'staged')
+        return self.copy('config/saved/staged', 'config/staged')
+
+    def deploy_staged(self) -> dict:
+        """Apply staged configuration to running.
+
+        Only the differences between staged and running are applied:
+        changed properties are set, missing nodes are created using
+        their parent's create_child(), and surplus nodes are removed
+        and then deleted.  Subtrees with equal digests are skipped.
+
+        :returns: Dictionary with lists of 'added', 'removed' and
+          'changed' paths, relative to running."""
+
+        summary = {'added': [], 'removed': [], 'changed': []}
+        self._deploy(self.get_node('config/staged'),
+                     self.get_node('config/running'), '', summary)
+        return summary
+
+    async def adeploy_staged(self,
+                             concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+        """Apply staged configuration to running, setting values concurrently.
+
+        :param concurrency: Maximum number of concurrent property accesses.
+        :returns: Dictionary with lists of 'added', 'removed' and
+          'changed' paths, relative to running.
+
+        Nodes are created and removed as for deploy_staged().  Live
+        properties are then compared and set using aget() and aset()."""
+
+        summary = {'added': [], 'removed': [], 'changed': []}
+        pending = []
+        self._deploy(self.get_node('config/staged'),
+                     self.get_node('config/running'), '', summary, pending)
+
+        async def update(item):
+            src, dst, path = item
+            if value_digest(await dst.aget()) != src.digest():
+                await dst.aset(src.get())
+                dst.changed()
+                summary['changed'].append(path)
 
-    def deploy_staged(self):
-        """Copy staged configuration to running."""
-        return self.copy('staged', 'running')
+        await self._gather(pending, update, concurrency)
+        return summary
 
     def save_to_staged(self, name: str = None):
         """Copy specified configuration to staged.
 
         :param name: Root node from which to copy."""
         if not name:
-            name = 'running'
-        return self.copy(name, 'staged')
+            name = 'config/running'
+        return self.copy(name, 'config/staged')
+
+    def batch(self, operations: List_t[dict], atomic: bool = False) -> dict:
+        """Apply a list of operations to the tree, in order.
+
+        :param operations: List of dicts, each with 'op' and 'path'
+          (full path of the subject node).  The 'op' is one of 'get',
+          'set' (a property's value), 'create' (a subtree, from its
+          exported data) or 'delete'.  'set' and 'create' also take a
+          'value'.
+        :param atomic: If True, every path must be within
+          'config/staged', and if any operation fails, staged is
+          restored to its state before the batch.
+        :returns: Dictionary with 'applied' (False if an atomic batch
+          was undone) and 'results', a list with a dict for each
+          operation: either its 'value' (for 'get') or an 'error'
+          message.  Operations after the failure in an atomic batch
+          are not attempted.
+
+        Operations are applied with no opportunity for other tasks to
+        change the tree between them, and created subtrees are deployed
+        using create_child(), as by deploy_staged()."""
+
+        paths = []
+        for operation in operations:
+            if not isinstance(operation, dict) or \
+                    operation.get('op') not in BATCH_OPERATIONS or \
+                    not isinstance(operation.get('path'), str):
+                raise ValueError("Bad batch operation: %r" % (operation,))
+            names = split_path(operation['path'])
+            if atomic and names[:2] != ('config', 'staged'):
+                raise ValueError("Not within config/staged: %s" %
+                                 operation['path'])
+            paths.append(names)
+
+        staged = self.get_node('config/staged')
+        original = staged.snapshot() if atomic else None
+        results = []
+        for operation, names in zip(operations, paths):
+            try:
+                results.append(self._apply(operation, names))
+            except (KeyError, NameError, TypeError, ValueError) as e:
+                results.append({'error': "%s: %s" % (type(e).__name__, e)})
+                if atomic:
+                    break
+
+        applied = not (atomic and results and 'error' in results[-1])
+        if not applied:
+            for name in list(staged.keys()):
+                staged.remove_child(name)
+            for child in original.values():
+                staged.add_child(child.snapshot())
+        return {'applied': applied, 'results': results}
+
+    def identical(self, first: str, second: str) -> bool:
+        """Test whether two trees have identical contents.
+
+        :param first: Root node name of first tree.
+        :param second: Root node name of second tree.
+
+        Trees are compared by digest, so this is a single comparison
+        unless either tree has changed or contains live properties."""
+
+        return self.get_node(first).digest() == self.get_node(second).digest()
+
+    def diff(self, first: str, second: str) -> Iterator[Change]:
+        """Generate the differences between two trees.
+
+        :param first: Root node name of original tree.
+        :param second: Root node name of changed tree.
+        :returns: Generator of Change records, with paths relative to
+          the two roots."""
+
+        return diff(self.get_node(first), self.get_node(second))
 
     def copy(self, source: str, dest: str):
-        """Deep copy tree.
+        """Copy tree.
 
         :param source: Source tree root node name.
-        :param dest: Destination tree root node name."""
+        :param dest: Destination tree root node name.
+
+        Children of the destination are replaced by snapshots of the
+        source's children, which share unchanged subtrees with the
+        source rather than copying them."""
 
         src = self.get_node(source)
-        dst = self.get_node(dest)
+        try:
+            dst = self.get_node(dest)
+        except NameError:
+            parent, _, name = dest.rpartition('/')
+            dst = self.get_node(parent).add_child(Object(name))
 
-        # Deep copy source to destination.
         for child in src.values():
             self._copy(child, dst)
 
@@ -153,14 +545,281 @@ class Manager:
     def _copy(self, src: Node, dst_parent: Object):
         """(Internal) Copying helper function."""
 
-        if src.is_leaf():
-            leaf = dst_parent.add_child(Property(src.get_name(), dst_parent))
-            leaf.set(src.get())
+        name = src.get_name()
+        if dst_parent.has_child(name):
+            dst_parent.remove_child(name)
+        dst_parent.add_child(src.snapshot())
+
+    def _apply(self, operation: dict, names: tuple) -> dict:
+        """(Internal) Apply one batch operation; return its result."""
+
+        op = operation['op']
+        if op == 'get':
+            return {'value': self._index.resolve(names).export()}
+
+        if op == 'set':
+            node = self._index.resolve(names)
+            if not node.is_leaf():
+                raise TypeError("Not a property: %s" % operation['path'])
+            value = operation.get('value')
+            if node.set(value) is None and value is not None:
+                raise ValueError("Not writable: %s" % operation['path'])
+            if node.is_live():
+                node.changed()
+            return {}
+
+        if not names:
+            raise ValueError("Cannot %s the root" % op)
+        parent = self._index.resolve(names[:-1])
+        key = names[-1]
+        if parent.is_leaf():
+            raise TypeError("Not a container: %s" % '/'.join(names[:-1]))
+
+        if op == 'create':
+            if parent.get_child(key) is not None:
+                raise KeyError("Already exists: %s" % operation['path'])
+            if isinstance(parent, List) and not (
+                    key == '0' or key.isdigit() and
+                    parent.get_child(str(int(key) - 1)) is not None):
+                raise KeyError("Bad list index: %s" % operation['path'])
+            summary = {'added': [], 'removed': [], 'changed': []}
+            self._deploy_child(build(key, operation.get('value')), parent,
+                               key, '', summary)
+            return {}
+
+        node = parent.get_child(key)
+        if node is None:
+            raise NameError("Lookup failed: %s" % key)
+        parent.remove_child(int(key) if isinstance(parent, List) else key)
+        node.delete()
+        return {}
+
+    def _deploy(self, src: Container, dst: Container, path: str,
+                summary: dict, pending: list = None):
+        """(Internal) Apply differences between two containers.
+
+        If 'pending' is a list, live properties are not compared, but
+        appended to it as (source, target, path) tuples."""
+
+        if not dst.is_live() and src.digest() == dst.digest():
+            return
+
+        if isinstance(dst, List):
+            sources = src.values()
+            targets = dst.values()
+            for index in range(len(targets) - 1, len(sources) - 1, -1):
+                node = dst.get_child(str(index))
+                dst.remove_child(index)
+                node.delete()
+                summary['removed'].append(path + str(index))
+
+            for index, child in enumerate(sources):
+                self._deploy_child(child, dst, str(index), path, summary,
+                                   pending)
 
         else:
-            c = dst_parent.add_child(Object(src.get_name(), dst_parent))
-            for child in src.values():
-                self._copy(child, c)
+            for name in list(dst.keys()):
+                if not src.has_child(name):
+                    node = dst.remove_child(name)
+                    node.delete()
+                    summary['removed'].append(path + name)
+
+            for name, child in src.items():
+                self._deploy_child(child, dst, name, path, summary, pending)
+        return
+
+    def _deploy_child(self, src: Node, dst_parent: Container, key: str,
+                      path: str, summary: dict, pending: list = None):
+        """(Internal) Apply a source node to the matching target node."""
+
+        dst = dst_parent.get_child(key)
+        if dst is not None:
+            if src.is_leaf() and dst.is_leaf():
+                if pending is not None and dst.is_live():
+                    pending.append((src, dst, path + key))
+                elif src.digest() != dst.digest():
+                    dst.set(src.get())
+                    if dst.is_live():
+                        dst.changed()
+                    summary['changed'].append(path + key)
+                return
+
+            if not src.is_leaf() and not dst.is_leaf() and \
+                    isinstance(src, List) == isinstance(dst, List):
+                self._deploy(src, dst, path + key + '/', summary, pending)
+                return
+
+            if isinstance(dst_parent, List):
+                dst_parent.remove_child(int(key))
+            else:
+                dst_parent.remove_child(key)
+            dst.delete()
+            summary['removed'].append(path + key)
+
+        dst = dst_parent.create_child(key, src)
+        summary['added'].append(path + key)
+        if not dst.is_leaf():
+            self._deploy(src, dst, path + key + '/', summary, pending)
+        return
+
+    @staticmethod
+    async def _gather(items: list, func, concurrency: int):
+        """(Internal) Await a function for each item, with bounded concurrency.
+
+        :param items: List of arguments for the function.
+        :param func: Coroutine function taking one argument.
+        :param concurrency: Maximum number of concurrent calls."""
+
+        iterator = iter(items)
+
+        async def worker():
+            for item in iterator:
+                await func(item)
+
+        workers = min(concurrency, len(items))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return
+
+    def _persist(self, coroutine):
+        """(Internal) Run a storage coroutine in the background.
+
+        :param coroutine: Storage adaptor method call.
+
+        If no event loop is running, the coroutine is run to completion
+        before returning.  Failed calls are kept, so that flush() will
+        raise their exceptions."""
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(coroutine)
+            finally:
+                loop.close()
+            return
+
+        task = loop.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._persisted)
+        return
+
+    async def _compact(self):
+        """(Internal) Save running when journalled, until cancelled."""
+
+        while True:
+            await asyncio.sleep(self._compaction)
+            if self._journal.get_seq() > self._compacted:
+                self.save_running(only_if_changed=True)
+
+    def _replay(self, records: list):
+        """(Internal) Apply journal records to running."""
+
+        if records:
+            seq = replay(self.get_node('config/running'), records)
+            if self._journal:
+                self._journal.set_seq(seq)
+        return
+
+    @contextlib.contextmanager
+    def _unjournalled(self):
+        """(Internal) Context in which changes to running are not journalled."""
+
+        running = self.get_node('config/running')
+        if self._journal:
+            running.remove_listener(self._journal)
+        try:
+            yield
+        finally:
+            if self._journal:
+                running.add_listener(self._journal)
+
+    async def _retain(self):
+        """(Internal) Apply the retention policy, until cancelled."""
+
+        policy, interval = self._retention
+        while True:
+            await self.prune_saved(policy=policy)
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    async def _save_tree(method, node: Node):
+        """(Internal) Export a detached tree, and pass it to storage.
+
+        :param method: Storage adaptor coroutine method.
+        :param node: Snapshot, which is not modified while exporting.
+
+        Exporting walks the whole tree, so it is done on the default
+        executor rather than holding up the event loop."""
+
+        loop = asyncio.get_running_loop()
+        config = await loop.run_in_executor(None, node.export)
+        return await method(config)
+
+    async def _save_saved(self, node: Node, seq: int = None):
+        """(Internal) Store a saved tree, after which it can be unloaded.
+
+        :param node: Saved tree, within 'config/saved'.
+        :param seq: If set, sequence number of the last journal record
+          included in the tree, which replaces the journal so far."""
+
+        def export():
+            return node.export(), weigh(node)
+
+        loop = asyncio.get_running_loop()
+        config, size = await loop.run_in_executor(None, export)
+        if seq is None:
+            timestamp = await self._store.save_current(config)
+        else:
+            self._compacted = max(self._compacted, seq)
+            timestamp = await self._store.compact_journal(config, seq)
+        if timestamp is not None:
+            self.get_node('config/saved').set_stored(node.get_name(),
+                                                     timestamp, size)
+        return
+
+    def _load_saved(self, timestamp: datetime.datetime):
+        """(Internal) Load a stored configuration for 'config/saved'."""
+
+        if not self._store:
+            return None
+        return self._store.load_saved_now(timestamp)
+
+    def _persisted(self, task: asyncio.Task):
+        """(Internal) Discard a completed background storage call."""
+
+        if not task.cancelled() and task.exception() is None:
+            self._pending.discard(task)
+        return
+
+    def _replace(self, parent: str, node: Node):
+        """(Internal) Add a node, replacing any existing node of that name."""
+
+        container = self.get_node(parent)
+        if container.has_child(node.get_name()):
+            container.remove_child(node.get_name())
+        container.add_child(node)
+        return
+
+    @staticmethod
+    def _saved_name(moment: datetime.datetime = None) -> str:
+        """(Internal) Return a name for a saved tree.
+
+        :param moment: Time of saving, defaulting to the current time."""
+
+        if moment is None:
+            moment = datetime.datetime.utcnow()
+        return moment.strftime('%Y-%m-%dT%H:%M:%S.') + \
+            "%06u" % moment.microsecond
+
+    def _latest_saved(self) -> str:
+        """(Internal) Return the name of the most recent saved tree."""
+
+        names = [name for name in self.get_node('config/saved').keys()
+                 if name != 'staged']
+        if not names:
+            raise NameError("No saved configuration")
+        return max(names)
 
     def set_config(self, server_id: str, url: str):
         """Set a configuration for this manager.
@@ -171,7 +830,7 @@ class Manager:
         self._server_id = server_id
         self._config_url = url
 
-        self._store = create_storage_adaptor(server_id, url)
+        self._store = create_async_storage_adaptor(server_id, url)
         return
 
     def add_access(self, url: str):
@@ -179,16 +838,37 @@ class Manager:
 
         :param url: Source and address of access method."""
 
-        accessor = create_access_adaptor(self._server_id, url)
-        self._accessors[url]  = accessor
+        accessor = create_access_adaptor(self, url)
+        self._accessors[url] = accessor
         return
 
     async def start(self):
         for accessor in self._accessors.values():
             await accessor.start()
+
+        loop = asyncio.get_running_loop()
+        if self._retention and self._retainer is None:
+            self._retainer = loop.create_task(self._retain())
+        if self._journal and self._compaction and self._compactor is None:
+            self._compactor = loop.create_task(self._compact())
         return
 
     async def stop(self):
+        for task in (self._retainer, self._compactor):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._retainer = self._compactor = None
+
         for accessor in self._accessors.values():
             await accessor.stop()
+
+        if self._store:
+            try:
+                await self.flush()
+            finally:
+                await self._store.close()
         return
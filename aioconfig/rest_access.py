@@ -25,18 +25,87 @@
 
 import aiohttp.web
 import aiohttp_cors
+import asyncio
+import datetime
+import json
 import ssl
+from typing import Iterator
+from urllib.parse import urlsplit
 
 from .access import AccessAdaptor, register_access_adaptor
+from .core import List, Node
+from .feed import ChangeFeed, Subscriber
 from .manager import Manager
 
 
+# Default address and port, if the access URL doesn't specify them.
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 443
+
+# Approximate size of each chunk of a streamed response, in characters.
+CHUNK_SIZE = 65536
+
+
+def iter_json(node: Node, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Generate the JSON encoding of a subtree, a chunk at a time.
+
+    :param node: Root node of the subtree.
+    :param chunk_size: Approximate size of each chunk, in characters.
+
+    The chunks joined are equal to json.dumps(node.export()), but the
+    subtree is walked without recursion or building its export, so
+    only one chunk is held at a time.  The subtree must not change
+    while this runs: pass a snapshot of a tree that might."""
+
+    parts = []
+    size = 0
+    stack = [[iter(((None, node),)), None, True]]
+    while stack:
+        frame = stack[-1]
+        item = next(frame[0], None)
+        if item is None:
+            stack.pop()
+            if frame[1] is not None:
+                parts.append(frame[1])
+                size += 1
+            continue
+
+        key, child = item
+        text = '' if frame[2] else ', '
+        frame[2] = False
+        if key is not None:
+            text += json.dumps(key) + ': '
+
+        if child.is_leaf():
+            text += json.dumps(child.get())
+        elif isinstance(child, List):
+            text += '['
+            stack.append([((None, grandchild)
+                           for _, grandchild in child.peek_items()),
+                          ']', True])
+        else:
+            text += '{'
+            stack.append([iter(child.peek_items()), '}', True])
+
+        parts.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+
+    if parts:
+        yield ''.join(parts)
+    return
+
+
 class RestAccessAdaptor(AccessAdaptor):
     def __init__(self, manager: Manager, url: str):
         """Constructor.
 
         :param manager: Reference to Manager to access.
-        :param url: Access URL."""
+        :param url: Access URL, eg. 'rest://0.0.0.0:8080'.  Port 0
+          listens on an unused port (see get_port())."""
 
         super().__init__(manager, url)
 
@@ -45,9 +114,11 @@ class RestAccessAdaptor(AccessAdaptor):
         self._runner = None
         self._site = None
 
-        self._port = 443
+        address = urlsplit(url)
+        self._host = address.hostname or DEFAULT_HOST
+        self._port = DEFAULT_PORT if address.port is None else address.port
 
-        self._root = None
+        self._feed = ChangeFeed(manager.get_node(''))
         return
 
     async def start(self):
@@ -64,6 +135,15 @@ class RestAccessAdaptor(AccessAdaptor):
                         expose_headers="*",
                         allow_headers="*")})
 
+            self._cors.add(self._app.router.add_route("GET",
+                                                      "/_history/{tail:.*}",
+                                                      self.handle_history))
+            self._cors.add(self._app.router.add_route("POST",
+                                                      "/_batch",
+                                                      self.handle_batch))
+            self._cors.add(self._app.router.add_route("GET",
+                                                      "/_feed",
+                                                      self.handle_feed))
             self._cors.add(self._app.router.add_route("GET",
                                                       "/{tail:.*}",
                                                       self.handle))
@@ -84,7 +164,7 @@ class RestAccessAdaptor(AccessAdaptor):
             await self._runner.setup()
 
             self._site = aiohttp.web.TCPSite(self._runner,
-                                             host="0.0.0.0",
+                                             host=self._host,
                                              port=self._port)
                                              #ssl_context=ssl_context)
             await self._site.start()
@@ -98,6 +178,8 @@ class RestAccessAdaptor(AccessAdaptor):
     async def stop(self):
         """Stop running this accessor."""
 
+        self._feed.close()
+
         if self._site:
             await self._site.stop()
             self._site = None
@@ -116,13 +198,187 @@ class RestAccessAdaptor(AccessAdaptor):
     async def change_port(self, new_port: int):
         pass
 
+    def get_port(self) -> int:
+        """Return the port listened on, once started."""
+
+        if self._runner is not None and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
     async def handle(self, request):
-        if request.path == '/':
-            path = []
+        """Return a subtree of the manager's tree.
+
+        The request path is the full path of the subtree's root node,
+        eg. '/config/running/sessions', and the response is its
+        contents as JSON.  The response's ETag changes whenever the
+        subtree changes: if the request's If-None-Match matches it, the
+        response is 304 (Not Modified), and the subtree is not
+        serialized."""
+
+        if request.method != 'GET':
+            raise aiohttp.web.HTTPMethodNotAllowed(request.method, ['GET'])
+
+        path = request.path.strip('/')
+        node = await self._resolve(path)
+        etag = self._manager.get_version(path)
+        if request.if_none_match and any(
+                tag.value in (etag, '*') for tag in request.if_none_match):
+            response = aiohttp.web.Response(status=304)
+        elif node.is_leaf():
+            response = aiohttp.web.json_response(node.export())
         else:
-            path = request.path[1:].split('/')
+            return await self._stream(request, node, etag)
+        response.etag = etag
+        return response
+
+    @staticmethod
+    async def _stream(request, node: Node, etag: str):
+        """(Internal) Send a subtree as JSON, using chunked encoding.
+
+        The subtree is snapshotted (sharing unchanged nodes), so later
+        changes do not affect the response.  Each chunk is written once
+        the client has taken enough of the previous ones, and the loop
+        runs other tasks between chunks.  The response is compressed if
+        the client accepts gzip."""
+
+        snapshot = node.snapshot()
+        response = aiohttp.web.StreamResponse()
+        response.content_type = 'application/json'
+        response.etag = etag
+        response.enable_chunked_encoding()
+        if 'gzip' in request.headers.get(aiohttp.hdrs.ACCEPT_ENCODING, ''):
+            response.enable_compression(aiohttp.web.ContentCoding.gzip)
+
+        await response.prepare(request)
+        for chunk in iter_json(snapshot):
+            await response.write(chunk.encode())
+            await asyncio.sleep(0)
+        await response.write_eof()
+        return response
+
+    async def _resolve(self, path: str):
+        """(Internal) Return the node at path, or raise HTTPNotFound.
+
+        Saved trees not held in memory are loaded without blocking."""
+
+        names = path.split('/')
+        try:
+            if names[:2] == ['config', 'saved'] and len(names) > 2:
+                await self._manager.aget_saved(names[2])
+            return self._manager.get_node(path)
+        except NameError as e:
+            raise aiohttp.web.HTTPNotFound(text=str(e))
+
+    async def handle_batch(self, request):
+        """Apply a batch of operations to the manager's tree.
+
+        The request body is a JSON object with a list of 'operations',
+        each with 'op' ('get', 'set', 'create' or 'delete'), 'path' and
+        (for 'set' and 'create') 'value', and optionally 'atomic'.  See
+        Manager.batch().  The response is a JSON object with 'applied'
+        and a list of per-operation 'results'.  An atomic batch which
+        was undone returns status 409 (Conflict)."""
+
+        try:
+            body = await request.json()
+            result = self._manager.batch(body['operations'],
+                                         bool(body.get('atomic')))
+        except (ValueError, KeyError, TypeError) as e:
+            raise aiohttp.web.HTTPBadRequest(text=str(e))
+
+        return aiohttp.web.json_response(
+            result, status=200 if result['applied'] else 409)
+
+    async def handle_feed(self, request):
+        """Push changes to the manager's tree to the client.
+
+        Each 'path' query parameter is a path below which changes are
+        sent (by default, all changes).  Changes are sent as JSON lists
+        of events (see feed.Subscriber) over a WebSocket, if the client
+        asks to upgrade the connection, or otherwise as Server-Sent
+        Events."""
+
+        subscriber = self._feed.subscribe(request.query.getall('path', ['']))
+        try:
+            if request.headers.get(aiohttp.hdrs.UPGRADE, '').lower() == \
+                    'websocket':
+                return await self._feed_websocket(request, subscriber)
+            return await self._feed_events(request, subscriber)
+        finally:
+            subscriber.close()
+
+    @staticmethod
+    async def _feed_websocket(request, subscriber: Subscriber):
+        """(Internal) Send a subscriber's batches as WebSocket messages."""
+
+        ws = aiohttp.web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def send():
+            while True:
+                batch = await subscriber.get()
+                if batch is None:
+                    break
+                await ws.send_json(batch)
+            await ws.close()
+
+        sender = asyncio.ensure_future(send())
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+        return ws
+
+    @staticmethod
+    async def _feed_events(request, subscriber: Subscriber):
+        """(Internal) Send a subscriber's batches as Server-Sent Events."""
+
+        response = aiohttp.web.StreamResponse()
+        response.content_type = 'text/event-stream'
+        response.headers[aiohttp.hdrs.CACHE_CONTROL] = 'no-cache'
+        await response.prepare(request)
+
+        try:
+            while True:
+                batch = await subscriber.get()
+                if batch is None:
+                    break
+                await response.write(
+                    b'data: ' + json.dumps(batch).encode() + b'\n\n')
+            await response.write_eof()
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def handle_history(self, request):
+        """Return the saved history of a property.
+
+        The path following '/_history/' is relative to the running
+        configuration.  Optional 'since' and 'until' query parameters
+        are ISO 8601 timestamps.  The response is a JSON list of
+        changes, each with 'saved' timestamp, and either 'value' or
+        'removed'."""
+
+        try:
+            since, until = (
+                datetime.datetime.fromisoformat(request.query[name])
+                if name in request.query else None
+                for name in ('since', 'until'))
+        except ValueError as e:
+            raise aiohttp.web.HTTPBadRequest(text=str(e))
 
-        return await self._root.handle(path, request)
+        entries = await self._manager.history(request.match_info['tail'],
+                                              since, until)
+        result = []
+        for entry in entries:
+            if entry.removed:
+                result.append({'saved': entry.saved.isoformat(),
+                               'removed': True})
+            else:
+                result.append({'saved': entry.saved.isoformat(),
+                               'value': entry.value})
+        return aiohttp.web.json_response(result)
 
 
 register_access_adaptor("rest", RestAccessAdaptor)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import datetime
+from typing import Iterable, List, Optional, Tuple
+
+
+# Named intervals, for parsing policies.
+INTERVALS = {'minutely': datetime.timedelta(minutes=1),
+             'hourly': datetime.timedelta(hours=1),
+             'daily': datetime.timedelta(days=1),
+             'weekly': datetime.timedelta(weeks=1)}
+
+# Duration units, for parsing policies.
+UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days',
+         'w': 'weeks'}
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+TierType = Tuple[Optional[datetime.timedelta], Optional[datetime.timedelta]]
+
+
+class RetentionPolicy:
+    """Rule for which saved configurations to keep, by age.
+
+    A policy is a list of tiers, each of which applies to saved
+    configurations younger than its age limit (and older than the
+    previous tier's).  A tier either keeps every configuration, or
+    only the latest one in each interval.  Configurations older than
+    the last tier's age limit are not kept."""
+
+    def __init__(self, tiers: Iterable[TierType]):
+        """Constructor.
+
+        :param tiers: Sequence of (age, interval) pairs, youngest
+          first.  If 'age' is None, the tier applies to all older
+          configurations.  If 'interval' is None, the tier keeps all its
+          configurations."""
+
+        self._tiers = list(tiers)
+        return
+
+    @staticmethod
+    def parse(text: str) -> 'RetentionPolicy':
+        """Return a policy described by a string.
+
+        :param text: Comma-separated tiers, each a frequency ('all',
+          'minutely', 'hourly', 'daily', 'weekly', or a duration) and
+          an optional age limit, eg. "all 24h, hourly 30d, daily"."""
+
+        tiers = []
+        for item in text.split(','):
+            words = item.split()
+            if not 1 <= len(words) <= 2:
+                raise ValueError("Bad retention tier: '%s'" % item.strip())
+
+            if words[0] == 'all':
+                interval = None
+            elif words[0] in INTERVALS:
+                interval = INTERVALS[words[0]]
+            else:
+                interval = RetentionPolicy._parse_duration(words[0])
+
+            age = None
+            if len(words) == 2:
+                age = RetentionPolicy._parse_duration(words[1])
+            tiers.append((age, interval))
+
+        return RetentionPolicy(tiers)
+
+    def get_tiers(self) -> List[TierType]:
+        """Return the policy's (age, interval) tiers."""
+        return list(self._tiers)
+
+    def expired(self, names: Iterable[datetime.datetime],
+                now: datetime.datetime = None) -> List[datetime.datetime]:
+        """Return the timestamps of configurations not to be kept.
+
+        :param names: Timestamps of saved configurations.
+        :param now: Current time, defaulting to datetime.utcnow().
+        :returns: List of expired timestamps, newest first."""
+
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        result = []
+        seen = set()
+        for name in sorted(names, reverse=True):
+            age = now - name
+            for index, (limit, interval) in enumerate(self._tiers):
+                if limit is None or age < limit:
+                    break
+            else:
+                result.append(name)
+                continue
+
+            if interval is None:
+                continue
+
+            # Keep the latest configuration in each interval.
+            bucket = (index, (name - EPOCH) // interval)
+            if bucket in seen:
+                result.append(name)
+            else:
+                seen.add(bucket)
+
+        return result
+
+    @staticmethod
+    def _parse_duration(text: str) -> datetime.timedelta:
+        """(Internal) Return the duration described by eg. '30d'."""
+
+        unit = UNITS.get(text[-1:])
+        if unit is None or not text[:-1].isdigit():
+            raise ValueError("Bad retention duration: '%s'" % text)
+        return datetime.timedelta(**{unit: int(text[:-1])})
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import collections
+import datetime
+from typing import Callable, Dict, Optional
+
+from .core import NodeType, Object, build
+
+
+# Default memory budget for saved trees held in memory, in bytes.
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+# Estimated memory use per tree node, in bytes.  This covers the node
+# itself, its entry in its parent's children, and a small value.
+NODE_SIZE = 200
+
+LoaderType = Callable[[datetime.datetime], Optional[dict]]
+
+
+def weigh(node: NodeType) -> int:
+    """Return the estimated memory use of a tree, in bytes.
+
+    :param node: Root node of the tree, which is walked in full."""
+
+    count = 0
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        count += 1
+        if not node.is_leaf():
+            pending.extend(child for _, child in node.peek_items())
+    return count * NODE_SIZE
+
+
+class SavedTrees(Object):
+    """Container for saved trees, backed by a storage adaptor.
+
+    Every saved configuration is listed as a child, but only recently
+    used trees are held in memory, up to a memory budget.  The least
+    recently used tree is unloaded when the budget is exceeded, and
+    loaded again from storage when it is next looked up.
+
+    A tree is only unloaded once it is known to be stored: trees which
+    are still being saved (or which have no storage) are kept.  Loading
+    a tree blocks until it has been read, so code running on the event
+    loop should prefer Manager.aget_saved()."""
+
+    __slots__ = ('_loader', '_budget', '_stored', '_recent', '_size')
+
+    def __init__(self, name: str, loader: LoaderType,
+                 budget: int = DEFAULT_BUDGET):
+        """Constructor.
+
+        :param name: Name of tree node.
+        :param loader: Function returning the stored configuration with
+          a given timestamp, or None.
+        :param budget: Memory budget for loaded trees, in bytes."""
+
+        super().__init__(name)
+        self._loader = loader
+        self._budget = budget
+        self._stored: Dict[str, Optional[datetime.datetime]] = {}
+        self._recent: Dict[str, int] = collections.OrderedDict()
+        self._size = 0
+        return
+
+    def set_budget(self, budget: int):
+        """Set the memory budget for loaded trees.
+
+        :param budget: Budget in bytes."""
+
+        self._budget = budget
+        self._evict()
+        return
+
+    def get_size(self) -> int:
+        """Return the estimated memory use of loaded trees, in bytes."""
+        return self._size
+
+    def set_stored(self, name: str, timestamp: datetime.datetime,
+                   size: int = None):
+        """Record that a saved tree is stored, and can be unloaded.
+
+        :param name: Name of the saved tree.
+        :param timestamp: Timestamp of its stored configuration.
+        :param size: Estimated memory use of the tree, as returned by
+          weigh(), if already known.
+
+        Nothing is done if the tree has been removed meanwhile."""
+
+        node = self._children.get(name)
+        if node is None:
+            return
+
+        self._stored[name] = timestamp
+        self._loaded(name, weigh(node) if size is None else size)
+        return
+
+    def add_stored(self, name: str, timestamp: datetime.datetime):
+        """List a stored configuration, without loading it.
+
+        :param name: Name for the saved tree.
+        :param timestamp: Timestamp of the stored configuration."""
+
+        if name in self._children:
+            self.set_stored(name, timestamp)
+        else:
+            added = name not in self._stored
+            self._stored[name] = timestamp
+            if added:
+                self._notify('node_added', [name], Object(name))
+        return
+
+    def get_timestamp(self, name: str) -> Optional[datetime.datetime]:
+        """Return the timestamp of a stored tree, or None.
+
+        :param name: Name of the saved tree."""
+
+        return self._stored.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        """Test whether a saved tree is held in memory.
+
+        :param name: Name of the saved tree."""
+
+        return name in self._children
+
+    def add_child(self, node: NodeType) -> NodeType:
+        """Add a saved tree.
+
+        :param node: Root node of the tree."""
+
+        name = node.get_name()
+        if name in self._stored:
+            raise KeyError("Child name already exists: %s" % name)
+
+        super().add_child(node)
+        self._loaded(name, 0)
+        return node
+
+    def remove_child(self, name: str) -> NodeType:
+        """Remove a saved tree.
+
+        :param name: Name of the saved tree.
+        :returns: Reference to the removed tree.  If it was not loaded,
+          this is an empty Object."""
+
+        if name in self._children:
+            if name in self._recent:
+                self._size -= self._recent.pop(name)
+            self._stored.pop(name, None)
+            return super().remove_child(name)
+
+        if name not in self._stored:
+            raise KeyError("No such child: %s" % name)
+
+        del self._stored[name]
+        node = Object(name)
+        self._notify('node_removed', [name], node)
+        return node
+
+    def has_child(self, name: str) -> bool:
+        """Test whether a saved tree exists, loaded or not.
+
+        :param name: Name of the saved tree."""
+
+        return name in self._children or name in self._stored
+
+    def keys(self):
+        """Return the names of all saved trees, stored ones first."""
+
+        names = dict.fromkeys(self._stored)
+        names.update(dict.fromkeys(self._children))
+        return names.keys()
+
+    def get_child(self, name: str) -> Optional[NodeType]:
+        """Return a saved tree, loading it if required.
+
+        :param name: Name of the saved tree."""
+
+        if name in self._children:
+            if name in self._recent:
+                self._recent.move_to_end(name)
+            return super().get_child(name)
+
+        timestamp = self._stored.get(name)
+        if timestamp is None:
+            return None
+        config = self._loader(timestamp)
+        if config is None:
+            return None
+        return self.insert_loaded(name, config)
+
+    def insert_loaded(self, name: str, config: dict) -> NodeType:
+        """Hold a stored tree in memory.
+
+        :param name: Name of the saved tree, which must be stored.
+        :param config: Its configuration, as loaded from storage."""
+
+        node = build(name, config)
+        self._prepare()
+        self._children[name] = node
+        node.set_parent(self)
+        self._loaded(name, weigh(node))
+        return node
+
+    def peek_items(self):
+        """Return (name, tree) pairs, loading every saved tree."""
+
+        self._load_all()
+        return super().peek_items()
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def digest(self) -> bytes:
+        """Return a hash of all saved trees, loading each of them."""
+
+        self._load_all()
+        return super().digest()
+
+    def export(self) -> dict:
+        """Return the contents of all saved trees, loading each of them."""
+
+        self._load_all()
+        return super().export()
+
+    def snapshot(self, name: str = None, pending: list = None) -> Object:
+        """Return a plain copy of all saved trees, loading each of them."""
+
+        self._load_all()
+        return super().snapshot(name, pending)
+
+    def _load_all(self):
+        """(Internal) Load every saved tree not held in memory.
+
+        Trees are loaded without unloading others, so that the caller
+        sees all of them; the budget is applied again by the next
+        lookup or save."""
+
+        missing = [name for name in self._stored
+                   if name not in self._children]
+        for name in missing:
+            config = self._loader(self._stored[name])
+            if config is not None:
+                node = build(name, config)
+                self._prepare()
+                self._children[name] = node
+                node.set_parent(self)
+                self._recent[name] = weigh(node)
+                self._size += self._recent[name]
+        return
+
+    def _loaded(self, name: str, size: int):
+        """(Internal) Account for a tree held in memory.
+
+        :param name: Name of the tree, which becomes the most recent.
+        :param size: Its estimated memory use, in bytes."""
+
+        if name in self._recent:
+            self._size -= self._recent.pop(name)
+        self._recent[name] = size
+        self._size += size
+        self._evict(name)
+        return
+
+    def _evict(self, keep: str = None):
+        """(Internal) Unload stored trees until within the budget.
+
+        :param keep: Name of a tree not to unload."""
+
+        if self._size <= self._budget:
+            return
+
+        for name in list(self._recent):
+            if self._size <= self._budget:
+                break
+            if name == keep or self._stored.get(name) is None:
+                continue
+
+            self._size -= self._recent.pop(name)
+            self._prepare()
+            node = self._children.pop(name)
+            if node.get_parent() is self:
+                node.set_parent(None)
+            self._notify('node_unloaded', [name], node)
+        return
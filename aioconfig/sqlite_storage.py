@@ -23,70 +23,379 @@
 #
 ########################################################################
 
+import asyncio
 import datetime
+import hashlib
 import json
 import os
 import sqlite3
 
-from dateutil.parser import parse as parse_date
-from typing import Optional
+from typing import List, Optional, Tuple, Union
+from urllib.parse import parse_qsl
 
-from .errors import BadStorageURLFormat, BadStorageURLScheme
-from .storage import StorageAdaptor, register_storage_adaptor
+from .errors import BadStorageURLFormat, BadStorageURLScheme, StorageCorrupted
+from .storage import ExecutorStorageAdaptor, HistoryEntry, StorageAdaptor
+from .storage import apply_delta, get_codec, make_delta, select_subtree
+from .storage import split_storage_path
+from .storage import register_async_storage_adaptor, register_storage_adaptor
 
 
 # Stored as a single database table.  Each row contains a JSON-encoded
 # configuration tree, the timestamp when it was saved, a flag indicating
 # whether it has been archived, and its service identifier.
+#
+# If the URL has a 'delta=N' query parameter, only every Nth saved
+# configuration is stored in full.  Others store a delta (see
+# storage.make_delta) against the previous saved configuration, whose
+# timestamp is recorded in their 'delta_of' column.
+#
+# If the URL has a 'codec=NAME' query parameter, configurations are
+# stored using that codec (see storage.get_codec), whose name is
+# recorded in their 'encoding' column.  Rows without an encoding are
+# JSON text.
+#
+# If the URL has a 'dedup=1' query parameter, configurations are stored
+# by content: the 'content' table holds encoded objects keyed by a hash
+# of their contents, and saved rows record the hash of their root
+# object in their 'content' column (with an empty 'settings').  Object
+# subtrees with at least SUBTREE_WEIGHT nodes are stored as separate
+# content rows, referenced from their parent's row, so unchanged large
+# subtrees and unchanged configurations are stored only once.  Large
+# lists are split into chunks, each stored as its own row: a chunk
+# ends where an element's hash meets a boundary condition, so that
+# inserting or removing an element changes only the chunk holding it.
+# This replaces the 'delta' option.
+#
+# If the URL has a 'history=1' query parameter, each saved property
+# value change is also recorded in the 'history' table, keyed by path
+# (as for the 'sqlite+paths' scheme) and timestamp, with a flag set
+# for removals.  This is written in the same transaction as the saved
+# configuration.
+#
+# The 'journal' table holds changes made to the running configuration
+# since it was last saved, each a JSON-encoded record numbered by the
+# manager.  Saving with compact_journal() deletes the records included
+# in the saved configuration, in the same transaction.
+#
+# The database is used in WAL mode.  The asynchronous adaptor queues
+# writes, and commits all those queued while the previous transaction
+# was being written in a single transaction.
+#
+# New databases are created with incremental auto-vacuum, so that the
+# space freed by deleting configurations can be released a few pages
+# at a time (see reclaim()).  Deleting a configuration that others are
+# stored as deltas against first rebases them onto its own base.
 
 STAGED_TIME = '1970-01-01T00:00:00.000'
 TIME_FORMAT = "%Y-%m-%dT%H:%M:%S."
 
-LOAD_CURRENT = "select settings " \
+LOAD_CURRENT = "select delta_of, encoding, settings, content " \
                "from config " \
                "where server_id = ?" \
                "  and archived = 0 " \
+               "  and saved != ? " \
                "order by saved desc " \
                "limit 1"
 
-LOAD_STAGED = "select settings " \
+LOAD_STAGED = "select encoding, settings " \
               "from config " \
               "where server_id = ? " \
               "  and archived = 0 " \
               "and saved = ? "
 
-LOAD_SAVED = "select settings " \
+LOAD_SAVED = "select delta_of, encoding, settings, content " \
              "from config " \
              "where server_id = ? " \
              "  and archived = 0 " \
              "  and saved = ?"
 
-SAVE_CURRENT = "insert into config (server_id, saved, archived, settings) " \
-               "values (?, ?, 0, ?)"
+LOAD_DELTA_OF = "select delta_of, encoding, settings, content " \
+                "from config " \
+                "where server_id = ? " \
+                "  and saved = ?"
+
+SAVE_CURRENT = "insert into config " \
+               "(server_id, saved, archived, settings, delta_of, " \
+               " encoding, content) " \
+               "values (?, ?, 0, ?, ?, ?, ?)"
 
-SAVE_STAGED = "insert into config (server_id, saved, archived, settings) " \
-              "values (?, ?, 0, ?)"
+SAVE_STAGED = "insert or replace into config " \
+              "(server_id, saved, archived, settings, encoding) " \
+              "values (?, ?, 0, ?, ?)"
 
 LIST_SAVED = "select saved " \
              "from config " \
              "where server_id = ? " \
              "  and archived = 0 " \
              "  and saved != ? " \
-             "order by saved desc"
+             "  and saved >= ? " \
+             "  and saved <= ? " \
+             "  and saved < ? " \
+             "order by saved desc " \
+             "limit ?"
+
+CREATE_SAVED_INDEX = "create index if not exists config_saved " \
+                     "on config (server_id, archived, saved)"
+
+CREATE = "create table if not exists config ( " \
+         "    server_id text not null, " \
+         "    saved timestamp not null, " \
+         "    archived int not null default 0, " \
+         "    settings text not null," \
+         "    delta_of timestamp," \
+         "    encoding text," \
+         "    content text," \
+         "    primary key (server_id, saved)" \
+         ")"
+
+# Columns added since the original schema, with their definitions.
+ADDED_COLUMNS = (("delta_of", "timestamp"),
+                 ("encoding", "text"),
+                 ("content", "text"))
+
+# Content rows are shared by all servers using the database.  An
+# object's 'settings' are its members other than those stored in their
+# own content row, which are listed in 'refs' as [position, key, hash].
+CONTENT_CREATE = "create table if not exists content ( " \
+                 "    hash text not null primary key, " \
+                 "    encoding text not null, " \
+                 "    refs text, " \
+                 "    settings not null" \
+                 ")"
+
+LOAD_CONTENT = "select encoding, refs, settings " \
+               "from content " \
+               "where hash = ?"
+
+SAVE_CONTENT = "insert or ignore into content " \
+               "(hash, encoding, refs, settings) " \
+               "values (?, ?, ?, ?)"
+
+# Minimum number of nodes in an object subtree stored as its own row.
+SUBTREE_WEIGHT = 256
+
+# Key marking a reference to a list chunk, spliced into its list.
+CHUNK = '*'
+
+# Maximum number of chunks referenced from a list's row.  Lists with
+# more chunks than this are stored as a tree of chunks.
+CHUNK_FANOUT = 64
 
 ARCHIVE = "update config " \
           "set archived = 1 " \
           "where server_id = ?" \
+          "  and saved != ? " \
           "  and saved < ? "
 
+LIST_ARCHIVED = "select saved " \
+                "from config " \
+                "where server_id = ? " \
+                "  and archived = 1 " \
+                "  and saved != ? " \
+                "order by saved " \
+                "limit ?"
+
+DELETE_SAVED = "delete from config " \
+               "where server_id = ? " \
+               "  and saved = ?"
+
+LOAD_DEPENDENTS = "select saved, delta_of, encoding, settings, content " \
+                  "from config " \
+                  "where server_id = ? " \
+                  "  and delta_of = ?"
+
+REBASE = "update config " \
+         "set delta_of = ?, encoding = ?, settings = ? " \
+         "where server_id = ? " \
+         "  and saved = ?"
+
+CREATE_DELTA_OF_INDEX = "create index if not exists config_delta_of " \
+                        "on config (server_id, delta_of) " \
+                        "where delta_of is not null"
+
+CONTENT_ROOTS = "select distinct content " \
+                "from config " \
+                "where content is not null"
+
+CONTENT_REFS = "select refs " \
+               "from content " \
+               "where hash = ?"
+
+CONTENT_LIST = "select hash from content"
+
+CONTENT_DELETE = "delete from content where hash = ?"
+
+# Number of free pages released by each reclaim().
+RECLAIM_PAGES = 256
+
+HISTORY_CREATE = "create table if not exists history ( " \
+                 "    server_id text not null, " \
+                 "    path text not null, " \
+                 "    saved timestamp not null, " \
+                 "    removed int not null default 0, " \
+                 "    value text, " \
+                 "    primary key (server_id, path, saved)" \
+                 ") without rowid"
+
+HISTORY_SAVE = "insert into history " \
+               "(server_id, path, saved, removed, value) " \
+               "values (?, ?, ?, ?, ?)"
+
+HISTORY_LOAD = "select saved, removed, value " \
+               "from history " \
+               "where server_id = ? " \
+               "  and path = ? " \
+               "  and saved >= ? " \
+               "  and saved <= ? " \
+               "order by saved"
+
+HISTORY_LOAD_BEFORE = "select saved, removed, value " \
+                      "from history " \
+                      "where server_id = ? " \
+                      "  and path = ? " \
+                      "  and saved < ? " \
+                      "order by saved desc " \
+                      "limit 1"
+
+JOURNAL_CREATE = "create table if not exists journal ( " \
+                 "    server_id text not null, " \
+                 "    seq integer not null, " \
+                 "    record text not null, " \
+                 "    primary key (server_id, seq)" \
+                 ") without rowid"
+
+JOURNAL_APPEND = "insert or replace into journal " \
+                 "(server_id, seq, record) " \
+                 "values (?, ?, ?)"
+
+JOURNAL_LOAD = "select seq, record " \
+               "from journal " \
+               "where server_id = ? " \
+               "order by seq"
+
+JOURNAL_TRUNCATE = "delete from journal " \
+                   "where server_id = ? " \
+                   "  and seq <= ?"
+
+# Timestamp strings bounding all saved configurations.  (Numeric strings
+# would be compared as numbers, given the column type.)
+EARLIEST_TIME = '0000-00-00T00:00:00.000'
+LATEST_TIME = '9999-12-31T23:59:59.999'
+
+# Placeholder for a missing value, when comparing configurations.
+MISSING = object()
+
+
+# Alternatively, with the 'sqlite+paths' scheme, each configuration is
+# stored as one row per node, keyed by its '/'-separated path, so that a
+# subtree can be loaded without reading the rest of the configuration.
+# Container rows have kind 'o' (object) or 'l' (list) and no value;
+# leaf rows have kind 'v' and a JSON-encoded value.  The 'snapshot'
+# table records each configuration's timestamp and archived flag.
+
+PATH_CREATE_SNAPSHOT = "create table if not exists snapshot ( " \
+                       "    server_id text not null, " \
+                       "    saved timestamp not null, " \
+                       "    archived int not null default 0, " \
+                       "    primary key (server_id, saved)" \
+                       ")"
+
+PATH_CREATE_NODE = "create table if not exists node ( " \
+                   "    server_id text not null, " \
+                   "    saved timestamp not null, " \
+                   "    path text not null, " \
+                   "    kind text not null, " \
+                   "    value text, " \
+                   "    primary key (server_id, saved, path)" \
+                   ") without rowid"
+
+# Finds a path (or paths with a prefix) across all configurations.
+PATH_CREATE_INDEX = "create index if not exists node_path " \
+                    "on node (server_id, path, saved)"
+
+PATH_LOAD_CURRENT = "select saved " \
+                    "from snapshot " \
+                    "where server_id = ? " \
+                    "  and archived = 0 " \
+                    "  and saved != ? " \
+                    "order by saved desc " \
+                    "limit 1"
+
+PATH_LOAD_SAVED = "select saved " \
+                  "from snapshot " \
+                  "where server_id = ? " \
+                  "  and archived = 0 " \
+                  "  and saved = ?"
+
+PATH_LOAD_TREE = "select path, kind, value " \
+                 "from node " \
+                 "where server_id = ? " \
+                 "  and saved = ? " \
+                 "order by path"
+
+# The range includes siblings whose names extend the subtree's name
+# (eg. 'a-b' for 'a'), which are skipped when loading; a single range
+# lets Sqlite use the primary key, where 'or' would not.
+PATH_LOAD_SUBTREE = "select path, kind, value " \
+                    "from node " \
+                    "where server_id = ? " \
+                    "  and saved = ? " \
+                    "  and path >= ? " \
+                    "  and path < ? " \
+                    "order by path"
+
+PATH_SAVE_SNAPSHOT = "insert or replace into snapshot " \
+                     "(server_id, saved, archived) " \
+                     "values (?, ?, 0)"
+
+PATH_SAVE_NODE = "insert into node (server_id, saved, path, kind, value) " \
+                 "values (?, ?, ?, ?, ?)"
+
+PATH_DELETE_NODES = "delete from node " \
+                    "where server_id = ? " \
+                    "  and saved = ?"
+
+PATH_LIST_SAVED = "select saved " \
+                  "from snapshot " \
+                  "where server_id = ? " \
+                  "  and archived = 0 " \
+                  "  and saved != ? " \
+                  "  and saved >= ? " \
+                  "  and saved <= ? " \
+                  "  and saved < ? " \
+                  "order by saved desc " \
+                  "limit ?"
+
+PATH_CREATE_SAVED_INDEX = "create index if not exists snapshot_saved " \
+                          "on snapshot (server_id, archived, saved)"
+
+PATH_ARCHIVE = "update snapshot " \
+               "set archived = 1 " \
+               "where server_id = ?" \
+               "  and saved != ? " \
+               "  and saved < ? "
+
+PATH_LIST_ARCHIVED = "select saved " \
+                     "from snapshot " \
+                     "where server_id = ? " \
+                     "  and archived = 1 " \
+                     "  and saved != ? " \
+                     "order by saved " \
+                     "limit ?"
+
+PATH_DELETE_SNAPSHOT = "delete from snapshot " \
+                       "where server_id = ? " \
+                       "  and saved = ?"
+
+
 
 class SqliteStorageAdaptor(StorageAdaptor):
     """Sqlite3 storage adaptor."""
 
-    @staticmethod
-    def create(url: str):
+    @classmethod
+    def create(cls, url: str):
 
-        path = SqliteStorageAdaptor._get_path_from_url(url)
+        path = cls._get_path_from_url(url)
 
         # Check file doesn't exist.
         if os.path.exists(path):
@@ -96,39 +405,66 @@ class SqliteStorageAdaptor(StorageAdaptor):
         connection = sqlite3.connect(path)
 
         # Instantiate schema.
-        query = \
-            "create table config ( " \
-            "    server_id text not null, " \
-            "    saved timestamp not null, " \
-            "    archived int not null default 0, " \
-            "    settings text not null," \
-            "    primary key (server_id, saved)" \
-            ")"
-
         cursor = connection.cursor()
-        cursor.execute(query)
+        cls._create_schema(cursor)
+        cursor.execute(HISTORY_CREATE)
+        cursor.execute(JOURNAL_CREATE)
         cursor.close()
+        connection.close()
         return
 
     def __init__(self, server_id: str, url: str):
         super().__init__(server_id, url)
 
         path = self._get_path_from_url(url)
+        options = self._get_options_from_url(url)
         self._connection = sqlite3.connect(path)
+
+        # Saves per full snapshot, and the latest save, if known.
+        self._delta = int(options.get('delta', 1))
+        self._dedup = options.get('dedup', '0') not in ('0', '')
+        self._encoding = options.get('codec', 'json')
+        self._codec = get_codec(self._encoding)
+        self._previous = None
+        self._chain = 0
+        self._last = None
+
+        # Whether to record history, and the latest saved configuration
+        # (once known) to compare with.
+        self._history = options.get('history', '0') not in ('0', '')
+        self._recorded = None
+
+        # Whether unreferenced content rows might exist.
+        self._unswept = False
+
+        cursor = self._connection.cursor()
+        cursor.execute("pragma auto_vacuum=incremental")
+        cursor.execute("pragma journal_mode=wal")
+        self._create_schema(cursor)
+        cursor.execute(HISTORY_CREATE)
+        cursor.execute(JOURNAL_CREATE)
+        cursor.close()
+        return
+
+    def close(self):
+        """Close the database connection."""
+        self._connection.close()
         return
 
-    def load_current(self) -> Optional[dict]:
-        """Load current (latest) saved configuration."""
+    def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
 
         cursor = self._connection.cursor()
-        cursor.execute(LOAD_CURRENT, [self._server_id])
+        cursor.execute(LOAD_CURRENT, [self._server_id, STAGED_TIME])
         row = cursor.fetchone()
         cursor.close()
 
         if not row:
             return
 
-        return json.loads(row[0])
+        return select_subtree(self._decode(*row), path)
 
     def load_staged(self) -> Optional[dict]:
         """Load staged configuration."""
@@ -141,12 +477,14 @@ class SqliteStorageAdaptor(StorageAdaptor):
         if not row:
             return
 
-        return json.loads(row[0])
+        return self._decode(None, *row)
 
-    def load_saved(self, name: datetime.datetime) -> Optional[dict]:
+    def load_saved(self, name: datetime.datetime,
+                   path: str = None) -> Optional[dict]:
         """Load specified saved configuration.
 
-        :param name: Timestamp to load."""
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
 
         str_name = SqliteStorageAdaptor._to_timestamp(name)
         cursor = self._connection.cursor()
@@ -157,65 +495,654 @@ class SqliteStorageAdaptor(StorageAdaptor):
         if not row:
             return
 
-        return json.loads(row[0])
+        return select_subtree(self._decode(*row), path)
 
-    def save_current(self, config: dict):
-        """Save config as running."""
+    def save_current(self, config: dict) -> datetime.datetime:
+        """Save config as running.
 
-        buf = json.dumps(config)
-        now = self._now()
+        :returns: Timestamp of the saved configuration.
 
-        cursor = self._connection.cursor()
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.execute(SAVE_CURRENT, [self._server_id, now, buf])
-        cursor.execute("COMMIT")
-        cursor.close()
-        return
+        The config is retained, and must not be modified afterwards, if
+        deltas are being stored."""
+        return self.write_batch([('save_current', config)])[0]
 
     def save_staged(self, config: dict):
         """Save config as staged."""
+        self.write_batch([('save_staged', config)])
+        return
 
-        buf = json.dumps(config)
+    def list_saved(self, since: datetime.datetime = None,
+                   until: datetime.datetime = None, limit: int = None,
+                   before: datetime.datetime = None) -> list:
+        """List timestamps of saved (un-archived) configurations.
 
-        cursor = self._connection.cursor()
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.execute(SAVE_STAGED, [self._server_id, STAGED_TIME, buf])
-        cursor.execute("COMMIT")
-        cursor.close()
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
+        return self._list_saved(LIST_SAVED, since, until, limit, before)
+
+    def archive(self, cutoff: datetime.datetime):
+        """Flag as archived all configurations older than timestamp.
+
+        :param cutoff: Cut-off timestamp."""
+        self.write_batch([('archive', cutoff)])
+        return
+
+    def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+        self.write_batch([('delete_saved', names)])
+        return
+
+    def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+        return self.write_batch([('purge_archived', limit)])[0]
+
+    def reclaim(self):
+        """Release up to RECLAIM_PAGES pages of free space to the system."""
+        self.write_batch([('reclaim', RECLAIM_PAGES)])
         return
 
-    def list_saved(self) -> list:
-        """List timestamps of all saved (un-archived) configurations."""
+    def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal.
+
+        :param records: List of (sequence number, record) pairs."""
+        self.write_batch([('append_journal', records)])
+        return
+
+    def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs."""
 
         cursor = self._connection.cursor()
-        cursor.execute(LIST_SAVED, [self._server_id, STAGED_TIME])
+        cursor.execute(JOURNAL_LOAD, [self._server_id])
         rows = cursor.fetchall()
         cursor.close()
-        return [parse_date(row[0]) for row in rows]
+        return [(seq, json.loads(record)) for seq, record in rows]
 
-    def archive(self, cutoff: datetime.datetime):
-        """Flag as archived all configurations older than timestamp.
+    def compact_journal(self, config: Optional[dict],
+                        seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
 
-        :param cutoff: Cut-off timestamp."""
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration."""
+
+        if config is None:
+            self.write_batch([('truncate_journal', seq)])
+            return
+        return self.write_batch([('save_current', config),
+                                 ('truncate_journal', seq)])[0]
+
+    def write_batch(self, writes: list) -> list:
+        """Perform several writes in a single transaction.
+
+        :param writes: List of (method, argument) pairs, where method is
+          one of 'save_current', 'save_staged', 'archive',
+          'delete_saved', 'purge_archived', 'reclaim',
+          'append_journal' or 'truncate_journal'.
+        :returns: List of the writes' results.
+
+        If any write fails, the transaction is rolled back, and none of
+        the writes take effect."""
 
-        cutoff_str = \
-            cutoff.strftime(TIME_FORMAT) + \
-            str(cutoff.microsecond / 1000)
+        methods = {'save_current': self._save_current,
+                   'save_staged': self._save_staged,
+                   'archive': self._archive,
+                   'delete_saved': self._delete_saved,
+                   'purge_archived': self._purge_archived,
+                   'reclaim': self._reclaim,
+                   'append_journal': self._append_journal,
+                   'truncate_journal': self._truncate_journal}
+        state = (self._previous, self._chain, self._last, self._recorded)
 
+        results = []
         cursor = self._connection.cursor()
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.execute(ARCHIVE, [self._server_id, cutoff_str])
-        cursor.execute("COMMIT")
+        try:
+            cursor.execute("BEGIN TRANSACTION")
+            for method, arg in writes:
+                results.append(methods[method](cursor, arg))
+            cursor.execute("COMMIT")
+        except Exception:
+            if self._connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            self._previous, self._chain, self._last, self._recorded = state
+            raise
+        finally:
+            cursor.close()
+        return results
+
+    def _save_current(self, cursor: sqlite3.Cursor,
+                      config: dict) -> datetime.datetime:
+        """(Internal) Insert a saved configuration, returning its timestamp."""
+
+        now = self._next_saved()
+        if self._history:
+            self._record_history(cursor, now, config)
+
+        if self._dedup:
+            cursor.execute(SAVE_CURRENT,
+                           [self._server_id, now, '', None, None,
+                            self._save_content(cursor, config, True)[0]])
+            return self._last
+
+        if self._previous is not None and self._chain < self._delta - 1:
+            delta_of, previous = self._previous
+            buf = self._codec.encode(make_delta(previous, config))
+            self._chain += 1
+        else:
+            delta_of = None
+            buf = self._codec.encode(config)
+            self._chain = 0
+
+        cursor.execute(SAVE_CURRENT, [self._server_id, now, buf, delta_of,
+                                      self._encoding, None])
+
+        if self._delta > 1:
+            self._previous = (now, config)
+        return self._last
+
+    def _append_journal(self, cursor: sqlite3.Cursor,
+                        records: List[Tuple[int, list]]):
+        """(Internal) Insert change journal records."""
+
+        cursor.executemany(JOURNAL_APPEND,
+                           [(self._server_id, seq, json.dumps(record))
+                            for seq, record in records])
+        return
+
+    def _truncate_journal(self, cursor: sqlite3.Cursor, seq: int):
+        """(Internal) Delete change journal records up to 'seq'."""
+
+        cursor.execute(JOURNAL_TRUNCATE, [self._server_id, seq])
+        return
+
+    def _delete_saved(self, cursor: sqlite3.Cursor,
+                      names: List[datetime.datetime]):
+        """(Internal) Delete saved configurations."""
+
+        for name in names:
+            self._delete(cursor, self._to_timestamp(name))
+        return
+
+    def _purge_archived(self, cursor: sqlite3.Cursor, limit: int) -> int:
+        """(Internal) Delete the oldest archived configurations."""
+
+        cursor.execute(LIST_ARCHIVED, [self._server_id, STAGED_TIME, limit])
+        rows = cursor.fetchall()
+        for row in rows:
+            self._delete(cursor, row[0])
+        return len(rows)
+
+    def _delete(self, cursor: sqlite3.Cursor, saved: str):
+        """(Internal) Delete a saved configuration, rebasing its deltas.
+
+        Configurations stored as deltas against the deleted one are
+        rewritten as deltas against its base, or in full if it has
+        none."""
+
+        cursor.execute(LOAD_DELTA_OF, [self._server_id, saved])
+        row = cursor.fetchone()
+        if not row:
+            return
+
+        delta_of, _, _, content = row
+        cursor.execute(LOAD_DEPENDENTS, [self._server_id, saved])
+        dependents = cursor.fetchall()
+        if dependents:
+            base = None
+            if delta_of is not None:
+                cursor.execute(LOAD_DELTA_OF, [self._server_id, delta_of])
+                base = self._decode(*cursor.fetchone())
+
+            for dependent, *stored in dependents:
+                config = self._decode(*stored)
+                if base is None:
+                    buf = self._codec.encode(config)
+                else:
+                    buf = self._codec.encode(make_delta(base, config))
+                cursor.execute(REBASE, [delta_of, self._encoding, buf,
+                                        self._server_id, dependent])
+
+        cursor.execute(DELETE_SAVED, [self._server_id, saved])
+        if content is not None:
+            self._unswept = True
+        if self._previous is not None and self._previous[0] == saved:
+            self._previous = None
+        return
+
+    def _reclaim(self, cursor: sqlite3.Cursor, pages: int):
+        """(Internal) Delete unreferenced content, and release free pages."""
+
+        if self._unswept:
+            self._sweep_content(cursor)
+            self._unswept = False
+
+        cursor.execute("pragma incremental_vacuum(%u)" % pages)
+        cursor.fetchall()
+        return
+
+    @staticmethod
+    def _sweep_content(cursor: sqlite3.Cursor):
+        """(Internal) Delete content rows no longer referenced."""
+
+        cursor.execute(CONTENT_ROOTS)
+        pending = [row[0] for row in cursor.fetchall()]
+        reachable = set()
+        while pending:
+            digest = pending.pop()
+            if digest in reachable:
+                continue
+            reachable.add(digest)
+            cursor.execute(CONTENT_REFS, [digest])
+            row = cursor.fetchone()
+            if row and row[0]:
+                pending.extend(ref[2] for ref in json.loads(row[0]))
+
+        cursor.execute(CONTENT_LIST)
+        unreferenced = [row for row in cursor.fetchall()
+                        if row[0] not in reachable]
+        cursor.executemany(CONTENT_DELETE, unreferenced)
+        return
+
+    def _save_content(self, cursor: sqlite3.Cursor,
+                      config: Union[dict, list], root: bool = False) -> tuple:
+        """(Internal) Insert content rows for an object, as required.
+
+        :param config: Object or list to store.
+        :param root: If True, always store the object in its own row.
+        :returns: Tuple of the object's hash (or None, if it is small
+          enough to be stored in its parent's row) and weight."""
+
+        if isinstance(config, list):
+            return self._save_list(cursor, config)
+
+        members = {}
+        refs = []
+        weight = 1
+        for position, (key, value) in enumerate(config.items()):
+            if isinstance(value, (dict, list)):
+                digest, child_weight = self._save_content(cursor, value)
+                weight += child_weight
+                if digest is not None:
+                    refs.append([position, key, digest])
+                    continue
+            else:
+                weight += 1
+            members[key] = value
+
+        if weight < SUBTREE_WEIGHT and not root:
+            return None, weight
+        return self._insert_content(cursor, members, refs), weight
+
+    def _save_list(self, cursor: sqlite3.Cursor, config: list) -> tuple:
+        """(Internal) Insert content rows for a list, as required.
+
+        :param config: List to store.
+        :returns: Tuple of the list's hash (or None, if it is small
+          enough to be stored in its parent's row) and weight."""
+
+        elements = []
+        weight = 1
+        for value in config:
+            digest = None
+            if isinstance(value, (dict, list)):
+                digest, child_weight = self._save_content(cursor, value)
+            else:
+                child_weight = 1
+            weight += child_weight
+            elements.append((value, digest, child_weight))
+
+        if weight < SUBTREE_WEIGHT:
+            return None, weight
+
+        # Split into chunks, each stored as a list row.  A chunk ends
+        # at an element whose hash meets a condition, so that its
+        # boundaries move only near changed elements.
+        refs = []
+        start = 0
+        chunk_weight = 0
+        for index, (value, digest, child_weight) in enumerate(elements):
+            chunk_weight += child_weight
+            if index + 1 < len(elements) and \
+                    chunk_weight < SUBTREE_WEIGHT and \
+                    (chunk_weight < SUBTREE_WEIGHT // 4 or
+                     not self._is_boundary(value, digest)):
+                continue
+
+            members = []
+            chunk_refs = []
+            for position, (value, digest, _) in \
+                    enumerate(elements[start:index + 1]):
+                if digest is None:
+                    members.append(value)
+                else:
+                    chunk_refs.append([position, None, digest])
+            refs.append([start, CHUNK,
+                         self._insert_content(cursor, members, chunk_refs)])
+            start = index + 1
+            chunk_weight = 0
+
+        # Group chunks, until few enough to reference from one row.
+        while len(refs) > CHUNK_FANOUT:
+            groups = []
+            start = 0
+            for index, (_, _, digest) in enumerate(refs):
+                count = index + 1 - start
+                if index + 1 < len(refs) and count < CHUNK_FANOUT and \
+                        (count < CHUNK_FANOUT // 4 or
+                         not self._is_boundary(None, digest)):
+                    continue
+
+                base = refs[start][0]
+                group = [[position - base, CHUNK, digest]
+                         for position, _, digest in refs[start:index + 1]]
+                groups.append([base, CHUNK,
+                               self._insert_content(cursor, [], group)])
+                start = index + 1
+            refs = groups
+
+        return self._insert_content(cursor, [], refs), weight
+
+    @staticmethod
+    def _is_boundary(value, digest: Optional[str]) -> bool:
+        """(Internal) Return True if a list chunk may end after an element.
+
+        :param value: Element stored in the chunk's row.
+        :param digest: Alternatively, the hash of the element's row."""
+
+        if digest is None:
+            digest = hashlib.blake2b(json.dumps(value).encode(),
+                                     digest_size=16).hexdigest()
+        return digest[0] in '0123'
+
+    def _insert_content(self, cursor: sqlite3.Cursor,
+                        members: Union[dict, list], refs: list) -> str:
+        """(Internal) Insert a content row, unless already present.
+
+        :param members: Object members or list elements stored inline.
+        :param refs: List of [position, key, hash] references to the
+          other members' rows.
+        :returns: Hash of the row."""
+
+        buf = json.dumps(members)
+        refs_buf = json.dumps(refs) if refs else None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(buf.encode())
+        if refs_buf:
+            digest.update(b'\0' + refs_buf.encode())
+        digest = digest.hexdigest()
+
+        if self._encoding != 'json':
+            buf = self._codec.encode(members)
+        cursor.execute(SAVE_CONTENT, [digest, self._encoding, refs_buf, buf])
+        return digest
+
+    def _load_content(self, cursor: sqlite3.Cursor,
+                      digest: str) -> Union[dict, list]:
+        """(Internal) Return the object or list stored with the given hash."""
+
+        cursor.execute(LOAD_CONTENT, [digest])
+        row = cursor.fetchone()
+        if not row:
+            raise StorageCorrupted("Missing content: %s" % digest)
+
+        encoding, refs, settings = row
+        config = get_codec(encoding).decode(settings)
+        if not refs:
+            return config
+
+        # References are in position order, so each is inserted after
+        # the members preceding it.
+        if isinstance(config, list):
+            for position, key, child in json.loads(refs):
+                if key == CHUNK:
+                    config[position:position] = \
+                        self._load_content(cursor, child)
+                else:
+                    config.insert(position,
+                                  self._load_content(cursor, child))
+            return config
+
+        items = list(config.items())
+        for position, key, child in json.loads(refs):
+            items.insert(position, (key, self._load_content(cursor, child)))
+        return dict(items)
+
+    def _save_staged(self, cursor: sqlite3.Cursor, config: dict):
+        """(Internal) Insert or replace the staged configuration."""
+
+        buf = self._codec.encode(config)
+        cursor.execute(SAVE_STAGED, [self._server_id, STAGED_TIME, buf,
+                                     self._encoding])
+        return
+
+    def _archive(self, cursor: sqlite3.Cursor, cutoff: datetime.datetime):
+        """(Internal) Flag configurations older than cutoff as archived."""
+
+        cutoff_str = SqliteStorageAdaptor._to_timestamp(cutoff)
+        cursor.execute(ARCHIVE, [self._server_id, STAGED_TIME, cutoff_str])
+        return
+
+    def history(self, path: str, since: datetime.datetime = None,
+                until: datetime.datetime = None) -> List[HistoryEntry]:
+        """Return the changes to a property's saved value.
+
+        :param path: '/'-separated path of the property.
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return.
+        :returns: List of changes, oldest first.  If 'since' is set,
+          the first is the change in effect at that time, which may
+          be earlier.
+
+        Only changes saved with the 'history' option are recorded."""
+
+        key = '/'.join(self._escape(name)
+                       for name in split_storage_path(path))
+        since_str = EARLIEST_TIME if since is None \
+            else self._to_timestamp(since)
+        until_str = LATEST_TIME if until is None \
+            else self._to_timestamp(until)
+
+        cursor = self._connection.cursor()
+        rows = []
+        if since is not None:
+            cursor.execute(HISTORY_LOAD_BEFORE,
+                           [self._server_id, key, since_str])
+            rows.extend(cursor.fetchall())
+        cursor.execute(HISTORY_LOAD,
+                       [self._server_id, key, since_str, until_str])
+        rows.extend(cursor.fetchall())
         cursor.close()
+
+        return [HistoryEntry(self._from_timestamp(saved),
+                             None if removed else json.loads(value),
+                             bool(removed))
+                for saved, removed, value in rows]
+
+    def _record_history(self, cursor: sqlite3.Cursor, saved: str,
+                        config: dict):
+        """(Internal) Insert history rows for a new saved configuration.
+
+        Called before the configuration itself is inserted."""
+
+        if self._recorded is None:
+            self._recorded = self.load_current() or {}
+
+        rows = []
+        self._changes(self._recorded, config, '', rows)
+        cursor.executemany(HISTORY_SAVE,
+                           [(self._server_id, path, saved, removed, value)
+                            for path, removed, value in rows])
+        self._recorded = config
         return
 
+    @classmethod
+    def _changes(cls, old, new, path: str, rows: list):
+        """(Internal) Append (path, removed, value) rows for changed values.
+
+        :param old: Previous subtree or value, or MISSING.
+        :param new: New subtree or value, or MISSING.
+        :param path: Escaped path of the subtree.
+        :param rows: List of rows, extended in place."""
+
+        if old is new:
+            return
+
+        old_items = cls._items(old)
+        new_items = cls._items(new)
+
+        # Values, including a value replaced by a subtree, or vice versa.
+        old_value = MISSING if old_items is not None else old
+        new_value = MISSING if new_items is not None else new
+        if new_value is not MISSING:
+            if old_value is MISSING or type(old_value) is not \
+                    type(new_value) or old_value != new_value:
+                rows.append((path, 0, json.dumps(new_value)))
+        elif old_value is not MISSING:
+            rows.append((path, 1, None))
+
+        # Subtrees: list elements and object members are keyed alike.
+        old_items = old_items or {}
+        new_items = new_items or {}
+        prefix = path + '/' if path else ''
+        for key, value in new_items.items():
+            cls._changes(old_items.get(key, MISSING), value, prefix + key,
+                         rows)
+        for key, value in old_items.items():
+            if key not in new_items:
+                cls._changes(value, MISSING, prefix + key, rows)
+        return
+
+    @classmethod
+    def _items(cls, node) -> Optional[dict]:
+        """(Internal) Return a subtree's children, by escaped key.
+
+        Returns None for values (and MISSING)."""
+
+        if isinstance(node, dict):
+            return {cls._escape(key): value for key, value in node.items()}
+        if isinstance(node, list):
+            return {str(index): value for index, value in enumerate(node)}
+        return None
+
     @staticmethod
-    def _now() -> str:
-        return SqliteStorageAdaptor._to_timestamp(datetime.datetime.utcnow())
+    def _create_schema(cursor: sqlite3.Cursor):
+        """(Internal) Create, or upgrade, the database schema."""
+
+        cursor.execute(CREATE)
+        cursor.execute(CONTENT_CREATE)
+        cursor.execute("pragma table_info(config)")
+        columns = {row[1] for row in cursor.fetchall()}
+        for name, definition in ADDED_COLUMNS:
+            if name not in columns:
+                cursor.execute("alter table config add column %s %s" %
+                               (name, definition))
+        cursor.execute(CREATE_SAVED_INDEX)
+        cursor.execute(CREATE_DELTA_OF_INDEX)
+        return
+
+    def _decode(self, delta_of: Optional[str], encoding: Optional[str],
+                settings, content: Optional[str] = None) -> dict:
+        """(Internal) Return the configuration stored in a row.
+
+        :param delta_of: Timestamp of the configuration this row is a
+          delta against, or None for a full configuration.
+        :param encoding: Name of the codec used, or None for JSON.
+        :param settings: Encoded configuration or delta.
+        :param content: Hash of the stored configuration, if stored by
+          content."""
+
+        deltas = []
+        cursor = self._connection.cursor()
+        try:
+            while delta_of is not None:
+                deltas.append((encoding, settings))
+                cursor.execute(LOAD_DELTA_OF, [self._server_id, delta_of])
+                row = cursor.fetchone()
+                if not row:
+                    raise StorageCorrupted("Missing base configuration: %s"
+                                           % delta_of)
+                delta_of, encoding, settings, content = row
+
+            if content is not None:
+                config = self._load_content(cursor, content)
+            else:
+                config = get_codec(encoding or 'json').decode(settings)
+        finally:
+            cursor.close()
+
+        for encoding, delta in reversed(deltas):
+            apply_delta(config, get_codec(encoding or 'json').decode(delta))
+        return config
+
+    def _next_saved(self) -> str:
+        """(Internal) Return a timestamp for a new saved configuration.
+
+        Timestamps have millisecond resolution, so saves made within one
+        millisecond are given successive timestamps."""
+
+        moment = datetime.datetime.utcnow()
+        moment = moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+        if self._last is not None and moment <= self._last:
+            moment = self._last + datetime.timedelta(milliseconds=1)
+        self._last = moment
+        return self._to_timestamp(moment)
+
+    @staticmethod
+    def _escape(name: str) -> str:
+        """(Internal) Escape '/' (and '%') in a path element."""
+
+        if '%' in name or '/' in name:
+            return name.replace('%', '%25').replace('/', '%2F')
+        return name
+
+    @staticmethod
+    def _unescape(name: str) -> str:
+        """(Internal) Reverse _escape()."""
+
+        if '%' in name:
+            return name.replace('%2F', '/').replace('%25', '%')
+        return name
+
+    def _list_saved(self, query: str, since: Optional[datetime.datetime],
+                    until: Optional[datetime.datetime], limit: Optional[int],
+                    before: Optional[datetime.datetime]) -> list:
+        """(Internal) Run a LIST_SAVED query, and parse the timestamps."""
+
+        args = [self._server_id, STAGED_TIME,
+                EARLIEST_TIME if since is None else self._to_timestamp(since),
+                LATEST_TIME if until is None else self._to_timestamp(until),
+                LATEST_TIME if before is None else
+                self._to_timestamp(before),
+                -1 if limit is None else limit]
+
+        cursor = self._connection.cursor()
+        cursor.execute(query, args)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        from_timestamp = self._from_timestamp
+        return [from_timestamp(row[0]) for row in rows]
 
     @staticmethod
     def _to_timestamp(moment: datetime.datetime) -> str:
-        return moment.strftime(TIME_FORMAT) + str(moment.microsecond // 1000)
+        return moment.strftime(TIME_FORMAT) + \
+            "%03u" % (moment.microsecond // 1000)
+
+    @staticmethod
+    def _from_timestamp(value: str) -> datetime.datetime:
+        # Timestamps are ISO 8601, as written by _to_timestamp(), which
+        # fromisoformat() parses much faster than strptime().
+        return datetime.datetime.fromisoformat(value)
 
     @staticmethod
     def _get_path_from_url(url: str) -> str:
@@ -225,12 +1152,453 @@ class SqliteStorageAdaptor(StorageAdaptor):
                                       "'sqlite://filename', but got %s" % url)
 
         scheme = url[:point]
-        if scheme != 'sqlite':
+        if scheme not in ('sqlite', 'sqlite3', 'sqlite+paths',
+                          'sqlite3+paths'):
             raise BadStorageURLScheme("Bad URL scheme: expecting "
                                       "'sqlite', but got %s" % scheme)
 
-        path = url[point + 3:]
+        path = url[point + 3:].partition('?')[0]
         return path
 
+    @staticmethod
+    def _get_options_from_url(url: str) -> dict:
+        return dict(parse_qsl(url.partition('?')[2]))
+
+
+class SqlitePathStorageAdaptor(SqliteStorageAdaptor):
+    """Sqlite3 storage adaptor, storing one row per node.
+
+    Loading a subtree reads only that subtree's rows.  Configurations
+    are always stored in full, so the 'delta' and 'codec' options don't
+    apply."""
+
+    def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
+
+        cursor = self._connection.cursor()
+        cursor.execute(PATH_LOAD_CURRENT, [self._server_id, STAGED_TIME])
+        row = cursor.fetchone()
+        cursor.close()
+
+        if not row:
+            return
+
+        return self._load(row[0], path)
+
+    def load_staged(self) -> Optional[dict]:
+        """Load staged configuration."""
+
+        cursor = self._connection.cursor()
+        cursor.execute(PATH_LOAD_SAVED, [self._server_id, STAGED_TIME])
+        row = cursor.fetchone()
+        cursor.close()
+
+        if not row:
+            return
+
+        return self._load(STAGED_TIME)
+
+    def load_saved(self, name: datetime.datetime,
+                   path: str = None) -> Optional[dict]:
+        """Load specified saved configuration.
+
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
+
+        cursor = self._connection.cursor()
+        cursor.execute(PATH_LOAD_SAVED,
+                       [self._server_id, self._to_timestamp(name)])
+        row = cursor.fetchone()
+        cursor.close()
+
+        if not row:
+            return
+
+        return self._load(row[0], path)
+
+    def list_saved(self, since: datetime.datetime = None,
+                   until: datetime.datetime = None, limit: int = None,
+                   before: datetime.datetime = None) -> list:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
+        return self._list_saved(PATH_LIST_SAVED, since, until, limit, before)
+
+    def _save_current(self, cursor: sqlite3.Cursor,
+                      config: dict) -> datetime.datetime:
+        """(Internal) Insert a saved configuration, returning its timestamp."""
+
+        now = self._next_saved()
+        if self._history:
+            self._record_history(cursor, now, config)
+        self._save(cursor, now, config)
+        return self._last
+
+    def _save_staged(self, cursor: sqlite3.Cursor, config: dict):
+        """(Internal) Insert or replace the staged configuration."""
+
+        cursor.execute(PATH_DELETE_NODES, [self._server_id, STAGED_TIME])
+        self._save(cursor, STAGED_TIME, config)
+        return
+
+    def _archive(self, cursor: sqlite3.Cursor, cutoff: datetime.datetime):
+        """(Internal) Flag configurations older than cutoff as archived."""
+
+        cutoff_str = SqliteStorageAdaptor._to_timestamp(cutoff)
+        cursor.execute(PATH_ARCHIVE,
+                       [self._server_id, STAGED_TIME, cutoff_str])
+        return
+
+    def _purge_archived(self, cursor: sqlite3.Cursor, limit: int) -> int:
+        """(Internal) Delete the oldest archived configurations."""
+
+        cursor.execute(PATH_LIST_ARCHIVED,
+                       [self._server_id, STAGED_TIME, limit])
+        rows = cursor.fetchall()
+        for row in rows:
+            self._delete(cursor, row[0])
+        return len(rows)
+
+    def _delete(self, cursor: sqlite3.Cursor, saved: str):
+        """(Internal) Delete a saved configuration's rows."""
+
+        cursor.execute(PATH_DELETE_SNAPSHOT, [self._server_id, saved])
+        cursor.execute(PATH_DELETE_NODES, [self._server_id, saved])
+        return
+
+    def _save(self, cursor: sqlite3.Cursor, saved: str, config: dict):
+        """(Internal) Insert the rows for a configuration."""
+
+        rows = []
+        self._flatten(config, '', rows)
+        cursor.execute(PATH_SAVE_SNAPSHOT, [self._server_id, saved])
+        cursor.executemany(PATH_SAVE_NODE,
+                           [(self._server_id, saved, path, kind, value)
+                            for path, kind, value in rows])
+        return
+
+    def _load(self, saved: str, path: str = None):
+        """(Internal) Return a configuration, or one of its subtrees.
+
+        :param saved: Timestamp string of the configuration.
+        :param path: '/'-separated path of the subtree, or None for all."""
+
+        names = split_storage_path(path) if path is not None else ()
+        base = '/'.join(self._escape(name) for name in names)
+
+        cursor = self._connection.cursor()
+        if not names:
+            cursor.execute(PATH_LOAD_TREE, [self._server_id, saved])
+        else:
+            cursor.execute(PATH_LOAD_SUBTREE,
+                           [self._server_id, saved, base, base + '0'])
+        rows = cursor.fetchall()
+        cursor.close()
+
+        if names:
+            prefix = base + '/'
+            rows = [row for row in rows
+                    if row[0] == base or row[0].startswith(prefix)]
+
+        if not rows:
+            return
+
+        # Rows are ordered by path, so parents precede their children.
+        # Lists are collected as dicts keyed by index, and converted
+        # once complete, children before their parents.
+        root = None
+        containers = {}
+        lists = []
+        for row_path, kind, value in rows:
+            if kind == 'v':
+                node = json.loads(value)
+            else:
+                node = {}
+                containers[row_path] = node
+                if kind == 'l':
+                    lists.append(row_path)
+
+            if row_path == base:
+                root = node
+            else:
+                parent, _, key = row_path.rpartition('/')
+                containers[parent][self._unescape(key)] = node
+
+        for row_path in reversed(lists):
+            items = containers[row_path]
+            node = [items[str(index)] for index in range(len(items))]
+            if row_path == base:
+                root = node
+            else:
+                parent, _, key = row_path.rpartition('/')
+                containers[parent][self._unescape(key)] = node
+
+        return root
+
+    @staticmethod
+    def _flatten(config, path: str, rows: list):
+        """(Internal) Append (path, kind, value) rows for a subtree."""
+
+        if isinstance(config, dict):
+            rows.append((path, 'o', None))
+            prefix = path + '/' if path else ''
+            escape = SqlitePathStorageAdaptor._escape
+            for key, value in config.items():
+                SqlitePathStorageAdaptor._flatten(value, prefix + escape(key),
+                                                  rows)
+        elif isinstance(config, list):
+            rows.append((path, 'l', None))
+            prefix = path + '/' if path else ''
+            for index, value in enumerate(config):
+                SqlitePathStorageAdaptor._flatten(value, prefix + str(index),
+                                                  rows)
+        else:
+            rows.append((path, 'v', json.dumps(config)))
+        return
+
+    @staticmethod
+    def _create_schema(cursor: sqlite3.Cursor):
+        """(Internal) Create the database schema."""
+
+        cursor.execute(PATH_CREATE_SNAPSHOT)
+        cursor.execute(PATH_CREATE_NODE)
+        cursor.execute(PATH_CREATE_INDEX)
+        cursor.execute(PATH_CREATE_SAVED_INDEX)
+        return
+
+
+class AsyncSqliteStorageAdaptor(ExecutorStorageAdaptor):
+    """Asynchronous Sqlite3 storage adaptor, with group commit.
+
+    Writes are queued, and a single task commits everything queued
+    while the previous transaction was being written as one new
+    transaction, so a burst of saves costs a few syncs to disk rather
+    than one each.  A queued staged save is dropped if a newer one is
+    queued before it is written.
+
+    Reads wait until queued writes have been committed."""
+
+    # Synchronous adaptor class.
+    ADAPTOR = SqliteStorageAdaptor
+
+    def __init__(self, server_id: str, url: str):
+        """Constructor.
+
+        :param server_id: Server instance identifier.
+        :param url: Configuration store URL."""
+
+        super().__init__(server_id, url, self.ADAPTOR)
+        self._queue = []
+        self._writer = None
+        return
+
+    async def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
+        await self.flush()
+        return await super().load_current(path)
+
+    async def load_staged(self) -> Optional[dict]:
+        """Load staged configuration."""
+        await self.flush()
+        return await super().load_staged()
+
+    async def load_saved(self, name: datetime.datetime,
+                         path: str = None) -> Optional[dict]:
+        """Load specified saved configuration.
+
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
+        await self.flush()
+        return await super().load_saved(name, path)
+
+    async def list_saved(self, since: datetime.datetime = None,
+                         until: datetime.datetime = None, limit: int = None,
+                         before: datetime.datetime = None) -> list:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps."""
+        await self.flush()
+        return await super().list_saved(since, until, limit, before)
+
+    async def history(self, path: str, since: datetime.datetime = None,
+                      until: datetime.datetime = None) -> list:
+        """Return the changes to a property's saved value.
+
+        :param path: '/'-separated path of the property.
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return."""
+        await self.flush()
+        return await super().history(path, since, until)
+
+    async def save_current(self, config: dict) -> datetime.datetime:
+        """Save config as running, returning once it is committed.
+
+        :returns: Timestamp of the saved configuration."""
+        return await self.submit('save_current', config)
+
+    async def save_staged(self, config: dict):
+        """Save config as staged, returning once it is committed."""
+        await self.submit('save_staged', config)
+        return
+
+    async def archive(self, cutoff: datetime.datetime):
+        """Flag as archived all configurations older than timestamp.
+
+        :param cutoff: Cut-off timestamp."""
+        await self.submit('archive', cutoff)
+        return
+
+    async def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+        await self.submit('delete_saved', names)
+        return
+
+    async def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+        return await self.submit('purge_archived', limit)
+
+    async def reclaim(self):
+        """Release up to RECLAIM_PAGES pages of free space to the system."""
+        await self.submit('reclaim', RECLAIM_PAGES)
+        return
+
+    async def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal, once committed.
+
+        :param records: List of (sequence number, record) pairs."""
+        await self.submit('append_journal', records)
+        return
+
+    async def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs."""
+        await self.flush()
+        return await super().load_journal()
+
+    async def compact_journal(self, config: Optional[dict],
+                              seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
+
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration.
+
+        Both writes are queued together, so they are committed in the
+        same transaction."""
+
+        if config is None:
+            await self.submit('truncate_journal', seq)
+            return
+        saved = self.submit('save_current', config)
+        truncated = self.submit('truncate_journal', seq)
+        await truncated
+        return await saved
+
+    async def close(self):
+        """Commit queued writes, then close the database."""
+        await self.flush()
+        await super().close()
+        return
+
+    def submit(self, method: str, arg) -> asyncio.Future:
+        """Queue a write.
+
+        :param method: Name of a write method (see write_batch()).
+        :param arg: The method's argument.
+        :returns: Future, whose result is set once the write has been
+          committed, or whose exception is set if it failed."""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        futures = [future]
+
+        if method == 'save_staged':
+            for index, write in enumerate(self._queue):
+                if write[0] == 'save_staged':
+                    futures.extend(write[2])
+                    del self._queue[index]
+                    break
+
+        self._queue.append((method, arg, futures))
+        if self._writer is None:
+            self._writer = loop.create_task(self._write())
+        return future
+
+    async def flush(self):
+        """Wait until all queued writes have been committed."""
+
+        while self._writer is not None:
+            await asyncio.shield(self._writer)
+        return
+
+    async def _write(self):
+        """(Internal) Commit queued writes, until the queue is empty."""
+
+        while True:
+            batch, self._queue = self._queue, []
+            error = None
+            try:
+                results = await self._call(
+                    self._adaptor.write_batch,
+                    [(method, arg) for method, arg, _ in batch])
+            except Exception as e:
+                error = e
+                results = None
+            else:
+                if not isinstance(results, list) or \
+                        len(results) != len(batch):
+                    error = RuntimeError("Expected %u write results, got %r"
+                                         % (len(batch), results))
+            if error is not None:
+                results = [None] * len(batch)
+
+            # Finish before completing the last futures, so that a loop
+            # run only until they complete doesn't leave this pending.
+            if not self._queue:
+                self._writer = None
+
+            for (_, _, futures), result in zip(batch, results):
+                for future in futures:
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+
+            if self._writer is None:
+                return
+
+
+class AsyncSqlitePathStorageAdaptor(AsyncSqliteStorageAdaptor):
+    """Asynchronous Sqlite3 storage adaptor, storing one row per node."""
+
+    ADAPTOR = SqlitePathStorageAdaptor
+
 
+register_storage_adaptor("sqlite", SqliteStorageAdaptor)
 register_storage_adaptor("sqlite3", SqliteStorageAdaptor)
+register_storage_adaptor("sqlite+paths", SqlitePathStorageAdaptor)
+register_storage_adaptor("sqlite3+paths", SqlitePathStorageAdaptor)
+register_async_storage_adaptor("sqlite", AsyncSqliteStorageAdaptor)
+register_async_storage_adaptor("sqlite3", AsyncSqliteStorageAdaptor)
+register_async_storage_adaptor("sqlite+paths", AsyncSqlitePathStorageAdaptor)
+register_async_storage_adaptor("sqlite3+paths", AsyncSqlitePathStorageAdaptor)
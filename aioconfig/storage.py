@@ -23,12 +23,37 @@
 #
 ########################################################################
 
+import asyncio
+import concurrent.futures
 import datetime
-from typing import List
+import json
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, NamedTuple, Optional
+from typing import Tuple, Union
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
-# Provider registry.
+
+# Provider registries.
 STORAGE_ADAPTORS = {}
+ASYNC_STORAGE_ADAPTORS = {}
+CODECS = {}
+
+
+class HistoryEntry(NamedTuple):
+    """A change to a property's saved value."""
+
+    # Timestamp of the saved configuration.
+    saved: datetime.datetime
+
+    # New value, or None if removed.
+    value: Any
+
+    # True if the property was removed.
+    removed: bool
 
 
 class StorageAdaptor:
@@ -44,38 +69,579 @@ class StorageAdaptor:
         self._url = url
         return
 
-    def load_current(self) -> dict:
-        """Load current (latest) saved configuration."""
+    def load_current(self, path: str = None) -> dict:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
         pass
 
     def load_staged(self):
         """Load staged configuration."""
         pass
 
-    def load_saved(self, name: datetime.datetime):
+    def load_saved(self, name: datetime.datetime, path: str = None):
         """Load specified saved configuration.
 
-        :param name: Timestamp to load."""
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
         pass
 
-    def save_current(self, config: dict):
-        """Save config as running."""
+    def save_current(self, config: dict) -> Optional[datetime.datetime]:
+        """Save config as running.
+
+        :returns: Timestamp of the saved configuration, if known."""
         pass
 
     def save_staged(self, config: dict):
         """Save config as staged."""
         pass
 
-    def list_saved(self) -> List[datetime.datetime]:
-        """List timestamps of all saved (un-archived) configurations."""
+    def list_saved(self, since: datetime.datetime = None,
+                   until: datetime.datetime = None, limit: int = None,
+                   before: datetime.datetime = None
+                   ) -> List[datetime.datetime]:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
         pass
 
+    def iter_saved(self, since: datetime.datetime = None,
+                   until: datetime.datetime = None,
+                   page_size: int = 1000) -> Iterator[datetime.datetime]:
+        """Generate timestamps of saved configurations, newest first.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param page_size: Number of timestamps to fetch at a time."""
+
+        before = None
+        while True:
+            page = self.list_saved(since, until, page_size, before)
+            yield from page
+            if len(page) < page_size:
+                return
+            before = page[-1]
+
     def archive(self, cutoff: datetime.datetime):
         """Flag as archived all configurations older than timestamp.
 
         :param cutoff: Cut-off timestamp."""
         pass
 
+    def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+        pass
+
+    def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+        pass
+
+    def reclaim(self):
+        """Release some of the space freed by deleted configurations."""
+        pass
+
+    def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal.
+
+        :param records: List of (sequence number, record) pairs."""
+        pass
+
+    def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs."""
+        pass
+
+    def compact_journal(self, config: Optional[dict],
+                        seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
+
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration, if known.
+
+        The save and the discard must take effect together."""
+        pass
+
+    def history(self, path: str, since: datetime.datetime = None,
+                until: datetime.datetime = None) -> List[HistoryEntry]:
+        """Return the changes to a property's saved value.
+
+        :param path: '/'-separated path of the property.
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return.
+        :returns: List of changes, oldest first."""
+        pass
+
+    def close(self):
+        """Release resources held by this adaptor."""
+        pass
+
+
+class AsyncStorageAdaptor:
+    """Base class for asynchronous configuration adaptors.
+
+    The methods match those of StorageAdaptor, but are coroutines, so
+    that persistence never blocks the event loop."""
+
+    def __init__(self, server_id: str, url: str):
+        """Constructor.
+
+        :param server_id: Server instance identifier.
+        :param url: Configuration store URL."""
+
+        self._server_id = server_id
+        self._url = url
+        return
+
+    async def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
+        pass
+
+    async def load_staged(self) -> Optional[dict]:
+        """Load staged configuration."""
+        pass
+
+    async def load_saved(self, name: datetime.datetime,
+                         path: str = None) -> Optional[dict]:
+        """Load specified saved configuration.
+
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
+        pass
+
+    async def save_current(self,
+                           config: dict) -> Optional[datetime.datetime]:
+        """Save config as running.
+
+        :returns: Timestamp of the saved configuration, if known."""
+        pass
+
+    def load_saved_now(self, name: datetime.datetime) -> Optional[dict]:
+        """Load specified saved configuration, blocking until it is read.
+
+        :param name: Timestamp to load.
+
+        This is for callers which cannot await, such as lookups of
+        saved trees no longer held in memory."""
+        pass
+
+    async def save_staged(self, config: dict):
+        """Save config as staged."""
+        pass
+
+    async def list_saved(self, since: datetime.datetime = None,
+                         until: datetime.datetime = None, limit: int = None,
+                         before: datetime.datetime = None
+                         ) -> List[datetime.datetime]:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
+        pass
+
+    async def iter_saved(self, since: datetime.datetime = None,
+                         until: datetime.datetime = None,
+                         page_size: int = 1000
+                         ) -> AsyncIterator[datetime.datetime]:
+        """Generate timestamps of saved configurations, newest first.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param page_size: Number of timestamps to fetch at a time."""
+
+        before = None
+        while True:
+            page = await self.list_saved(since, until, page_size, before)
+            for name in page:
+                yield name
+            if len(page) < page_size:
+                return
+            before = page[-1]
+
+    async def archive(self, cutoff: datetime.datetime):
+        """Flag as archived all configurations older than timestamp.
+
+        :param cutoff: Cut-off timestamp."""
+        pass
+
+    async def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+        pass
+
+    async def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+        pass
+
+    async def reclaim(self):
+        """Release some of the space freed by deleted configurations."""
+        pass
+
+    async def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal.
+
+        :param records: List of (sequence number, record) pairs."""
+        pass
+
+    async def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs."""
+        pass
+
+    def load_journal_now(self) -> List[Tuple[int, list]]:
+        """Return the change journal, blocking until it is read."""
+        pass
+
+    async def compact_journal(self, config: Optional[dict],
+                              seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
+
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration, if known."""
+        pass
+
+    async def history(self, path: str, since: datetime.datetime = None,
+                      until: datetime.datetime = None) -> List[HistoryEntry]:
+        """Return the changes to a property's saved value.
+
+        :param path: '/'-separated path of the property.
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return.
+        :returns: List of changes, oldest first."""
+        pass
+
+    async def close(self):
+        """Release resources held by this adaptor."""
+        pass
+
+
+class ExecutorStorageAdaptor(AsyncStorageAdaptor):
+    """Asynchronous adaptor running a synchronous adaptor on its own thread.
+
+    The synchronous adaptor is created, and all its methods are called,
+    on a dedicated thread, so that both I/O and encoding happen off the
+    event loop, and adaptors need not be thread-safe."""
+
+    def __init__(self, server_id: str, url: str, cls):
+        """Constructor.
+
+        :param server_id: Server instance identifier.
+        :param url: Configuration store URL.
+        :param cls: Synchronous StorageAdaptor class."""
+
+        super().__init__(server_id, url)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="aioconfig-storage")
+        self._adaptor = self._executor.submit(cls, server_id, url).result()
+        return
+
+    def get_adaptor(self) -> StorageAdaptor:
+        """Return the wrapped synchronous adaptor."""
+        return self._adaptor
+
+    async def load_current(self, path: str = None) -> Optional[dict]:
+        """Load current (latest) saved configuration.
+
+        :param path: If set, '/'-separated path of the subtree to load."""
+        return await self._call(self._adaptor.load_current, path)
+
+    async def load_staged(self) -> Optional[dict]:
+        """Load staged configuration."""
+        return await self._call(self._adaptor.load_staged)
+
+    async def load_saved(self, name: datetime.datetime,
+                         path: str = None) -> Optional[dict]:
+        """Load specified saved configuration.
+
+        :param name: Timestamp to load.
+        :param path: If set, '/'-separated path of the subtree to load."""
+        return await self._call(self._adaptor.load_saved, name, path)
+
+    async def save_current(self,
+                           config: dict) -> Optional[datetime.datetime]:
+        """Save config as running.
+
+        :returns: Timestamp of the saved configuration, if known."""
+        return await self._call(self._adaptor.save_current, config)
+
+    def load_saved_now(self, name: datetime.datetime) -> Optional[dict]:
+        """Load specified saved configuration, blocking until it is read.
+
+        :param name: Timestamp to load."""
+        return self._executor.submit(self._adaptor.load_saved, name).result()
+
+    async def save_staged(self, config: dict):
+        """Save config as staged."""
+        return await self._call(self._adaptor.save_staged, config)
+
+    async def list_saved(self, since: datetime.datetime = None,
+                         until: datetime.datetime = None, limit: int = None,
+                         before: datetime.datetime = None
+                         ) -> List[datetime.datetime]:
+        """List timestamps of saved (un-archived) configurations.
+
+        :param since: If set, the earliest timestamp to list.
+        :param until: If set, the latest timestamp to list.
+        :param limit: If set, the maximum number of timestamps to list.
+        :param before: If set, list only older timestamps: pass the
+          last timestamp of the previous page to get the next page.
+        :returns: List of timestamps, newest first."""
+        return await self._call(self._adaptor.list_saved, since, until,
+                                limit, before)
+
+    async def archive(self, cutoff: datetime.datetime):
+        """Flag as archived all configurations older than timestamp.
+
+        :param cutoff: Cut-off timestamp."""
+        return await self._call(self._adaptor.archive, cutoff)
+
+    async def delete_saved(self, names: List[datetime.datetime]):
+        """Delete saved configurations.
+
+        :param names: Timestamps of the configurations to delete."""
+        return await self._call(self._adaptor.delete_saved, names)
+
+    async def purge_archived(self, limit: int) -> int:
+        """Delete archived configurations, oldest first.
+
+        :param limit: Maximum number of configurations to delete.
+        :returns: Number of configurations deleted."""
+        return await self._call(self._adaptor.purge_archived, limit)
+
+    async def reclaim(self):
+        """Release some of the space freed by deleted configurations."""
+        return await self._call(self._adaptor.reclaim)
+
+    async def append_journal(self, records: List[Tuple[int, list]]):
+        """Append records to the change journal.
+
+        :param records: List of (sequence number, record) pairs."""
+        return await self._call(self._adaptor.append_journal, records)
+
+    async def load_journal(self) -> List[Tuple[int, list]]:
+        """Return the change journal, as (sequence number, record) pairs."""
+        return await self._call(self._adaptor.load_journal)
+
+    def load_journal_now(self) -> List[Tuple[int, list]]:
+        """Return the change journal, blocking until it is read."""
+        return self._executor.submit(self._adaptor.load_journal).result()
+
+    async def compact_journal(self, config: Optional[dict],
+                              seq: int) -> Optional[datetime.datetime]:
+        """Save config as running, and discard the journal it includes.
+
+        :param config: Configuration to save, or None if the latest
+          saved configuration already includes the journal.
+        :param seq: Sequence number of the last journal record included
+          in the configuration.
+        :returns: Timestamp of the saved configuration, if known."""
+        return await self._call(self._adaptor.compact_journal, config, seq)
+
+    async def history(self, path: str, since: datetime.datetime = None,
+                      until: datetime.datetime = None) -> List[HistoryEntry]:
+        """Return the changes to a property's saved value.
+
+        :param path: '/'-separated path of the property.
+        :param since: If set, the earliest change to return.
+        :param until: If set, the latest change to return.
+        :returns: List of changes, oldest first."""
+        return await self._call(self._adaptor.history, path, since, until)
+
+    async def close(self):
+        """Close the wrapped adaptor, and stop its thread."""
+        await self._call(self._adaptor.close)
+        self._executor.shutdown()
+        return
+
+    async def _call(self, func, *args):
+        """(Internal) Call an adaptor method on the adaptor's thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+
+def split_storage_path(path: str) -> List[str]:
+    """Split a subtree path into its elements.
+
+    :param path: '/'-separated path, relative to the configuration root."""
+
+    return [name for name in path.split('/') if name]
+
+
+def select_subtree(config, path: Optional[str]):
+    """Return a subtree of an exported configuration.
+
+    :param config: Exported configuration.
+    :param path: '/'-separated path of the subtree, or None for all.
+    :returns: The subtree, or None if there's nothing at that path.
+
+    This is used by adaptors which can't load part of a configuration
+    directly; list elements are selected by their index."""
+
+    if path is None:
+        return config
+
+    for name in split_storage_path(path):
+        if isinstance(config, dict):
+            config = config.get(name)
+        elif isinstance(config, list) and name.isdigit() and \
+                int(name) < len(config):
+            config = config[int(name)]
+        else:
+            return None
+    return config
+
+
+def make_delta(old: dict, new: dict) -> dict:
+    """Return a delta which turns one configuration into another.
+
+    :param old: Original configuration.
+    :param new: Changed configuration.
+    :returns: Delta, which is empty if the configurations are equal.
+
+    The delta is a JSON-encodable dict.  Its 'del' member lists removed
+    keys, 'set' maps keys to new or replaced values, and 'sub' maps keys
+    whose values are both dicts to a delta of those values."""
+
+    delta = {}
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta['del'] = removed
+
+    for key, value in new.items():
+        if key not in old:
+            delta.setdefault('set', {})[key] = value
+            continue
+
+        previous = old[key]
+        if isinstance(previous, dict) and isinstance(value, dict):
+            sub = make_delta(previous, value)
+            if sub:
+                delta.setdefault('sub', {})[key] = sub
+        elif type(previous) is not type(value) or previous != value:
+            delta.setdefault('set', {})[key] = value
+
+    return delta
+
+
+def apply_delta(config: dict, delta: dict) -> dict:
+    """Apply a delta to a configuration, in place.
+
+    :param config: Configuration to be changed.
+    :param delta: Delta, as returned by make_delta().
+    :returns: The changed configuration."""
+
+    for key in delta.get('del', ()):
+        del config[key]
+    config.update(delta.get('set', {}))
+    for key, sub in delta.get('sub', {}).items():
+        apply_delta(config[key], sub)
+    return config
+
+
+class Codec:
+    """Base class for stored configuration encodings.
+
+    Adaptors record the name of the codec used alongside each stored
+    configuration, so that codecs can be changed without rewriting
+    configurations stored earlier."""
+
+    def encode(self, config: dict) -> Union[str, bytes]:
+        """Return the encoded form of a configuration (or delta).
+
+        :param config: JSON-encodable configuration."""
+        pass
+
+    def decode(self, data: Union[str, bytes, memoryview]) -> dict:
+        """Return the configuration (or delta) encoded as data.
+
+        :param data: Encoded configuration, as returned by encode(), or
+          a memoryview of it (eg. of a memory-mapped file)."""
+        pass
+
+
+class JsonCodec(Codec):
+    """JSON text, the original encoding."""
+
+    def encode(self, config: dict) -> str:
+        return json.dumps(config)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+class ZlibCodec(Codec):
+    """Compact JSON, compressed using zlib."""
+
+    # Compression level: higher levels are much slower to encode, but
+    # make little difference to the size of typical configurations.
+    LEVEL = 1
+
+    def encode(self, config: dict) -> bytes:
+        buf = json.dumps(config, separators=(',', ':')).encode()
+        return zlib.compress(buf, self.LEVEL)
+
+    def decode(self, data: bytes) -> dict:
+        return json.loads(zlib.decompress(data))
+
+
+class MsgpackCodec(Codec):
+    """MessagePack binary encoding (requires the msgpack package)."""
+
+    def encode(self, config: dict) -> bytes:
+        return msgpack.packb(config, use_bin_type=True)
+
+    def decode(self, data: bytes) -> dict:
+        return msgpack.unpackb(data, raw=False)
+
+
+def register_codec(name: str, cls):
+    """Register a stored configuration encoding.
+
+    :param name: Name recorded with configurations using this codec.
+    :param cls: Codec implementation class reference."""
+
+    if name in CODECS:
+        raise KeyError("Codec %s already registered" % name)
+
+    CODECS[name] = cls()
+    return
+
+
+def get_codec(name: str) -> Codec:
+    """Return a registered codec.
+
+    :param name: Codec name."""
+
+    codec = CODECS.get(name)
+    if codec is None:
+        raise KeyError("No implementation for codec %s" % name)
+    return codec
+
 
 def register_storage_adaptor(scheme: str, cls):
     """Register a configuration adaptor implementation.
@@ -103,3 +669,44 @@ def create_storage_adaptor(server_id: str, url: str) -> StorageAdaptor:
 
     config = cls(server_id, url)
     return config
+
+
+def register_async_storage_adaptor(scheme: str, cls):
+    """Register an asynchronous configuration adaptor implementation.
+
+    :param scheme: URL scheme for this adaptor.
+    :param cls: Adaptor implementation class reference.
+
+    Schemes without an asynchronous implementation use their
+    synchronous adaptor, wrapped by ExecutorStorageAdaptor."""
+
+    if scheme in ASYNC_STORAGE_ADAPTORS:
+        raise KeyError("Adaptor scheme %s already registered" % scheme)
+
+    ASYNC_STORAGE_ADAPTORS[scheme] = cls
+    return
+
+
+def create_async_storage_adaptor(server_id: str,
+                                 url: str) -> AsyncStorageAdaptor:
+    """Create an asynchronous storage adaptor instance.
+
+    :param server_id: Server instance identifier.
+    :param url: Configuration store URL."""
+
+    scheme = url[:url.find(':')]
+    cls = ASYNC_STORAGE_ADAPTORS.get(scheme)
+    if cls is not None:
+        return cls(server_id, url)
+
+    cls = STORAGE_ADAPTORS.get(scheme)
+    if cls is None:
+        raise KeyError("No implementation for scheme %s" % scheme)
+
+    return ExecutorStorageAdaptor(server_id, url, cls)
+
+
+register_codec("json", JsonCodec)
+register_codec("zlib", ZlibCodec)
+if msgpack is not None:
+    register_codec("msgpack", MsgpackCodec)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+########################################################################
+# aioconfig
+# Copyright (C) 2019, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+########################################################################
+
+import time
+from typing import Dict
+
+from .core import NodeType, PathType, TreeListener
+
+
+class _Entry:
+    """(Internal) Versions of one subtree, and of its unchanged children."""
+
+    __slots__ = ('version', 'base', 'children')
+
+    def __init__(self, version: int, base: int):
+        self.version = version
+        self.base = base
+        self.children: Dict[str, '_Entry'] = {}
+        return
+
+
+class SubtreeVersions(TreeListener):
+    """Listener keeping a version number for every subtree of a tree.
+
+    A change to a node gives it, and each of its ancestors, a new
+    version.  Versions are kept in a trie holding only the paths that
+    have changed: a subtree not in the trie has the 'base' version of
+    its nearest ancestor that is, which changes only when that
+    ancestor's subtree is replaced (its node added, removed, or
+    renumbered).  So looking up or bumping a version costs one step
+    per path element, however large the tree.  A removed subtree's
+    entries are dropped: its path has no version until it is added
+    again, so callers should check that the path exists.
+
+    Tags combine the version with the time this listener was created,
+    so they are not reused by another process."""
+
+    def __init__(self):
+        """Constructor."""
+
+        self._root = _Entry(0, 0)
+        self._serial = 0
+        self._epoch = "%x" % time.time_ns()
+        return
+
+    def get_version(self, path: PathType) -> int:
+        """Return the version of a subtree.
+
+        :param path: Path of the subtree's root."""
+
+        entry = self._root
+        for name in path:
+            child = entry.children.get(name)
+            if child is None:
+                return entry.base
+            entry = child
+        return entry.version
+
+    def get_tag(self, path: PathType) -> str:
+        """Return an opaque tag which changes when a subtree changes.
+
+        :param path: Path of the subtree's root."""
+
+        return "%s-%x" % (self._epoch, self.get_version(path))
+
+    def node_added(self, path: PathType, node: NodeType):
+        self._replace(path)
+        return
+
+    def node_removed(self, path: PathType, node: NodeType):
+        self._bump(path[:-1]).children.pop(path[-1], None)
+        return
+
+    def children_moved(self, path: PathType, node: NodeType):
+        self._replace(path)
+        return
+
+    def value_changed(self, path: PathType, node: NodeType):
+        self._bump(path)
+        return
+
+    def _bump(self, path: PathType) -> _Entry:
+        """(Internal) Give a node and its ancestors a new version.
+
+        :returns: The node's trie entry."""
+
+        self._serial += 1
+        entry = self._root
+        entry.version = self._serial
+        for name in path:
+            child = entry.children.get(name)
+            if child is None:
+                child = entry.children[name] = _Entry(0, entry.base)
+            child.version = self._serial
+            entry = child
+        return entry
+
+    def _replace(self, path: PathType):
+        """(Internal) Give a subtree, and all its descendants, a new version."""
+
+        entry = self._bump(path)
+        entry.base = self._serial
+        entry.children = {}
+        return
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+"""Compare stored configuration codecs.
+
+For generated configurations of about 10k, 100k and 1M nodes, reports
+the encoded size, encode and decode throughput (in nodes per second),
+and the size of an SQLite database holding one saved configuration,
+for each registered codec."""
+
+import os
+import sys
+import tempfile
+import time
+
+from aioconfig import create_storage_adaptor
+from aioconfig.storage import CODECS
+
+
+def generate(sessions, properties):
+    """Return a configuration with sessions x properties values."""
+
+    return {"sessions": {"session-%u" % s: {"prop%u" % p:
+                                            (p if p % 3 else "value-%u" % s)
+                                            for p in range(properties)}
+                         for s in range(sessions)}}
+
+
+def timed(func, *args):
+    """Return the result of a call, and its duration in seconds."""
+
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    shapes = ((1000, 9), (10000, 9), (100000, 9))
+    with tempfile.TemporaryDirectory() as directory:
+        for sessions, properties in shapes:
+            nodes = sessions * (properties + 1)
+            config = generate(sessions, properties)
+            print("%u nodes" % nodes)
+
+            for name, codec in sorted(CODECS.items()):
+                data, encode = timed(codec.encode, config)
+                result, decode = timed(codec.decode, data)
+                assert result == config
+
+                path = os.path.join(directory, "%s-%u.db" % (name, nodes))
+                store = create_storage_adaptor(
+                    "bench", "sqlite3://%s?codec=%s" % (path, name))
+                store.save_current(config)
+                store.close()
+
+                print("  %-8s %11u B %11u B db %9.0f knodes/s encode "
+                      "%9.0f knodes/s decode" %
+                      (name, len(data), os.path.getsize(path),
+                       nodes / encode / 1e3, nodes / decode / 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
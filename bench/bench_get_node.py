@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+"""Compare indexed Manager.get_node lookups with a walk of the tree."""
+
+import sys
+import timeit
+
+from aioconfig import Manager, Object, Property
+
+
+def walk(root, name):
+    """Resolve a path by walking the tree, one element at a time."""
+
+    names = name.split('/')
+
+    current = root
+    while names:
+        current = current.get_child(names[0])
+        if not current:
+            raise NameError("Lookup failed: %s" % names[0])
+        names.pop(0)
+
+    return current
+
+
+def build(manager, depth, fanout):
+    """Populate running config with nested objects; return leaf paths."""
+
+    paths = []
+    parent = manager.get_node('config/running')
+    path = 'config/running'
+    for level in range(depth):
+        for n in range(fanout):
+            parent.add_child(Property("p%u" % n))
+            paths.append("%s/p%u" % (path, n))
+        parent = parent.add_child(Object("o%u" % level))
+        path = "%s/o%u" % (path, level)
+    return paths
+
+
+def main():
+    number = 100000
+    for depth in (2, 8, 32, 128):
+        manager = Manager()
+        paths = build(manager, depth, 4)
+        deepest = paths[-1]
+        root = manager.get_node('')
+
+        walked = timeit.timeit(lambda: walk(root, deepest), number=number)
+        indexed = timeit.timeit(lambda: manager.get_node(deepest), number=number)
+        print("depth %4u: walk %8.3f us, index %8.3f us, speedup %6.1fx" %
+              (depth, walked * 1e6 / number, indexed * 1e6 / number,
+               walked / indexed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
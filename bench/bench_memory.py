@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+"""Measure memory used per node for configuration trees of various shapes."""
+
+import gc
+import sys
+import tracemalloc
+
+from aioconfig import List, Manager, Object, Value
+
+
+def build(parent, sessions, properties):
+    """Populate a tree of sessions; return the number of nodes created."""
+
+    container = parent.add_child(Object("sessions"))
+    for s in range(sessions):
+        session = container.add_child(Object("session-%u" % s))
+        for p in range(properties):
+            # Names built at runtime, as they would be when loaded.
+            session.add_child(Value("".join(["prop", str(p)]), None, p))
+        session.add_child(List("peers", session))
+    return 1 + sessions * (properties + 2)
+
+
+def measure(sessions, properties):
+    """Return bytes allocated per node for a freshly built tree."""
+
+    manager = Manager()
+    running = manager.get_node('config/running')
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = build(running, sessions, properties)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / nodes
+
+
+def main():
+    for sessions, properties in ((10000, 0), (10000, 2), (10000, 10),
+                                 (1000, 100)):
+        print("%6u sessions x %3u properties: %7.1f bytes/node" %
+              (sessions, properties, measure(sessions, properties)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+"""Compare full and deduplicated snapshot storage in the SQLite adaptor.
+
+Simulates saving on a timer: a generated configuration is saved
+repeatedly, and only some saves follow a change to one session.
+Reports database size, and save and load latency."""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aioconfig import create_storage_adaptor
+
+
+def generate(sections, sessions, properties):
+    """Return a configuration with several sections of sessions."""
+
+    return {"server": {"name": "bench", "port": 443},
+            "sections": {"section-%u" % n:
+                         {"session-%u" % s: {"prop%u" % p: p
+                                             for p in range(properties)}
+                          for s in range(sessions)}
+                         for n in range(sections)}}
+
+
+def run(directory, mode, saves, changed):
+    """Save and load snapshots using one storage mode; return results."""
+
+    path = os.path.join(directory, "%s.db" % (mode or "full"))
+    url = "sqlite3://%s%s" % (path, "?" + mode if mode else "")
+    store = create_storage_adaptor("bench", url)
+
+    rng = random.Random(1)
+    config = generate(10, 100, 10)
+    start = time.perf_counter()
+    for n in range(saves):
+        if rng.random() < changed:
+            section = "section-%u" % rng.randrange(10)
+            session = "session-%u" % rng.randrange(100)
+            # Copy the changed path: saved configurations are retained.
+            sections = dict(config["sections"])
+            sections[section] = dict(sections[section])
+            sections[section][session] = dict(sections[section][session],
+                                              prop0=n)
+            config = dict(config, sections=sections)
+        store.save_current(config)
+        time.sleep(0.001)
+    save_time = (time.perf_counter() - start) / saves - 0.001
+
+    names = sorted(store.list_saved())
+    start = time.perf_counter()
+    for name in names[:10]:
+        store.load_saved(name)
+    load_time = (time.perf_counter() - start) / 10
+    store.close()
+
+    return os.path.getsize(path), save_time, load_time
+
+
+def main():
+    saves = 100
+    for changed in (0.0, 0.2, 1.0):
+        print("%u saves of 10 sections x 100 sessions x 10 properties, "
+              "%.0f%% changed" % (saves, changed * 100))
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ("", "delta=10", "dedup=1"):
+                size, save, load = run(directory, mode, saves, changed)
+                print("  %-9s %10u B db %8.2f ms/save %8.2f ms/load" %
+                      (mode or "full", size, save * 1e3, load * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
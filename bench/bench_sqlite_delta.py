@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+"""Compare full and delta-encoded snapshot storage in the SQLite adaptor.
+
+For each storage mode, a generated configuration is saved repeatedly,
+with a few values changed between saves.  Reports bytes written per
+save, final database size, and latency of loading the latest and the
+oldest snapshots."""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aioconfig import create_storage_adaptor
+
+
+def generate(sessions, properties):
+    """Return a configuration with the given shape."""
+
+    return {"server": {"name": "bench", "port": 443},
+            "sessions": {"session-%u" % s: {"prop%u" % p: p
+                                            for p in range(properties)}
+                         for s in range(sessions)}}
+
+
+def run(directory, mode, saves, sessions, properties):
+    """Save and load snapshots using one storage mode; return results."""
+
+    path = os.path.join(directory, "%s-%u-%u.db" %
+                        (mode.replace("=", "-") or "full", sessions,
+                         properties))
+    url = "sqlite3://%s%s" % (path, "?" + mode if mode else "")
+    store = create_storage_adaptor("bench", url)
+
+    rng = random.Random(1)
+    written = 0
+    start = time.perf_counter()
+    for n in range(saves):
+        config = generate(sessions, properties)
+        for _ in range(5):
+            session = "session-%u" % rng.randrange(sessions)
+            config["sessions"][session]["prop0"] = rng.random()
+
+        store.save_current(config)
+        written += len(store._connection.execute(
+            "select settings from config order by saved desc limit 1"
+        ).fetchone()[0])
+        time.sleep(0.001)
+    save_time = (time.perf_counter() - start) / saves
+
+    names = sorted(store.list_saved())
+    start = time.perf_counter()
+    store.load_current()
+    latest = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert store.load_saved(names[0]) is not None
+    oldest = time.perf_counter() - start
+    store.close()
+
+    return (written / saves, os.path.getsize(path), save_time, latest, oldest)
+
+
+def main():
+    saves = 50
+    with tempfile.TemporaryDirectory() as directory:
+        for sessions, properties in ((100, 10), (1000, 10), (1000, 100)):
+            print("%u sessions x %u properties, %u saves" %
+                  (sessions, properties, saves))
+            for mode in ("", "delta=10", "delta=50"):
+                written, size, save, latest, oldest = \
+                    run(directory, mode, saves, sessions, properties)
+                print("  %-9s %10.0f B/save %10u B db %8.2f ms/save "
+                      "%8.2f ms latest %8.2f ms oldest" %
+                      (mode or "full", written, size, save * 1e3,
+                       latest * 1e3, oldest * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+"""Measure SQLite save throughput with and without group commit.
+
+Saves a small configuration repeatedly: first one at a time through the
+synchronous adaptor (one transaction per save), then by many concurrent
+callers of the asynchronous adaptor, whose queued saves share
+transactions.  Reports saves per second, and the number of
+transactions used."""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aioconfig import create_storage_adaptor
+from aioconfig.storage import create_async_storage_adaptor
+
+
+CONFIG = {"server": {"name": "bench", "port": 443},
+          "sessions": {"session-%u" % s: {"port": 8000 + s}
+                       for s in range(20)}}
+
+
+def sequential(url, saves):
+    """Save one at a time; return (seconds, transactions)."""
+
+    store = create_storage_adaptor("bench", url)
+    start = time.perf_counter()
+    for _ in range(saves):
+        store.save_current(CONFIG)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, saves
+
+
+async def concurrent(url, saves, callers):
+    """Save from concurrent callers; return (seconds, transactions)."""
+
+    store = create_async_storage_adaptor("bench", url)
+    adaptor = store.get_adaptor()
+    write_batch = adaptor.write_batch
+    batches = []
+    adaptor.write_batch = lambda writes: \
+        (batches.append(len(writes)), write_batch(writes))[1]
+
+    async def caller():
+        for _ in range(saves // callers):
+            await store.save_current(CONFIG)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+    await store.close()
+    return elapsed, len(batches)
+
+
+def main():
+    saves = 1000
+    with tempfile.TemporaryDirectory() as directory:
+        url = "sqlite3://%s" % os.path.join(directory, "sequential.db")
+        elapsed, transactions = sequential(url, saves)
+        print("sequential      %8.0f saves/s %6u transactions" %
+              (saves / elapsed, transactions))
+
+        for callers in (1, 10, 100):
+            url = "sqlite3://%s" % os.path.join(directory,
+                                                "group-%u.db" % callers)
+            loop = asyncio.new_event_loop()
+            elapsed, transactions = loop.run_until_complete(
+                concurrent(url, saves, callers))
+            loop.close()
+            print("%3u callers     %8.0f saves/s %6u transactions" %
+                  (callers, saves / elapsed, transactions))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#! /usr/bin/env python
+"""Compare loading a subtree from the SQLite blob and path schemas.
+
+Saves a few snapshots of a generated configuration using each schema,
+then reports save time, database size, and the latency of loading the
+oldest snapshot in full and of loading one session from it."""
+
+import os
+import sys
+import tempfile
+import time
+
+from aioconfig import create_storage_adaptor
+
+
+def generate(sessions, properties):
+    """Return a configuration with the given shape."""
+
+    return {"server": {"name": "bench", "port": 443},
+            "sessions": {"session-%u" % s: {"prop%u" % p: p
+                                            for p in range(properties)}
+                         for s in range(sessions)}}
+
+
+def timed(func, *args):
+    """Return the duration of a call, in milliseconds."""
+
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    saves = 3
+    with tempfile.TemporaryDirectory() as directory:
+        for sessions, properties in ((1000, 10), (10000, 10), (10000, 100)):
+            config = generate(sessions, properties)
+            print("%u sessions x %u properties, %u saves" %
+                  (sessions, properties, saves))
+
+            for scheme in ("sqlite3", "sqlite3+paths"):
+                path = os.path.join(directory, "%s-%u-%u.db" %
+                                    (scheme, sessions, properties))
+                store = create_storage_adaptor("bench",
+                                               "%s://%s" % (scheme, path))
+                save = sum(timed(store.save_current, config)
+                           for _ in range(saves)) / saves
+                oldest = min(store.list_saved())
+                full = timed(store.load_saved, oldest)
+                subtree = timed(store.load_saved, oldest,
+                                "sessions/session-%u" % (sessions // 2))
+                store.close()
+
+                print("  %-14s %9.1f ms/save %11u B db %9.1f ms full "
+                      "%9.2f ms session" %
+                      (scheme, save, os.path.getsize(path), full, subtree))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+"""Benchmark storage adaptors.
+
+Runs the same workload against each storage URL given (by default, one
+store per registered scheme, in a temporary directory): saves a series
+of generated configurations, each changing a few values of the last,
+then loads them back, lists them in pages of 10, 100 and 1000
+timestamps, and archives and purges half of them.  Reports save and
+load throughput, listing time, archive and purge time, and the bytes on
+disk per saved configuration, as JSON."""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from aioconfig import create_storage_adaptor
+from aioconfig.storage import STORAGE_ADAPTORS
+
+
+def generate(sections, sessions, properties):
+    """Return a configuration of sections x sessions x properties values."""
+
+    return {"section-%u" % c: {"session-%u" % s: {"prop%u" % p:
+                                                  (p if p % 3 else
+                                                   "value-%u" % s)
+                                                  for p in range(properties)}
+                               for s in range(sessions)}
+            for c in range(sections)}
+
+
+def change(config, changed, rng):
+    """Return a copy of config, with some of its values changed."""
+
+    config = json.loads(json.dumps(config))
+    for _ in range(changed):
+        section = config[rng.choice(sorted(config))]
+        session = section[rng.choice(sorted(section))]
+        session[rng.choice(sorted(session))] = rng.randrange(1 << 30)
+    return config
+
+
+def timed(func, *args):
+    """Return the result of a call, and its duration in seconds."""
+
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def disk_usage(url):
+    """Return the bytes used by the store at url."""
+
+    path = urlsplit(url).netloc + urlsplit(url).path
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(directory, name))
+                   for directory, _, names in os.walk(path)
+                   for name in names)
+    return sum(os.path.getsize(path + suffix)
+               for suffix in ("", "-wal")
+               if os.path.exists(path + suffix))
+
+
+def bench(url, args):
+    """Run the workload against url; return a dictionary of results."""
+
+    rng = random.Random(1)
+    config = generate(args.sections, args.sessions, args.properties)
+    nodes = args.sections * args.sessions * (args.properties + 1)
+    configs = [config]
+    for _ in range(args.saves - 1):
+        configs.append(change(configs[-1], args.changed, rng))
+
+    store = create_storage_adaptor("bench", url)
+    start = time.perf_counter()
+    for config in configs:
+        store.save_current(config)
+    save = time.perf_counter() - start
+    size = disk_usage(url)
+
+    names = store.list_saved(limit=args.saves)
+    start = time.perf_counter()
+    for name in names[:args.loads]:
+        store.load_saved(name)
+    load = time.perf_counter() - start
+    loads = len(names[:args.loads])
+
+    listing = {}
+    for limit in (10, 100, 1000):
+        _, elapsed = timed(store.list_saved, None, None, limit)
+        listing[str(limit)] = elapsed
+
+    _, archive = timed(store.archive, names[len(names) // 2])
+    purged, purge = timed(store.purge_archived, len(names))
+    _, reclaim = timed(store.reclaim)
+    store.close()
+
+    return {"url": url,
+            "nodes": nodes,
+            "saves": args.saves,
+            "save_per_s": args.saves / save,
+            "load_per_s": loads / load if load else None,
+            "list_s": listing,
+            "archive_s": archive,
+            "purge_s": purge,
+            "purged": purged,
+            "reclaim_s": reclaim,
+            "bytes": size,
+            "bytes_per_save": size / args.saves}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", action="append", default=[],
+                        help="storage URL (repeatable; default: one "
+                             "temporary store per registered scheme)")
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--properties", type=int, default=9)
+    parser.add_argument("--saves", type=int, default=100,
+                        help="number of configurations to save")
+    parser.add_argument("--changed", type=int, default=10,
+                        help="values changed between saves")
+    parser.add_argument("--loads", type=int, default=20,
+                        help="number of saved configurations to load")
+    parser.add_argument("--output", "-o",
+                        help="write results to this file, not stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        urls = args.url or ["%s://%s" % (scheme, os.path.join(
+            directory, scheme.replace("+", "-")))
+                            for scheme in sorted(STORAGE_ADAPTORS)]
+        results = [bench(url, args) for url in urls]
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
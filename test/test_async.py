@@ -0,0 +1,121 @@
+
+import asyncio
+
+from aioconfig import Object, Property, Value, Manager
+
+
+class SlowProperty(Property):
+
+    active = 0
+    peak = 0
+
+    def __init__(self, name, parent, value):
+        super().__init__(name, parent)
+        self._value = value
+        self.sets = 0
+        return
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+        return value
+
+    async def aget(self):
+        SlowProperty.active += 1
+        SlowProperty.peak = max(SlowProperty.peak, SlowProperty.active)
+        await asyncio.sleep(0.01)
+        SlowProperty.active -= 1
+        return self._value
+
+    async def aset(self, value):
+        await asyncio.sleep(0.01)
+        self.sets += 1
+        return self.set(value)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def populate(m, count):
+    running = m.get_node('config/running')
+    sessions = running.add_child(Object("sessions"))
+    for n in range(count):
+        sessions.add_child(SlowProperty("s%u" % n, sessions, n))
+    running.add_child(Value("plain", running, "x"))
+    return sessions
+
+
+def test_asnapshot_bounded():
+    SlowProperty.peak = 0
+    m = Manager()
+    populate(m, 50)
+
+    copy = run(m.asnapshot('config/running', 'copy', concurrency=8))
+    assert SlowProperty.peak == 8
+    assert copy.get_child("sessions").get_child("s7").get() == 7
+    assert copy.get_child("plain").get() == "x"
+    assert copy.digest() == m.get_node('config/running').digest()
+
+
+def test_asave_running():
+    m = Manager()
+    populate(m, 5)
+    path = run(m.asave_running())
+    assert m.identical(path, 'config/running')
+
+
+def test_adeploy_staged():
+    m = Manager()
+    sessions = populate(m, 10)
+    m.save_to_staged()
+    m.get_node('config/staged/sessions/s3').set(30)
+
+    summary = run(m.adeploy_staged(concurrency=4))
+    assert summary['changed'] == ['sessions/s3']
+    assert sessions.get_child("s3").get() == 30
+    assert sum(node.sets for node in sessions.values()) == 1
+
+
+def test_failed_save_raised_once(tmp_path):
+
+    async def exercise():
+        m = Manager()
+        m.set_config("s1", "sqlite3://%s" % (tmp_path / "t.db"))
+        populate(m, 3)
+        store = m._store
+        closed = []
+
+        async def fail(config):
+            raise OSError("disk full")
+
+        async def close():
+            closed.append(True)
+
+        saves = []
+        store.save_current = fail
+        m.save_running()
+        try:
+            await m.flush()
+        except OSError:
+            saves.append("failed")
+        await m.flush()
+
+        m.save_running()
+        real_close, store.close = store.close, close
+        try:
+            await m.stop()
+        except OSError:
+            saves.append("failed")
+        await real_close()
+        return saves, closed
+
+    saves, closed = run(exercise())
+    assert saves == ["failed", "failed"]
+    assert closed == [True]
@@ -0,0 +1,199 @@
+
+import asyncio
+import time
+
+from aioconfig import create_storage_adaptor
+from aioconfig.storage import STORAGE_ADAPTORS, create_async_storage_adaptor
+
+
+# Store location for each registered scheme, relative to a temporary
+# directory.  A newly registered adaptor must add its scheme here.
+LOCATIONS = {"sqlite": "t.db",
+             "sqlite3": "t.db",
+             "sqlite+paths": "t.db",
+             "sqlite3+paths": "t.db",
+             "file": "files"}
+
+CONFIG = {"server": {"p1": 1, "p2": "two", "p3": 2.5, "p4": None,
+                     "p5": True, "p6": False, "p7": -3},
+          "sessions": [{"port": 8000 + n, "tags": ["a", "b"]}
+                       for n in range(5)],
+          "unicode": {"ключ": "значение", "キー": "\u2603"},
+          "empty": {"list": [], "dict": {}, "string": ""}}
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def urls(tmp_path):
+    """Generate a URL for an empty store, for each registered scheme."""
+
+    for scheme in sorted(STORAGE_ADAPTORS):
+        directory = tmp_path / scheme.replace("+", "-")
+        directory.mkdir()
+        yield "%s://%s" % (scheme, directory / LOCATIONS[scheme])
+
+
+def save(store, config):
+    """Save a configuration, with a timestamp distinct from the last."""
+
+    time.sleep(0.002)
+    store.save_current(config)
+    return
+
+
+def test_all_schemes_covered():
+    assert sorted(STORAGE_ADAPTORS) == sorted(LOCATIONS)
+
+
+def test_round_trip(tmp_path):
+    for url in urls(tmp_path):
+        store = create_storage_adaptor("s/1 é", url)
+        assert store.load_current() is None
+        assert store.load_staged() is None
+        assert store.list_saved() == []
+
+        save(store, CONFIG)
+        store.save_staged({"staged": ["ü", 1]})
+        assert store.load_current() == CONFIG, url
+        assert list(store.load_current()["server"]) == \
+            list(CONFIG["server"]), url
+        assert store.load_staged() == {"staged": ["ü", 1]}, url
+
+        names = store.list_saved()
+        assert len(names) == 1
+        assert store.load_saved(names[0]) == CONFIG
+        store.close()
+
+        # Everything persists, and other servers' configurations are
+        # separate.
+        store = create_storage_adaptor("s/1 é", url)
+        assert store.load_current() == CONFIG, url
+        assert store.load_staged() == {"staged": ["ü", 1]}, url
+        assert store.list_saved() == names
+        store.close()
+
+        store = create_storage_adaptor("s2", url)
+        assert store.load_current() is None, url
+        store.close()
+
+
+def test_subtree(tmp_path):
+    for url in urls(tmp_path):
+        store = create_storage_adaptor("s1", url)
+        save(store, CONFIG)
+        save(store, {"other": 1})
+        assert store.load_current("other") == 1, url
+        assert store.load_current("/") == {"other": 1}, url
+
+        name = store.list_saved()[-1]
+        assert store.load_saved(name, "server") == CONFIG["server"], url
+        assert store.load_saved(name, "/server/p2") == "two", url
+        assert store.load_saved(name, "sessions/3/port") == 8003, url
+        assert store.load_saved(name, "unicode/ключ") == "значение", url
+        assert store.load_saved(name, "empty/list") == [], url
+        assert store.load_saved(name, "server/none") is None, url
+        assert store.load_saved(name, "sessions/9") is None, url
+        store.close()
+
+
+def test_list_saved(tmp_path):
+    for url in urls(tmp_path):
+        store = create_storage_adaptor("s1", url)
+        for n in range(12):
+            save(store, {"n": n})
+        store.save_staged({"staged": True})
+
+        names = store.list_saved()
+        assert len(names) == 12 and names == sorted(names, reverse=True)
+        assert [store.load_saved(name) for name in names] == \
+            [{"n": n} for n in reversed(range(12))], url
+        assert store.list_saved(limit=5) == names[:5], url
+        assert store.list_saved(limit=5, before=names[4]) == names[5:10]
+        assert store.list_saved(since=names[3]) == names[:4], url
+        assert store.list_saved(until=names[8]) == names[8:], url
+        assert store.list_saved(since=names[6], until=names[2],
+                                limit=2) == names[2:4], url
+        assert list(store.iter_saved(page_size=5)) == names, url
+        store.close()
+
+
+def test_archive_purge(tmp_path):
+    for url in urls(tmp_path):
+        store = create_storage_adaptor("s1", url)
+        for n in range(6):
+            save(store, {"n": n})
+        store.save_staged({"staged": True})
+
+        names = store.list_saved()
+        store.archive(names[2])
+        assert store.list_saved() == names[:3], url
+        assert store.load_current() == {"n": 5}, url
+        assert store.load_staged() == {"staged": True}, url
+
+        assert store.purge_archived(2) == 2, url
+        assert store.purge_archived(10) == 1, url
+        assert store.purge_archived(10) == 0, url
+
+        store.delete_saved([names[1]])
+        store.reclaim()
+        assert store.list_saved() == [names[0], names[2]], url
+        assert store.load_saved(names[2]) == {"n": 3}, url
+        assert store.load_current() == {"n": 5}, url
+        assert store.load_staged() == {"staged": True}, url
+        store.close()
+
+        store = create_storage_adaptor("s1", url)
+        assert store.list_saved() == [names[0], names[2]], url
+        store.close()
+
+
+def test_journal(tmp_path):
+    for url in urls(tmp_path):
+        store = create_storage_adaptor("s1", url)
+        assert store.load_journal() == []
+        records = [(n, ["set", ["n"], n]) for n in range(1, 6)]
+        store.append_journal(records[:2])
+        store.append_journal(records[2:])
+        assert store.load_journal() == records, url
+        store.close()
+
+        store = create_storage_adaptor("s1", url)
+        assert store.load_journal() == records, url
+        store.compact_journal({"n": 3}, 3)
+        assert store.load_journal() == records[3:], url
+        assert store.load_current() == {"n": 3}, url
+        store.compact_journal(None, 5)
+        assert store.load_journal() == [], url
+        assert len(store.list_saved()) == 1, url
+        store.close()
+
+
+def test_async(tmp_path):
+    for url in urls(tmp_path):
+
+        async def exercise():
+            store = create_async_storage_adaptor("s1", url)
+            await asyncio.gather(*[store.save_current({"n": n})
+                                   for n in range(5)])
+            await store.save_staged({"staged": True})
+            await store.append_journal([(1, ["set", ["n"], 5])])
+            result = (await store.load_current(),
+                      await store.load_current("n"),
+                      await store.load_staged(),
+                      await store.list_saved(),
+                      [name async for name in store.iter_saved(page_size=2)],
+                      await store.load_journal())
+            await store.close()
+            return result
+
+        current, value, staged, names, pages, journal = run(exercise())
+        assert current == {"n": 4} and value == 4, url
+        assert staged == {"staged": True}, url
+        assert len(names) == 5 and pages == names, url
+        assert journal == [(1, ["set", ["n"], 5])], url
@@ -0,0 +1,109 @@
+
+from aioconfig import List, Object, Property, Value, Manager
+
+
+class LiveProperty(Property):
+
+    def __init__(self, name, parent, getter):
+        super().__init__(name, parent)
+        self._get = getter
+        return
+
+    def get(self):
+        return self._get()
+
+
+def populate(m):
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    server.add_child(Value("p1", server, 1))
+    server.add_child(Value("p2", server, "two"))
+    sessions = running.add_child(List("sessions", running))
+    sa = sessions.append_child(Object("sa"))
+    sa.add_child(Value("port", sa, 8000))
+    return running
+
+
+def test_save_shares_subtrees():
+    m = Manager()
+    running = populate(m)
+    saved = m.get_node(m.save_running())
+
+    assert saved._children is running._children
+    assert m.get_node('config/saved/%s/server/p1' % saved.get_name()).get() == 1
+
+
+def test_running_change_not_seen_by_saved():
+    m = Manager()
+    populate(m)
+    p1 = m.get_node('config/running/server/p1')
+    port = m.get_node('config/running/sessions/0/port')
+
+    path = m.save_running()
+    p1.set(10)
+    port.set(9000)
+    m.get_node('config/running/server').add_child(Value("p3", None, 3))
+
+    assert m.get_node(path + '/server/p1').get() == 1
+    assert m.get_node(path + '/sessions/0/port').get() == 8000
+    assert not m.get_node(path + '/server').has_child("p3")
+    assert m.get_node('config/running/server/p1') is p1
+    assert p1.get() == 10
+
+
+def test_copy_change_not_seen_by_source():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+    m.save_to_staged(path)
+
+    staged_p2 = m.get_node('config/staged/server/p2')
+    staged_p2.set("three")
+    m.get_node('config/staged/sessions').remove_child(0)
+
+    assert m.get_node(path + '/server/p2').get() == "two"
+    assert m.get_node('config/running/server/p2').get() == "two"
+    assert m.get_node(path + '/sessions/0/port').get() == 8000
+
+
+def test_live_properties_are_read():
+    m = Manager()
+    running = populate(m)
+    state = {"value": 5}
+    server = m.get_node('config/running/server')
+    server.add_child(LiveProperty("live", server, lambda: state["value"]))
+
+    path = m.save_running()
+    state["value"] = 6
+
+    assert m.get_node(path + '/server/live').get() == 5
+    assert m.get_node(path + '/sessions')._children is \
+        running.get_child("sessions")._children
+
+
+def test_copy_replaces_destination():
+    m = Manager()
+    populate(m)
+    m.save_to_staged()
+    m.save_to_staged()
+    assert m.get_node('config/staged/server/p1').get() == 1
+
+
+def test_empty_containers_independent():
+    a = Object("a")
+    b = Object("b")
+    a.add_child(Value("x"))
+    assert not b.has_child("x")
+    assert list(b.keys()) == []
+
+    c = List("c", None)
+    d = List("d", None)
+    c.append_child(Value("x"))
+    assert d.values() == []
+
+
+def test_live_subclass_attributes():
+    node = LiveProperty("live", None, lambda: 1)
+    node.extra = True
+    assert node.get() == 1
+    assert not hasattr(Value("v"), "__dict__")
@@ -0,0 +1,133 @@
+
+from aioconfig import List, Object, Property, Value, Manager
+
+
+class Service:
+
+    def __init__(self):
+        self.values = {"p1": 1, "p2": "two"}
+        self.sets = []
+        self.deleted = []
+        return
+
+
+class LiveProperty(Property):
+
+    def __init__(self, name, parent, service):
+        super().__init__(name, parent)
+        self._service = service
+        return
+
+    def get(self):
+        return self._service.values[self._name]
+
+    def set(self, value):
+        self._service.sets.append(self._name)
+        self._service.values[self._name] = value
+        return value
+
+    def delete(self):
+        self._service.deleted.append(self._name)
+        return
+
+
+def setup():
+    service = Service()
+    m = Manager()
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    server.add_child(LiveProperty("p1", server, service))
+    server.add_child(LiveProperty("p2", server, service))
+    sessions = running.add_child(List("sessions", running))
+    sa = sessions.append_child(Object("sa"))
+    sa.add_child(Value("port", sa, 8000))
+    return service, m
+
+
+def test_deploy_unchanged():
+    service, m = setup()
+    m.save_to_staged()
+
+    summary = m.deploy_staged()
+    assert summary == {'added': [], 'removed': [], 'changed': []}
+    assert service.sets == []
+
+
+def test_deploy_changes_only():
+    service, m = setup()
+    m.save_to_staged()
+
+    m.get_node('config/staged/server/p2').set("three")
+    m.get_node('config/staged/sessions/0/port').set(9000)
+
+    summary = m.deploy_staged()
+    assert summary['changed'] == ['server/p2', 'sessions/0/port']
+    assert service.sets == ['p2']
+    assert service.values['p2'] == "three"
+    assert m.get_node('config/running/sessions/0/port').get() == 9000
+    assert m.identical('config/staged', 'config/running')
+
+
+def test_deploy_adds_and_removes():
+    service, m = setup()
+    m.save_to_staged()
+
+    m.get_node('config/staged/server').remove_child("p1")
+    m.get_node('config/staged').add_child(Object("extra"))
+    m.get_node('config/staged/sessions').append_child(Object("sb"))
+
+    summary = m.deploy_staged()
+    assert summary['removed'] == ['server/p1']
+    assert sorted(summary['added']) == ['extra', 'sessions/1']
+    assert service.deleted == ['p1']
+    assert m.get_node('config/running/sessions/1').get_name() == "sb"
+    assert m.identical('config/staged', 'config/running')
+
+
+def test_batch():
+    service, m = setup()
+    result = m.batch([
+        {"op": "set", "path": "config/running/server/p2", "value": "three"},
+        {"op": "get", "path": "config/running/server"},
+        {"op": "create", "path": "config/running/sessions/1",
+         "value": {"port": 8001}},
+        {"op": "create", "path": "config/running/sessions/5", "value": 1},
+        {"op": "delete", "path": "config/running/server/p1"},
+        {"op": "get", "path": "config/running/server/p1"},
+        {"op": "set", "path": "config/running/server", "value": 1}])
+
+    assert result["applied"]
+    assert [sorted(r) for r in result["results"]] == \
+        [[], ["value"], [], ["error"], [], ["error"], ["error"]]
+    assert result["results"][1]["value"] == {"p1": 1, "p2": "three"}
+    assert service.sets == ["p2"] and service.deleted == ["p1"]
+    assert m.get_node('config/running/sessions/1/port').get() == 8001
+
+
+def test_batch_atomic():
+    service, m = setup()
+    m.save_to_staged()
+    before = m.get_node('config/staged').export()
+
+    operations = [
+        {"op": "set", "path": "config/staged/server/p1", "value": 5},
+        {"op": "create", "path": "config/staged/extra", "value": {"a": 1}},
+        {"op": "delete", "path": "config/staged/sessions"}]
+    result = m.batch(operations + [
+        {"op": "delete", "path": "config/staged/missing"},
+        {"op": "get", "path": "config/staged"}], atomic=True)
+    assert not result["applied"] and len(result["results"]) == 4
+    assert "error" in result["results"][3]
+    assert m.get_node('config/staged').export() == before
+
+    result = m.batch(operations, atomic=True)
+    assert result["applied"]
+    assert m.get_node('config/staged').export() == \
+        {"server": {"p1": 5, "p2": "two"}, "extra": {"a": 1}}
+
+    try:
+        m.batch([{"op": "get", "path": "config/running"}], atomic=True)
+    except ValueError:
+        pass
+    else:
+        assert False
@@ -0,0 +1,66 @@
+
+from aioconfig import List, Object, Value, Manager
+from aioconfig.diff import ADD, REMOVE, MODIFY
+
+
+def populate(m):
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    server.add_child(Value("p1", server, 1))
+    server.add_child(Value("p2", server, "two"))
+    sessions = running.add_child(List("sessions", running))
+    sa = sessions.append_child(Object("sa"))
+    sa.add_child(Value("port", sa, 8000))
+    return running
+
+
+def summarise(changes):
+    return [(c.action, '/'.join(c.path)) for c in changes]
+
+
+def test_diff_identical():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+    assert list(m.diff(path, 'config/running')) == []
+
+
+def test_diff_records():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+
+    m.get_node('config/running/server/p1').set(2)
+    m.get_node('config/running/server').remove_child("p2")
+    m.get_node('config/running/sessions').append_child(Object("sb"))
+
+    changes = list(m.diff(path, 'config/running'))
+    assert summarise(changes) == [(MODIFY, 'server/p1'),
+                                  (REMOVE, 'server/p2'),
+                                  (ADD, 'sessions/1')]
+    assert changes[0].old.get() == 1
+    assert changes[0].new.get() == 2
+    assert changes[2].new.get_name() == "sb"
+
+
+def test_diff_type_change():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+
+    running = m.get_node('config/running/server')
+    running.remove_child("p1")
+    running.add_child(Object("p1"))
+
+    assert summarise(m.diff(path, 'config/running')) == \
+        [(REMOVE, 'server/p1'), (ADD, 'server/p1')]
+
+
+def test_diff_is_lazy():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+    m.get_node('config/running/server/p1').set(2)
+
+    changes = m.diff(path, 'config/running')
+    assert next(changes).action == MODIFY
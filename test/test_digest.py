@@ -0,0 +1,69 @@
+
+from aioconfig import List, Object, Property, Value, Manager
+
+
+def populate(m):
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    server.add_child(Value("p1", server, 1))
+    sessions = running.add_child(List("sessions", running))
+    sa = sessions.append_child(Object("sa"))
+    sa.add_child(Value("port", sa, 8000))
+    return running
+
+
+def test_equal_contents_equal_digest():
+    a = populate(Manager())
+    b = populate(Manager())
+    assert a.digest() == b.digest()
+
+    b.get_child("server").get_child("p1").set(2)
+    assert a.digest() != b.digest()
+
+    b.get_child("server").get_child("p1").set(1)
+    assert a.digest() == b.digest()
+
+
+def test_digest_tracks_structure():
+    m = Manager()
+    running = populate(m)
+    before = running.digest()
+
+    server = m.get_node('config/running/server')
+    server.add_child(Value("p2", server, None))
+    assert running.digest() != before
+
+    server.remove_child("p2")
+    assert running.digest() == before
+
+    m.get_node('config/running/sessions').append_child(Object("sb"))
+    assert running.digest() != before
+
+
+def test_identical_after_save():
+    m = Manager()
+    populate(m)
+    path = m.save_running()
+    assert m.identical('config/running', path)
+    assert m.save_running(only_if_changed=True) == path
+
+    m.get_node('config/running/server/p1').set(5)
+    assert not m.identical('config/running', path)
+    assert m.save_running(only_if_changed=True) != path
+    assert m.get_node(path).digest() != m.get_node('config/running').digest()
+
+
+def test_live_property_digest():
+    state = {"value": 1}
+
+    class Live(Property):
+        def get(self):
+            return state["value"]
+
+    m = Manager()
+    running = populate(m)
+    running.add_child(Live("live"))
+    before = running.digest()
+
+    state["value"] = 2
+    assert running.digest() != before
@@ -0,0 +1,75 @@
+import asyncio
+
+from aioconfig import List, Object, Value
+from aioconfig.feed import ChangeFeed, RESYNC
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_feed_coalesces():
+
+    async def exercise():
+        root = Object("")
+        running = root.add_child(Object("running"))
+        port = running.add_child(Value("port", running, 80))
+        status = root.add_child(Object("status"))
+
+        feed = ChangeFeed(root, 0.01)
+        ports = feed.subscribe(["running/port"])
+        everything = feed.subscribe([""])
+
+        for n in range(100):
+            port.set(n)
+        status.add_child(Value("load", status, 1))
+        running.remove_child("port")
+        running.add_child(Value("port", running, 443))
+
+        batches = [await ports.get(), await everything.get()]
+        ports.close()
+        port.set(1)
+        batches.append(await everything.get())
+        feed.close()
+        batches.append(await everything.get())
+        return batches, root._listeners
+
+    batches, listeners = run(exercise())
+    assert batches[0] == [{"event": "add", "path": "running/port",
+                           "value": 443}]
+    assert batches[1] == [{"event": "add", "path": "status/load", "value": 1},
+                          {"event": "add", "path": "running/port",
+                           "value": 443}]
+    assert batches[2] == [{"event": "set", "path": "running/port",
+                           "value": 1}]
+    assert batches[3] is None and listeners is None
+
+
+def test_feed_resync():
+
+    async def exercise():
+        root = Object("")
+        sessions = root.add_child(List("sessions", root))
+        feed = ChangeFeed(root, 0.01, size=3)
+        subscriber = feed.subscribe(["sessions/3"])
+        for n in range(5):
+            sessions.append_child(Value("s", sessions, n))
+            feed.flush()
+        sessions.remove_child(0)
+        feed.flush()
+
+        batches = []
+        while not subscriber._queue.empty():
+            batches.append(await subscriber.get())
+        feed.close()
+        return batches, subscriber.get_resyncs()
+
+    batches, resyncs = run(exercise())
+    assert resyncs == 1
+    assert batches[0] == [{"event": RESYNC}]
+    assert batches[-1] == [{"event": "add", "path": "sessions",
+                            "value": [1, 2, 3, 4]}]
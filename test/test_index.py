@@ -0,0 +1,79 @@
+
+import pytest
+
+from aioconfig import List, Object, Property, Manager
+from aioconfig.index import split_path
+
+
+def test_split_path():
+    assert split_path('config/running/server') == ('config', 'running', 'server')
+    assert split_path('/config/running/') == ('config', 'running')
+    assert split_path('config.running.server') == ('config', 'running', 'server')
+    assert split_path('config/saved/2019-01-01T00:00:00.000001') == \
+        ('config', 'saved', '2019-01-01T00:00:00.000001')
+    assert split_path('') == ()
+
+
+def test_lookup_separators():
+    m = Manager()
+    running = m.get_node('config/running')
+    assert m.get_node('config.running') is running
+    assert m.get_node('') is m.get_node('/')
+
+
+def test_lookup_follows_changes():
+    m = Manager()
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    p1 = server.add_child(Property("p1"))
+    assert m.get_node('config/running/server/p1') is p1
+    assert p1.get_path() == ('config', 'running', 'server', 'p1')
+
+    running.remove_child("server")
+    with pytest.raises(NameError):
+        m.get_node('config/running/server/p1')
+
+    other = running.add_child(Object("server"))
+    assert m.get_node('config/running/server') is other
+
+
+def test_lookup_list():
+    m = Manager()
+    running = m.get_node('config/running')
+    sessions = running.add_child(List("sessions", running))
+    a = sessions.append_child(Object("a"))
+    b = sessions.append_child(Object("b"))
+    assert m.get_node('config/running/sessions/1') is b
+
+    c = Object("c")
+    sessions.insert_child(0, c)
+    assert m.get_node('config/running/sessions/0') is c
+    assert m.get_node('config/running/sessions/1') is a
+    assert m.get_node('config/running/sessions/2') is b
+    assert b.get_path() == ('config', 'running', 'sessions', '2')
+
+    sessions.remove_child(0)
+    assert m.get_node('config/running/sessions/0') is a
+    with pytest.raises(NameError):
+        m.get_node('config/running/sessions/2')
+
+
+def test_list_paths_after_changes():
+    m = Manager()
+    running = m.get_node('config/running')
+    sessions = running.add_child(List("sessions", running))
+    nodes = [sessions.append_child(Object("s")) for _ in range(5)]
+    assert [node.get_path()[-1] for node in nodes] == \
+        ['0', '1', '2', '3', '4']
+
+    sessions.remove_child(1)
+    sessions.insert_child(3, nodes[1])
+    assert [sessions.key_of(node) for node in nodes] == \
+        ['0', '3', '1', '2', '4']
+
+    # Children of a snapshot are replaced by private copies on access.
+    copy = running.snapshot('copy').get_child('sessions')
+    adopted = copy.get_child('2')
+    assert copy.key_of(adopted) == '2'
+    with pytest.raises(KeyError):
+        copy.key_of(nodes[3])
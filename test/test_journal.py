@@ -0,0 +1,110 @@
+
+import asyncio
+
+from aioconfig import List, Manager, Object, Value
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def open_manager(url, **kwargs):
+    m = Manager()
+    m.set_config("s1", url)
+    m.enable_journal(**kwargs)
+    await m.aload()
+    return m
+
+
+def change(m):
+    running = m.get_node('config/running')
+    server = running.add_child(Object("server"))
+    port = server.add_child(Value("port", server, 80))
+    sessions = running.add_child(List("sessions", running))
+    for n in range(4):
+        session = sessions.append_child(Object("s"))
+        session.add_child(Value("n", session, n))
+    sessions.insert_child(1, Object("inserted"))
+    sessions.remove_child(3)
+    port.set(8080)
+    running.add_child(Value("gone", running, 1))
+    running.remove_child("gone")
+    return running.export()
+
+
+def test_journal_replayed(tmp_path):
+    for scheme in ("sqlite3", "sqlite3+paths", "file"):
+        check_replayed("%s://%s" % (scheme, tmp_path / ("%s.db" % scheme)))
+
+
+def check_replayed(url):
+
+    async def exercise():
+        m = await open_manager(url, interval=10)
+        store = m._store
+        appends = []
+        append_journal = store.append_journal
+
+        async def counted(records):
+            appends.append(len(records))
+            return await append_journal(records)
+
+        store.append_journal = counted
+        expected = change(m)
+        await m.flush()
+        journal = await store.load_journal()
+        await m.stop()
+
+        m = await open_manager(url)
+        replayed = m.get_node('config/running').export()
+        m.get_node('config/running/server/port').set(1)
+        await m.stop()
+
+        m = await open_manager(url)
+        port = m.get_node('config/running/server/port').get()
+        seqs = [seq for seq, _ in await m._store.load_journal()]
+        await m.stop()
+        return expected, appends, len(journal), replayed, port, seqs
+
+    expected, appends, records, replayed, port, seqs = run(exercise())
+    assert appends == [records]
+    assert replayed == expected
+    assert port == 1
+    assert seqs == list(range(1, records + 2))
+
+
+def test_journal_compacted(tmp_path):
+    check_journal_compacted("sqlite3://%s" % (tmp_path / "t.db"))
+    check_journal_compacted("file://%s" % (tmp_path / "files"))
+
+
+def check_journal_compacted(url):
+
+    async def exercise():
+        m = await open_manager(url, interval=0.01, compact_interval=0.05)
+        await m.start()
+        expected = change(m)
+        await asyncio.sleep(0.2)
+        await m.flush()
+        journal = await m._store.load_journal()
+        saved = await m._store.list_saved()
+        m.get_node('config/running/server/port').set(9)
+        await m.stop()
+
+        m = await open_manager(url)
+        result = m.get_node('config/running').export()
+        m.save_running()
+        await m.flush()
+        remaining = await m._store.load_journal()
+        await m.stop()
+        return expected, journal, saved, result, remaining
+
+    expected, journal, saved, result, remaining = run(exercise())
+    assert journal == [] and len(saved) == 1
+    expected["server"]["port"] = 9
+    assert result == expected
+    assert remaining == []
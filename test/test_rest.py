@@ -0,0 +1,210 @@
+
+import asyncio
+import json
+
+import aiohttp
+from aiohttp.test_utils import make_mocked_request
+
+from aioconfig import Manager, Object, Value
+from aioconfig.core import build
+from aioconfig.rest_access import RestAccessAdaptor, iter_json
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_history(tmp_path):
+
+    async def exercise():
+        m = Manager()
+        m.set_config("s1", "sqlite3://%s?history=1" % (tmp_path / "t.db"))
+        running = m.get_node('config/running')
+        server = running.add_child(Object("server"))
+        port = server.add_child(Value("port", server, 80))
+        m.save_running()
+        port.set(443)
+        m.save_running()
+        await m.flush()
+
+        rest = RestAccessAdaptor(m, "rest://localhost:8080")
+        request = make_mocked_request(
+            "GET", "/_history/server/port",
+            match_info={"tail": "server/port"})
+        response = await rest.handle_history(request)
+        await m.stop()
+        return json.loads(response.body)
+
+    history = run(exercise())
+    assert [entry["value"] for entry in history] == [80, 443]
+
+
+async def fetch(rest, path, headers=None):
+    """Return (status, ETag, decoded body) from a GET request."""
+
+    url = "http://127.0.0.1:%u%s" % (rest.get_port(), path)
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, headers=headers) as response:
+            body = await response.json() if response.status == 200 else None
+            etag = response.headers.get("ETag", "").strip('"') or None
+            return response.status, etag, body
+
+
+def test_get_etag():
+
+    async def get(rest, path, etag=None):
+        headers = {"If-None-Match": '"%s"' % etag} if etag else {}
+        return await fetch(rest, path, headers)
+
+    async def exercise():
+        m = Manager()
+        running = m.get_node('config/running')
+        server = running.add_child(Object("server"))
+        port = server.add_child(Value("port", server, 80))
+        status = m.get_node('status').add_child(Value("load", None, 0))
+        rest = RestAccessAdaptor(m, "rest://127.0.0.1:0")
+        await rest.start()
+
+        results = []
+        status_, etag, body = await get(rest, "/config/running/server")
+        results.append((status_, body))
+        results.append((await get(rest, "/config/running/server", etag))[::2])
+
+        # Changes elsewhere keep the tag.
+        status.set(1)
+        results.append((await get(rest, "/config/running/server", etag))[::2])
+
+        port.set(443)
+        status_, new_etag, body = await get(rest, "/config/running/server",
+                                            etag)
+        results.append((status_, body))
+        results.append((await get(rest, "/config/running", etag))[0])
+
+        server.remove_child("port")
+        results.append((await get(rest, "/config/running/server/port"))[0])
+        server.add_child(Value("port", server, 443))
+        results.append((await get(rest, "/config/running/server/port",
+                                  new_etag))[0])
+        results.append((await get(rest, "/config/running/server",
+                                  new_etag))[0])
+        results.append((await get(rest, "/config/missing"))[0])
+        results.append((await get(rest, "/status/load"))[::2])
+        await rest.stop()
+        return results
+
+    results = run(exercise())
+    assert results[:4] == [(200, {"port": 80}), (304, None), (304, None),
+                           (200, {"port": 443})]
+    assert results[4:9] == [200, 404, 200, 200, 404]
+    assert results[9] == (200, 1)
+
+
+def test_iter_json():
+    config = {"a": [1, {"b": None, "c": [True, "d\"\u00e9"]}],
+              "e": {}, "f": [], "g": 1.5}
+    node = build("", config)
+    assert "".join(iter_json(node)) == json.dumps(config)
+    chunks = list(iter_json(node, 8))
+    assert "".join(chunks) == json.dumps(config) and len(chunks) > 5
+    assert list(iter_json(build("", 1))) == ["1"]
+
+
+def test_get_streamed():
+
+    async def exercise():
+        m = Manager()
+        running = m.get_node('config/running')
+        running.add_child(build("sessions", {
+            "session-%u" % n: {"port": 8000 + n, "host": "h%u" % n}
+            for n in range(5000)}))
+        rest = RestAccessAdaptor(m, "rest://127.0.0.1:0")
+        await rest.start()
+
+        results = [await fetch(rest, "/config/running")]
+        url = "http://127.0.0.1:%u/config/running/sessions" % rest.get_port()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                    url, headers={"Accept-Encoding": "gzip"}) as response:
+                results.append((response.headers.get("Content-Encoding"),
+                                response.headers.get("Transfer-Encoding"),
+                                await response.json()))
+        await rest.stop()
+        return running.export(), results
+
+    config, results = run(exercise())
+    assert results[0][0] == 200 and results[0][2] == config
+    assert results[1] == ("gzip", "chunked", config["sessions"])
+
+
+BATCHES = [
+    {"operations": [{"op": "set", "path": "config/staged/server/port",
+                     "value": 443},
+                    {"op": "get", "path": "config/staged/server"}]},
+    {"operations": [{"op": "delete", "path": "config/staged/server"},
+                    {"op": "get", "path": "config/staged/none"}],
+     "atomic": True},
+    {"operations": [{"op": "move", "path": "x"}]}]
+
+
+def test_batch():
+
+    async def exercise():
+        m = Manager()
+        m.get_node('config/staged').add_child(build("server", {"port": 80}))
+        rest = RestAccessAdaptor(m, "rest://127.0.0.1:0")
+        await rest.start()
+
+        url = "http://127.0.0.1:%u/_batch" % rest.get_port()
+        results = []
+        async with aiohttp.ClientSession() as session:
+            for body in BATCHES:
+                async with session.post(url, json=body) as response:
+                    results.append((response.status,
+                                    await response.json()
+                                    if response.status != 400 else None))
+        await rest.stop()
+        return m.get_node('config/staged').export(), results
+
+    staged, results = run(exercise())
+    assert staged == {"server": {"port": 443}}
+    assert results[0] == (200, {"applied": True, "results": [
+        {}, {"value": {"port": 443}}]})
+    assert results[1][0] == 409 and not results[1][1]["applied"]
+    assert results[2] == (400, None)
+
+
+def test_feed():
+
+    async def exercise():
+        m = Manager()
+        running = m.get_node('config/running')
+        port = running.add_child(Value("port", running, 80))
+        rest = RestAccessAdaptor(m, "rest://127.0.0.1:0")
+        await rest.start()
+
+        url = "http://127.0.0.1:%u/_feed?path=config/running" % \
+            rest.get_port()
+        results = []
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as events:
+                ws = await session.ws_connect(url)
+                await asyncio.sleep(0.05)
+                port.set(443)
+                m.get_node('status').add_child(Value("load", None, 1))
+                results.append(await ws.receive_json())
+                results.append(json.loads(
+                    (await events.content.readline())[len(b"data: "):]))
+                results.append(events.headers["Content-Type"])
+                await rest.stop()
+                results.append((await ws.receive()).type)
+                results.append(await events.content.read())
+        return results
+
+    results = run(exercise())
+    change = [{"event": "set", "path": "config/running/port", "value": 443}]
+    assert results == [change, change, "text/event-stream",
+                       aiohttp.WSMsgType.CLOSE, b"\n"]
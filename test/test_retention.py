@@ -0,0 +1,154 @@
+
+import asyncio
+import datetime
+import time
+
+from aioconfig import Manager, Object, RetentionPolicy, Value
+from aioconfig import create_storage_adaptor
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_policy_expired():
+    now = datetime.datetime(2020, 6, 1, 12, 0)
+    policy = RetentionPolicy.parse("all 24h, hourly 30d, daily 90d")
+    names = [now - datetime.timedelta(minutes=m)
+             for m in range(0, 100 * 24 * 60, 20)]
+    expired = set(policy.expired(names, now))
+    kept = [name for name in names if name not in expired]
+
+    recent = [name for name in kept if now - name < datetime.timedelta(1)]
+    assert len(recent) == 72
+    hourly = [name for name in kept if datetime.timedelta(1) <= now - name
+              < datetime.timedelta(30)]
+    assert len({name.replace(minute=0) for name in hourly}) == len(hourly)
+    assert all(now - name < datetime.timedelta(90) for name in kept)
+    assert max(names) in kept
+
+
+def test_policy_parse():
+    policy = RetentionPolicy.parse("all 24h, hourly 30d, daily")
+    assert policy.get_tiers() == [
+        (datetime.timedelta(hours=24), None),
+        (datetime.timedelta(days=30), datetime.timedelta(hours=1)),
+        (None, datetime.timedelta(days=1))]
+
+    for text in ("all 24x", "sometimes", "all 1d 2d"):
+        try:
+            RetentionPolicy.parse(text)
+        except ValueError:
+            continue
+        assert False, text
+
+
+def test_delete_rebases_deltas(tmp_path):
+    check_delete_rebases_deltas("sqlite3://%s?delta=3" % (tmp_path / "t.db"))
+    check_delete_rebases_deltas("file://%s" % (tmp_path / "files"))
+
+
+def check_delete_rebases_deltas(url):
+    store = create_storage_adaptor("s1", url)
+    configs = [{"n": n, "s": {"v": n % 2}} for n in range(7)]
+    for config in configs:
+        store.save_current(config)
+    store.save_staged({"staged": True})
+
+    names = sorted(store.list_saved())
+    store.delete_saved([names[0], names[4]])
+    assert [store.load_saved(name) for name in names] == \
+        [None, configs[1], configs[2], configs[3], None, configs[5],
+         configs[6]]
+
+    store.archive(names[3])
+    assert store.purge_archived(10) == 2
+    assert store.load_staged() == {"staged": True}
+    assert sorted(store.list_saved()) == [names[3]] + names[5:]
+    store.reclaim()
+
+    # Later saves are based on the newest remaining configuration.
+    store.save_current({"n": 7})
+    assert store.load_current() == {"n": 7}
+    store.close()
+
+
+def test_delete_sweeps_content(tmp_path):
+    url = "sqlite3://%s?dedup=1" % (tmp_path / "t.db")
+    store = create_storage_adaptor("s1", url)
+
+    big = {"s%u" % n: {"port": n} for n in range(200)}
+    store.save_current({"a": 1, "big": big})
+    store.save_current({"a": 2, "big": dict(big, extra=1)})
+    names = sorted(store.list_saved())
+
+    def count():
+        return store._connection.execute(
+            "select count(*) from content").fetchone()[0]
+
+    assert count() == 4
+    store.delete_saved(names[:1])
+    store.reclaim()
+    assert count() == 2
+    assert store.load_current() == {"a": 2, "big": dict(big, extra=1)}
+    store.close()
+
+
+def test_manager_prune_saved(tmp_path):
+    check_manager_prune_saved("sqlite3://%s?delta=2" % (tmp_path / "t.db"))
+    check_manager_prune_saved("file://%s" % (tmp_path / "files"))
+
+
+def check_manager_prune_saved(url):
+
+    async def exercise():
+        m = Manager()
+        m.set_config("s1", url)
+        running = m.get_node('config/running')
+        value = running.add_child(Value("n", running, 0))
+        m.save_staged()
+        for n in range(6):
+            value.set(n)
+            m.save_running()
+            await m.flush()
+            time.sleep(0.002)
+            if n == 2:
+                cutoff = datetime.datetime.utcnow()
+                time.sleep(0.002)
+
+        saved = m.get_node('config/saved')
+        pruned = await m.prune_saved(cutoff)
+        memory = sorted(saved.keys())
+
+        store = m._store
+        names = await store.list_saved()
+        values = [(await store.load_saved(name))["n"] for name in names]
+        await m.stop()
+        return pruned, memory, values
+
+    pruned, memory, values = run(exercise())
+    assert pruned == 3
+    assert len(memory) == 4 and 'staged' in memory
+    assert values == [5, 4, 3]
+
+
+def test_background_retention():
+
+    async def exercise():
+        m = Manager()
+        saved = m.get_node('config/saved')
+        for days in range(5):
+            moment = datetime.datetime.utcnow() - datetime.timedelta(days)
+            saved.add_child(Object(m._saved_name(moment)))
+
+        m.set_retention("all 2d", 0.01)
+        await m.start()
+        await asyncio.sleep(0.05)
+        await m.stop()
+        return len(saved.keys())
+
+    assert run(exercise()) == 2
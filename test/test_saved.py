@@ -0,0 +1,88 @@
+
+import asyncio
+import time
+
+from aioconfig import Manager, Object, Value
+from aioconfig.saved import NODE_SIZE
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def populate(m):
+    running = m.get_node('config/running')
+    sessions = running.add_child(Object("sessions"))
+    for n in range(20):
+        sessions.add_child(Value("s%u" % n, sessions, n))
+    return sessions
+
+
+def test_saved_trees_bounded(tmp_path):
+    check_saved_trees_bounded("sqlite3://%s" % (tmp_path / "t.db"))
+    check_saved_trees_bounded("file://%s" % (tmp_path / "files"))
+
+
+def check_saved_trees_bounded(url):
+
+    async def exercise():
+        m = Manager()
+        m.set_config("s1", url)
+        sessions = populate(m)
+        saved = m.get_node('config/saved')
+        saved.set_budget(3 * 22 * NODE_SIZE)
+
+        paths = []
+        for n in range(10):
+            sessions.get_child("s0").set(n)
+            paths.append(m.save_running())
+            await m.flush()
+            time.sleep(0.002)
+
+        names = [path.rpartition('/')[2] for path in paths]
+        loaded = [name for name in names if saved.is_loaded(name)]
+        assert loaded == names[-3:]
+        assert saved.get_size() <= 3 * 22 * NODE_SIZE
+        assert list(saved.keys()) == names
+
+        # Old trees are loaded again when looked up.
+        assert m.get_node(paths[0] + '/sessions/s0').get() == 0
+        assert saved.is_loaded(names[0])
+        assert not saved.is_loaded(names[7])
+        node = await m.aget_saved(names[1])
+        assert node.get_child("sessions").get_child("s0").get() == 1
+        assert m.identical(paths[9], 'config/running')
+
+        saved.remove_child(names[2])
+        assert not saved.has_child(names[2])
+        await m.stop()
+
+        m = Manager()
+        m.set_config("s1", url)
+        await m.aload()
+        saved = m.get_node('config/saved')
+        names = list(saved.keys())
+        result = (names,
+                  [name for name in names if saved.is_loaded(name)],
+                  m.get_node('config/running/sessions/s0').get(),
+                  m.get_node('config/saved/%s/sessions/s0' % names[2]).get())
+        await m.stop()
+        return result
+
+    names, loaded, latest, value = run(exercise())
+    assert len(names) == 10 and loaded == names[-1:]
+    assert latest == 9
+    assert value == 2
+
+
+def test_saved_trees_kept_without_storage():
+    m = Manager()
+    populate(m)
+    saved = m.get_node('config/saved')
+    saved.set_budget(0)
+    paths = [m.save_running() for _ in range(3)]
+    assert all(saved.is_loaded(path.rpartition('/')[2]) for path in paths)
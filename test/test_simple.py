@@ -212,7 +212,7 @@ def test_construct():
     server.add_child(P2Node("p2", server, s))
     running.add_child(SessionsManager("sessions", running, s))
 
-    m.add_access("rest://0.0.0.0:443")
+    m.add_access("rest://127.0.0.1:0")
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(m.start())
@@ -0,0 +1,377 @@
+
+import asyncio
+import datetime
+import json
+import time
+
+from aioconfig import Manager, Object, Value, create_storage_adaptor
+from aioconfig.storage import apply_delta, create_async_storage_adaptor
+from aioconfig.storage import CODECS, get_codec, make_delta
+
+
+CONFIG = {"server": {"p1": 1, "p2": "two"}, "sessions": [{"port": 8000}]}
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_save_load(tmp_path):
+    check_save_load("sqlite3://%s" % (tmp_path / "t.db"))
+    check_save_load("file://%s" % (tmp_path / "files"))
+
+
+def check_save_load(url):
+    store = create_storage_adaptor("s1", url)
+    assert store.load_current() is None
+
+    store.save_current(CONFIG)
+    store.save_staged({"staged": True})
+
+    assert store.load_current() == CONFIG
+    assert store.load_staged() == {"staged": True}
+    assert len(store.list_saved()) == 1
+    store.close()
+
+
+def test_async_save_load(tmp_path):
+    check_async_save_load("sqlite3://%s" % (tmp_path / "t.db"))
+    check_async_save_load("file://%s" % (tmp_path / "files"))
+
+
+def check_async_save_load(url):
+
+    async def exercise():
+        store = create_async_storage_adaptor("s1", url)
+        await store.save_current(CONFIG)
+        loaded = await store.load_current()
+        names = await store.list_saved()
+        await store.close()
+        return loaded, names
+
+    loaded, names = run(exercise())
+    assert loaded == CONFIG
+    assert len(names) == 1 and isinstance(names[0], datetime.datetime)
+
+
+def test_manager_persists(tmp_path):
+    check_manager_persists("sqlite3://%s" % (tmp_path / "t.db"))
+    check_manager_persists("file://%s" % (tmp_path / "files"))
+
+
+def check_manager_persists(url):
+
+    async def save():
+        m = Manager()
+        m.set_config("s1", url)
+        running = m.get_node('config/running')
+        server = running.add_child(Object("server"))
+        server.add_child(Value("p1", server, 1))
+        m.save_running()
+        await m.stop()
+
+    async def load():
+        m = Manager()
+        m.set_config("s1", url)
+        await m.aload()
+        value = m.get_node('config/running/server/p1').get()
+        await m.stop()
+        return value
+
+    run(save())
+    assert run(load()) == 1
+
+
+def test_make_apply_delta():
+    old = {"a": 1, "b": {"c": 2, "d": [1, 2]}, "e": True}
+    new = {"a": 1, "b": {"c": 3, "d": [1, 2, 3]}, "f": None, "e": 1}
+
+    delta = make_delta(old, new)
+    assert delta == {"set": {"e": 1, "f": None},
+                     "sub": {"b": {"set": {"c": 3, "d": [1, 2, 3]}}}}
+    assert apply_delta(json.loads(json.dumps(old)), delta) == new
+    assert make_delta(new, new) == {}
+
+
+def test_sqlite_delta_snapshots(tmp_path):
+    url = "sqlite3://%s?delta=3" % (tmp_path / "t.db")
+    store = create_storage_adaptor("s1", url)
+
+    configs = []
+    for n in range(7):
+        config = {"server": {"p1": n, "p2": "two"}, "n%u" % n: n}
+        configs.append(config)
+        store.save_current(config)
+        time.sleep(0.002)
+
+    rows = store._connection.execute(
+        "select delta_of is null from config order by saved").fetchall()
+    assert [row[0] for row in rows] == [1, 0, 0, 1, 0, 0, 1]
+
+    names = sorted(store.list_saved())
+    assert [store.load_saved(name) for name in names] == configs
+    assert store.load_current() == configs[-1]
+    store.close()
+
+    store = create_storage_adaptor("s1", url)
+    assert store.load_current() == configs[-1]
+    store.close()
+
+
+def test_sqlite_group_commit(tmp_path):
+    url = "sqlite3://%s" % (tmp_path / "t.db")
+
+    async def exercise():
+        store = create_async_storage_adaptor("s1", url)
+        batches = []
+        adaptor = store.get_adaptor()
+        write_batch = adaptor.write_batch
+        adaptor.write_batch = lambda writes: \
+            (batches.append(len(writes)), write_batch(writes))[1]
+
+        await asyncio.gather(
+            *[store.save_current({"n": n}) for n in range(20)],
+            *[store.save_staged({"staged": n}) for n in range(5)])
+        names = await store.list_saved()
+        latest = await store.load_current()
+        staged = await store.load_staged()
+        await store.close()
+        return batches, names, latest, staged
+
+    batches, names, latest, staged = run(exercise())
+    assert len(names) == 20 and len(set(names)) == 20
+    assert latest == {"n": 19}
+    assert staged == {"staged": 4}
+    assert sum(batches) == 21 and len(batches) < 21
+
+
+def test_codecs():
+    for name in ("json", "zlib", "msgpack"):
+        if name not in CODECS:
+            continue
+        codec = get_codec(name)
+        assert codec.decode(codec.encode(CONFIG)) == CONFIG
+
+
+def test_sqlite_codec(tmp_path):
+    path = tmp_path / "t.db"
+    store = create_storage_adaptor("s1", "sqlite3://%s" % path)
+    store.save_current({"old": True})
+    store.close()
+
+    store = create_storage_adaptor("s1", "sqlite3://%s?codec=zlib&delta=2"
+                                   % path)
+    store._connection.execute("update config set encoding = null")
+    store._connection.commit()
+    assert store.load_current() == {"old": True}
+
+    store.save_current(CONFIG)
+    store.save_current(dict(CONFIG, extra=1))
+    store.save_staged(CONFIG)
+    assert store.load_current() == dict(CONFIG, extra=1)
+    assert store.load_staged() == CONFIG
+    assert [row[0] for row in store._connection.execute(
+        "select encoding from config order by saved")] == \
+        ["zlib", None, "zlib", "zlib"]
+    store.close()
+
+
+def test_sqlite_paths(tmp_path):
+    url = "sqlite3+paths://%s" % (tmp_path / "t.db")
+    store = create_storage_adaptor("s1", url)
+    assert store.load_current() is None
+
+    config = {"server": {"p1": 1, "p2": "two", "a/b": {"c%d": None}},
+              "sessions": [{"port": 8000 + n} for n in range(12)],
+              "empty": {"list": [], "dict": {}}}
+    store.save_current(CONFIG)
+    time.sleep(0.002)
+    store.save_current(config)
+    store.save_staged(CONFIG)
+    store.save_staged({"staged": True})
+
+    assert store.load_current() == config
+    assert store.load_current("") == config
+    assert store.load_current("/") == config
+    assert store.load_staged() == {"staged": True}
+    assert store.load_current("sessions/11") == {"port": 8011}
+    assert store.load_current("sessions/1/port") == 8001
+    assert store.load_current("/server/") == config["server"]
+    assert store.load_current("empty") == {"list": [], "dict": {}}
+    assert store.load_current("server/p3") is None
+
+    names = sorted(store.list_saved())
+    assert len(names) == 2
+    assert store.load_saved(names[0], "sessions") == CONFIG["sessions"]
+    store.archive(names[1])
+    assert store.list_saved() == [names[1]]
+    assert store.load_saved(names[0]) is None
+    store.close()
+
+    store = create_storage_adaptor("s1", "sqlite3://%s" % (tmp_path / "b.db"))
+    store.save_current(config)
+    assert store.load_current("sessions/1/port") == 8001
+    assert store.load_current("server/a/b") is None
+    store.close()
+
+
+def test_sqlite_history(tmp_path):
+    for scheme in ("sqlite3", "sqlite3+paths"):
+        url = "%s://%s?history=1" % (scheme, tmp_path / ("%s.db" % scheme))
+        store = create_storage_adaptor("s1", url)
+        store.save_current({"sessions": {"foo": {"port": 1}}, "a": [1]})
+        store.save_current({"sessions": {"foo": {"port": 1}}, "a": [2]})
+        store.save_current({"sessions": {"foo": {"port": 2}}, "a": [2]})
+        store.close()
+        time.sleep(0.002)
+
+        store = create_storage_adaptor("s1", url)
+        store.save_current({"sessions": {"foo": {"port": 2}}})
+        store.save_current({"sessions": {"foo": {"port": "2"}}})
+
+        names = sorted(store.list_saved())
+        history = store.history("sessions/foo/port")
+        assert [(entry.saved, entry.value) for entry in history] == \
+            [(names[0], 1), (names[2], 2), (names[4], "2")]
+        assert [entry.removed for entry in store.history("a/0")] == \
+            [False, False, True]
+        assert [entry.value for entry in store.history(
+            "sessions/foo/port", since=names[3], until=names[3])] == [2]
+        store.close()
+
+
+def test_sqlite_dedup(tmp_path):
+    url = "sqlite3://%s?dedup=1" % (tmp_path / "t.db")
+    store = create_storage_adaptor("s1", url)
+
+    big = {"s%u" % n: {"port": n, "host": "h"} for n in range(200)}
+    configs = [{"a": 1, "big": big, "other": dict(big), "z": [1]},
+               {"a": 1, "big": big, "other": dict(big), "z": [1]},
+               {"a": 2, "big": big, "other": dict(big, extra=1), "z": [1]}]
+    counts = []
+    for config in configs:
+        store.save_current(config)
+        counts.append(store._connection.execute(
+            "select count(*) from content").fetchone()[0])
+
+    # Root plus one subtree (shared by 'big' and 'other'), then nothing,
+    # then a new root and a new 'other'.
+    assert counts == [2, 2, 4]
+
+    names = sorted(store.list_saved())
+    loaded = [store.load_saved(name) for name in names]
+    assert loaded == configs
+    assert [list(config) for config in loaded] == \
+        [list(config) for config in configs]
+    assert store.load_current("other/extra") == 1
+    store.close()
+
+
+def test_sqlite_dedup_lists(tmp_path):
+    url = "sqlite3://%s?dedup=1&codec=zlib" % (tmp_path / "t.db")
+    store = create_storage_adaptor("s1", url)
+
+    def stored():
+        return store._connection.execute(
+            "select sum(length(settings) + length(coalesce(refs, ''))) "
+            "from content").fetchone()[0]
+
+    sessions = [{"name": "s%u" % n, "port": 8000 + n} for n in range(5000)]
+    configs = [{"sessions": sessions, "nested": [[1, 2]] * 300, "e": []}]
+    changed = [dict(session) for session in sessions]
+    changed[2500]["port"] = 1
+    configs.append(dict(configs[0], sessions=changed))
+    configs.append(dict(configs[1], sessions=changed[:100] + changed[101:]))
+
+    sizes = []
+    for config in configs:
+        store.save_current(config)
+        sizes.append(stored())
+
+    # Changing or removing one session rewrites only a few small rows.
+    assert sizes[1] - sizes[0] < sizes[0] / 10
+    assert sizes[2] - sizes[1] < sizes[0] / 10
+
+    names = sorted(store.list_saved())
+    assert [store.load_saved(name) for name in names] == configs
+    assert store.load_current("sessions/4998") == changed[4999]
+    store.close()
+
+
+def test_list_saved_pages(tmp_path):
+    for scheme in ("sqlite3", "sqlite3+paths", "file"):
+        url = "%s://%s" % (scheme, tmp_path / ("%s.db" % scheme))
+        store = create_storage_adaptor("s1", url)
+        for n in range(25):
+            store.save_current({"n": n})
+        store.save_staged({"staged": True})
+
+        names = store.list_saved()
+        assert len(names) == 25 and names == sorted(names, reverse=True)
+        assert all(isinstance(name, datetime.datetime) for name in names)
+        assert store.load_saved(names[0]) == {"n": 24}
+
+        assert store.list_saved(limit=3) == names[:3]
+        assert store.list_saved(limit=3, before=names[2]) == names[3:6]
+        assert store.list_saved(since=names[9], until=names[5]) == \
+            names[5:10]
+        assert list(store.iter_saved(page_size=7)) == names
+        assert list(store.iter_saved(since=names[20], page_size=5)) == \
+            names[:21]
+        store.close()
+
+
+def test_async_iter_saved(tmp_path):
+    check_async_iter_saved("sqlite3://%s" % (tmp_path / "t.db"))
+    check_async_iter_saved("file://%s" % (tmp_path / "files"))
+
+
+def check_async_iter_saved(url):
+
+    async def exercise():
+        store = create_async_storage_adaptor("s1", url)
+        await asyncio.gather(*[store.save_current({"n": n})
+                               for n in range(10)])
+        names = [name async for name in store.iter_saved(page_size=3)]
+        await store.close()
+        return names
+
+    names = run(exercise())
+    assert len(names) == 10 and names == sorted(names, reverse=True)
+
+
+def test_file_recovery(tmp_path):
+    url = "file://%s?codec=zlib" % tmp_path
+    store = create_storage_adaptor("s/1", url)
+    names = [store.save_current({"n": n}) for n in range(3)]
+    store.append_journal([(1, ["set", ["n"], 1]), (2, ["set", ["n"], 2])])
+    store.close()
+
+    # A save interrupted before its rename, or while indexing it.
+    directory = tmp_path / "s%2F1"
+    (directory / "20991231T000000.000000.tmp").write_bytes(b"partial")
+    with open(directory / "index", "a") as f:
+        f.write("s 2099-12-31T00:00:00.000 zlib -")
+
+    store = create_storage_adaptor("s/1", url)
+    assert store.list_saved() == names[::-1]
+    saved = store.save_current({"n": 3})
+    assert store.load_current() == {"n": 3}
+    assert len((directory / "index").read_text().splitlines()) == 5
+
+    # The journal is skipped once compacted, even if not yet rewritten.
+    assert [seq for seq, _ in store.load_journal()] == [1, 2]
+    with open(directory / "index", "a") as f:
+        f.write("j 1\n")
+    store.close()
+
+    store = create_storage_adaptor("s/1", url)
+    assert [seq for seq, _ in store.load_journal()] == [2]
+    store.compact_journal({"n": 4}, 2)
+    assert store.load_journal() == []
+    assert store.list_saved()[1:] == [saved] + names[::-1]
+    store.close()
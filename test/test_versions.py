@@ -0,0 +1,34 @@
+
+from aioconfig import List, Object, Value
+from aioconfig.versions import SubtreeVersions
+
+
+def test_subtree_versions():
+    root = Object("")
+    versions = SubtreeVersions()
+    root.add_listener(versions)
+    sessions = root.add_child(List("sessions", None))
+    for n in range(3):
+        session = sessions.append_child(Object("session"))
+        session.add_child(Value("port", session, 8000 + n))
+    other = root.add_child(Object("other"))
+
+    before = {path: versions.get_version(path)
+              for path in [(), ("sessions",), ("sessions", "1"),
+                           ("sessions", "2", "port"), ("other",)]}
+
+    sessions.get_child("2").get_child("port").set(1)
+    after = {path: versions.get_version(path) for path in before}
+    assert [path for path in before if before[path] != after[path]] == \
+        [(), ("sessions",), ("sessions", "2", "port")]
+
+    # Renumbering changes every element of the list.
+    sessions.remove_child(0)
+    moved = {path: versions.get_version(path) for path in before}
+    assert moved[("other",)] == before[("other",)]
+    assert moved[("sessions", "1")] != after[("sessions", "1")]
+    assert versions.get_tag(("sessions",)) != versions.get_tag(("other",))
+    assert len(versions._root.children["sessions"].children) == 0
+
+    other.add_child(Value("x", other, 1))
+    assert versions.get_version(("other",)) != before[("other",)]